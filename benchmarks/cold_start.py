@@ -0,0 +1,182 @@
+"""Measure the cold start cost of every Lambda handler in `serverless.yaml`.
+
+Each handler module is imported in a fresh Python interpreter, recording the
+wall time spent importing it, the peak RSS of the process afterwards and
+whether any of the heavy data libraries were pulled in.
+
+Run with:
+
+    python -m benchmarks.cold_start [--check]
+
+With `--check` the script exits with a non-zero status when a handler exceeds
+its budget in `BUDGETS`.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+SERVERLESS_YAML = Path(__file__).parent.parent / "serverless.yaml"
+
+# Libraries that are expensive to import and should only be loaded by the
+# handlers that actually need them.
+HEAVY_MODULES = ["awswrangler", "deltalake", "pandas", "pyarrow"]
+
+# Per-handler budgets. `import_seconds` and `max_rss_mb` are generous upper
+# bounds meant to catch regressions, not precise targets. `heavy_modules` lists
+# which of `HEAVY_MODULES` the handler is allowed to import.
+DEFAULT_BUDGET = {
+    "import_seconds": 10.0,
+    "max_rss_mb": 400,
+    "heavy_modules": HEAVY_MODULES,
+}
+LIGHTWEIGHT_BUDGET = {"import_seconds": 3.0, "max_rss_mb": 150, "heavy_modules": []}
+XLSX_TO_CSV_BUDGET = {
+    "import_seconds": 6.0,
+    "max_rss_mb": 250,
+    "heavy_modules": ["pandas", "pyarrow"],
+}
+BUDGETS = {
+    "okdata.pipeline.converters.xls.handlers.xlsx_to_csv": XLSX_TO_CSV_BUDGET,
+    "okdata.pipeline.lambda_invoker.collect_result": LIGHTWEIGHT_BUDGET,
+    "okdata.pipeline.lambda_invoker.invoke_lambda": LIGHTWEIGHT_BUDGET,
+    "okdata.pipeline.validators.csv.validator.validate_csv": LIGHTWEIGHT_BUDGET,
+    "okdata.pipeline.validators.json.handler.validate_json": LIGHTWEIGHT_BUDGET,
+    "okdata.pipeline.writers.s3.handlers.write_s3": LIGHTWEIGHT_BUDGET,
+}
+
+# Executed in a fresh interpreter for every handler. The SSM secret lookup done
+# by `sdk_config()` at import time is stubbed out, since it's a network call
+# and not part of what we're measuring.
+_MEASURE_SCRIPT = """
+import json, resource, sys, time
+from unittest.mock import patch
+
+module_name, handler_name, heavy_modules = sys.argv[1], sys.argv[2], sys.argv[3:]
+
+with patch("okdata.aws.ssm.get_secret", return_value="secret"):
+    start = time.perf_counter()
+    import okdata.pipeline.util
+    okdata.pipeline.util.get_secret = lambda _: "secret"
+    module = __import__(module_name, fromlist=[handler_name])
+    getattr(module, handler_name)
+    import_seconds = time.perf_counter() - start
+
+# Prefer the peak RSS of the current address space; `ru_maxrss` is inherited
+# across exec on Linux and would report the peak of the parent process.
+try:
+    with open("/proc/self/status") as f:
+        max_rss_kb = next(
+            int(line.split()[1]) for line in f if line.startswith("VmHWM:")
+        )
+except OSError:
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+print(json.dumps({
+    "import_seconds": import_seconds,
+    "max_rss_mb": max_rss_kb / 1024,
+    "heavy_modules": sorted(m for m in heavy_modules if m in sys.modules),
+}))
+"""
+
+
+def handler_entry_points(serverless_yaml=SERVERLESS_YAML):
+    """Return the handler entry points listed in `serverless_yaml`."""
+    return re.findall(
+        r"^\s*-\s*(okdata\.pipeline\.[\w.]+)\s*$",
+        Path(serverless_yaml).read_text(),
+        flags=re.MULTILINE,
+    )
+
+
+def measure(entry_point):
+    """Import `entry_point` in a fresh interpreter and return its cold start
+    measurements."""
+    module_name, handler_name = entry_point.rsplit(".", 1)
+    env = {
+        "AWS_REGION": "eu-west-1",
+        "AWS_XRAY_SDK_ENABLED": "false",
+        "BUCKET_NAME": "cold-start-bucket",
+        "SERVICE_NAME": "cold-start",
+        **os.environ,
+    }
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            _MEASURE_SCRIPT,
+            module_name,
+            handler_name,
+            *HEAVY_MODULES,
+        ],
+        capture_output=True,
+        check=True,
+        env=env,
+        text=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def budget_violations(entry_point, measurements):
+    """Return a list of ways `measurements` exceed the budget of
+    `entry_point`."""
+    return limit_violations(entry_point, measurements) + heavy_module_violations(
+        entry_point, measurements
+    )
+
+
+def limit_violations(entry_point, measurements):
+    """Return a list of ways `measurements` exceed the import time and
+    memory limits of `entry_point`."""
+    budget = BUDGETS.get(entry_point, DEFAULT_BUDGET)
+
+    return [
+        f"{entry_point}: {key} {measurements[key]:.2f} > {budget[key]}"
+        for key in ("import_seconds", "max_rss_mb")
+        if measurements[key] > budget[key]
+    ]
+
+
+def heavy_module_violations(entry_point, measurements):
+    """Return a list with a violation if `entry_point` imports any of
+    `HEAVY_MODULES` that its budget doesn't allow."""
+    budget = BUDGETS.get(entry_point, DEFAULT_BUDGET)
+    disallowed_modules = [
+        m for m in measurements["heavy_modules"] if m not in budget["heavy_modules"]
+    ]
+
+    if not disallowed_modules:
+        return []
+
+    return ["{}: imports {}".format(entry_point, ", ".join(disallowed_modules))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--check", action="store_true", help="fail when a budget is exceeded"
+    )
+    args = parser.parse_args()
+
+    results = {}
+    violations = []
+
+    for entry_point in handler_entry_points():
+        results[entry_point] = measure(entry_point)
+        violations.extend(budget_violations(entry_point, results[entry_point]))
+
+    print(json.dumps(results, indent=2))
+
+    for violation in violations:
+        print(violation, file=sys.stderr)
+
+    if args.check and violations:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+"""End-to-end benchmarks of the pipeline steps on synthetic datasets.
+
+Every scenario uploads a synthetic dataset to a fresh S3 bucket and runs a
+step's Lambda handler on it in a fresh interpreter, recording its latency,
+throughput and peak memory use along with the per-stage metrics logged by
+the step itself.
+
+S3 is served by a local moto server (requires `moto[server]`), since the
+Delta Lake writer talks to S3 through its own HTTP client which can't be
+mocked in-process. Pass `--endpoint-url` to use another local S3 stand-in,
+like MinIO, instead.
+
+Datasets come in these shapes:
+
+- `tall`: many rows of a handful of mixed-type columns
+- `wide`: fewer rows of 100 numeric columns
+- `dates`: date and date-time columns, typed through a schema
+
+and may be gzip compressed or split across many files.
+
+Run with:
+
+    python -m benchmarks.steps [--rows N] [--scenario NAME ...]
+                               [--endpoint-url URL] [--output FILE]
+                               [--baseline FILE] [--tolerance FRACTION]
+
+The results are printed (and written to `--output`) as JSON. Save them and
+pass them as `--baseline` to a later run to have it exit with a non-zero
+status when a scenario got slower or used more memory than allowed by
+`--tolerance`. Compare results from the same machine only.
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+INPUT_PREFIX = "raw/green/benchmark/version=1/edition=20240101T000000/"
+OUTPUT_PREFIX = "%stage%/green/benchmark/version=1/edition=20240101T000000/"
+TASK = "benchmark"
+
+CSV_TO_PARQUET = "okdata.pipeline.converters.csv.handler.csv_to_parquet"
+CSV_TO_DELTA = "okdata.pipeline.converters.csv.handler.csv_to_delta"
+JSON_TO_DELTA = "okdata.pipeline.converters.json.handlers.json_to_delta"
+XLSX_TO_CSV = "okdata.pipeline.converters.xls.handlers.xlsx_to_csv"
+VALIDATE_CSV = "okdata.pipeline.validators.csv.validator.validate_csv"
+VALIDATE_JSON = "okdata.pipeline.validators.json.handler.validate_json"
+WRITE_S3 = "okdata.pipeline.writers.s3.handlers.write_s3"
+
+# Step statuses meaning that the step ran successfully.
+SUCCESS_STATUSES = ["OK", "CONVERSION_SUCCESS", "VALIDATION_SUCCESS"]
+
+# Metrics compared against the baseline, where larger is worse.
+COMPARED_METRICS = ["latency_seconds", "peak_rss_mb"]
+
+# S3 is served locally, but the SDKs still need a region and credentials.
+ENVIRONMENT = {
+    "AWS_REGION": "eu-west-1",
+    "AWS_DEFAULT_REGION": "eu-west-1",
+    "AWS_ACCESS_KEY_ID": "benchmark",
+    "AWS_SECRET_ACCESS_KEY": "benchmark",
+    "AWS_XRAY_SDK_ENABLED": "false",
+    # Let the Delta Lake writer talk to a local endpoint over plain HTTP.
+    "AWS_ALLOW_HTTP": "true",
+    "SERVICE_NAME": "benchmark",
+}
+
+
+@dataclass
+class Scenario:
+    handler: str
+    format: str
+    shape: str
+    files: int = 1
+    gzip: bool = False
+    # Whether to pass a JSON schema describing the dataset to the step.
+    schema: bool = False
+    task_config: dict = field(default_factory=dict)
+
+
+SCENARIOS = {
+    "csv_to_parquet/tall": Scenario(CSV_TO_PARQUET, "csv", "tall"),
+    "csv_to_parquet/wide": Scenario(CSV_TO_PARQUET, "csv", "wide"),
+    "csv_to_parquet/dates": Scenario(CSV_TO_PARQUET, "csv", "dates", schema=True),
+    "csv_to_parquet/gzip": Scenario(CSV_TO_PARQUET, "csv", "tall", gzip=True),
+    "csv_to_parquet/many-files": Scenario(CSV_TO_PARQUET, "csv", "tall", files=10),
+    "csv_to_delta/tall": Scenario(CSV_TO_DELTA, "csv", "tall"),
+    "json_to_delta/tall": Scenario(JSON_TO_DELTA, "json", "tall"),
+    "xlsx_to_csv/tall": Scenario(XLSX_TO_CSV, "xlsx", "tall"),
+    "validate_csv/tall": Scenario(VALIDATE_CSV, "csv", "tall", schema=True),
+    "validate_json/tall": Scenario(VALIDATE_JSON, "json", "tall", schema=True),
+    "write_s3/many-files": Scenario(
+        WRITE_S3, "csv", "tall", files=10, task_config={"output_stage": "cleaned"}
+    ),
+}
+
+
+def synthetic_table(shape, rows, seed=0):
+    """Return a synthetic table of `shape` with about `rows` rows.
+
+    Columns named `date_*` hold ISO 8601 dates and columns named `time_*` hold
+    ISO 8601 date-times without time zone.
+    """
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("1900-01-01T00:00:00")
+
+    def dates(unit):
+        offsets = rng.integers(0, 200 * 365 * 24 * 3600, rows).astype("timedelta64[s]")
+        return np.datetime_as_string(start + offsets, unit=unit)
+
+    if shape == "tall":
+        return pd.DataFrame(
+            {
+                "id": np.arange(rows),
+                "name": rng.choice([f"Navn {i}" for i in range(1000)], rows),
+                "amount": rng.normal(1000, 250, rows).round(2),
+                "active": rng.integers(0, 2, rows).astype(bool),
+                "date_created": dates("D"),
+                "time_updated": dates("s"),
+            }
+        )
+
+    if shape == "wide":
+        rows = max(rows // 20, 1)
+        return pd.DataFrame(
+            {f"value_{i}": rng.integers(0, 10_000, rows) for i in range(100)}
+        )
+
+    if shape == "dates":
+        return pd.DataFrame(
+            {
+                "id": np.arange(rows),
+                **{f"date_{i}": dates("D") for i in range(3)},
+                **{f"time_{i}": dates("s") for i in range(2)},
+            }
+        )
+
+    raise ValueError(f"Unknown shape: {shape}")
+
+
+def json_schema(df):
+    """Return a JSON schema describing the rows of `df`."""
+    properties = {}
+
+    for name, dtype in df.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype):
+            properties[name] = {"type": "boolean"}
+        elif pd.api.types.is_integer_dtype(dtype):
+            properties[name] = {"type": "integer"}
+        elif pd.api.types.is_float_dtype(dtype):
+            properties[name] = {"type": "number"}
+        elif name.startswith("date_"):
+            properties[name] = {"type": "string", "format": "date"}
+        elif name.startswith("time_"):
+            properties[name] = {"type": "string", "format": "date-time"}
+        else:
+            properties[name] = {"type": "string"}
+
+    return {"type": "object", "properties": properties}
+
+
+def encode(df, fmt, compress=False):
+    """Return `df` serialized as `fmt` (`csv`, `json` or `xlsx`)."""
+    if fmt == "csv":
+        # Booleans are written the way the CSV validator expects them.
+        content = df.replace({True: "true", False: "false"}).to_csv(index=False)
+        content = content.encode()
+    elif fmt == "json":
+        content = df.to_json(orient="records").encode()
+    elif fmt == "xlsx":
+        out = io.BytesIO()
+        df.to_excel(out, index=False, sheet_name="Sheet1")
+        content = out.getvalue()
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+    return gzip.compress(content) if compress else content
+
+
+def upload(s3_client, bucket, name, rows):
+    """Upload the dataset of scenario `name` to `bucket` and return the event
+    to run its step with, and the number of rows and bytes uploaded."""
+    scenario = SCENARIOS[name]
+    df = synthetic_table(scenario.shape, rows)
+    extension = scenario.format + (".gz" if scenario.gzip else "")
+    bounds = np.linspace(0, len(df), scenario.files + 1).astype(int)
+    size = 0
+
+    for i in range(scenario.files):
+        body = encode(
+            df.iloc[bounds[i] : bounds[i + 1]], scenario.format, scenario.gzip
+        )
+        s3_client.put_object(
+            Bucket=bucket, Key=f"{INPUT_PREFIX}part-{i:03}.{extension}", Body=body
+        )
+        size += len(body)
+
+    task_config = dict(scenario.task_config)
+
+    if scenario.schema:
+        schema = json_schema(df)
+        if scenario.handler in (VALIDATE_CSV, VALIDATE_JSON):
+            # The validators take a schema for the whole file, the CSV
+            # validator as a string.
+            schema = {
+                "$schema": "http://json-schema.org/draft-07/schema#",
+                "type": "array",
+                "items": schema,
+            }
+            if scenario.handler == VALIDATE_CSV:
+                schema = json.dumps(schema)
+        task_config["schema"] = schema
+
+    event = {
+        "execution_name": "benchmark-UUID",
+        "task": TASK,
+        "payload": {
+            "pipeline": {"id": "benchmark", "task_config": {TASK: task_config}},
+            "output_dataset": {
+                "id": "benchmark",
+                "version": "1",
+                "edition": "20240101T000000",
+                "s3_prefix": OUTPUT_PREFIX,
+            },
+            "step_data": {
+                "s3_input_prefixes": {"benchmark": INPUT_PREFIX},
+                "status": "OK",
+                "errors": [],
+            },
+        },
+    }
+
+    return event, len(df), size
+
+
+def run_step(handler, event):
+    """Run the Lambda `handler` on `event` in this process and return its
+    status, latency, peak memory use and stage metrics."""
+    # Status updates go to the status API, which isn't part of what we're
+    # measuring.
+    with (
+        patch("okdata.aws.ssm.get_secret", return_value="secret"),
+        patch("okdata.pipeline.util.get_secret", return_value="secret"),
+        patch("okdata.aws.status.sdk.Status._process_payload"),
+    ):
+        # Import the handler up front, leaving its cold start cost (measured
+        # by `benchmarks.cold_start`) out of the latency.
+        module_name, handler_name = handler.rsplit(".", 1)
+        handler = getattr(
+            __import__(module_name, fromlist=[handler_name]), handler_name
+        )
+
+        from okdata.pipeline.instrumentation import recorded_stages
+
+        start = time.perf_counter()
+        response = handler(event, None)
+        latency = time.perf_counter() - start
+
+    return {
+        "status": response["status"],
+        "latency_seconds": round(latency, 4),
+        # Of the whole process, including its imports.
+        "peak_rss_mb": round(_peak_rss_kb() / 1024, 1),
+        "stages": recorded_stages(),
+    }
+
+
+def _peak_rss_kb():
+    """Return the peak RSS of this process in KiB.
+
+    Prefer the peak of the current address space; `ru_maxrss` is inherited
+    across exec on Linux and would include the parent's peak, which holds
+    the dataset.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(name, rows, endpoint_url):
+    """Run scenario `name` against the S3 endpoint at `endpoint_url` in a
+    fresh interpreter and bucket, and return its measurements."""
+    import boto3
+
+    env = {
+        **os.environ,
+        **ENVIRONMENT,
+        "AWS_ENDPOINT_URL": endpoint_url,
+        "BUCKET_NAME": f"benchmark-{uuid.uuid4().hex[:16]}",
+    }
+    s3_client = boto3.client(
+        "s3",
+        endpoint_url=endpoint_url,
+        region_name=env["AWS_REGION"],
+        aws_access_key_id=env["AWS_ACCESS_KEY_ID"],
+        aws_secret_access_key=env["AWS_SECRET_ACCESS_KEY"],
+    )
+    s3_client.create_bucket(
+        Bucket=env["BUCKET_NAME"],
+        CreateBucketConfiguration={"LocationConstraint": env["AWS_REGION"]},
+    )
+    event, input_rows, input_bytes = upload(s3_client, env["BUCKET_NAME"], name, rows)
+
+    with tempfile.NamedTemporaryFile("w+", suffix=".json") as f:
+        json.dump({"handler": SCENARIOS[name].handler, "event": event}, f)
+        f.flush()
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmarks.steps", "--run-step", f.name],
+            env=env,
+            # The steps log a line of JSON per invocation to stdout.
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if process.returncode != 0:
+            raise RuntimeError(f"Scenario {name} failed:\n{process.stderr}")
+
+        f.seek(0)
+        result = json.load(f)
+
+    return {
+        "input_rows": input_rows,
+        "input_bytes": input_bytes,
+        "rows_per_second": round(input_rows / result["latency_seconds"], 1),
+        **result,
+    }
+
+
+def start_moto_server():
+    """Start a moto server on a free local port and return its URL."""
+    import logging
+
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False).start()
+    return f"http://127.0.0.1:{port}"
+
+
+def regressions(results, baseline, tolerance=0.25):
+    """Return a description of every scenario in `results` that failed or is
+    more than `tolerance` worse than in `baseline`."""
+    found = []
+
+    for name, result in results.items():
+        if result["status"] not in SUCCESS_STATUSES:
+            found.append(f"{name}: finished with status {result['status']}")
+
+        for metric in COMPARED_METRICS:
+            value = result.get(metric)
+            expected = baseline.get(name, {}).get(metric)
+
+            if value and expected and value > expected * (1 + tolerance):
+                found.append(
+                    "{}: {} is {} (baseline {}, +{:.0%})".format(
+                        name, metric, value, expected, value / expected - 1
+                    )
+                )
+
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument(
+        "--scenario", action="append", choices=SCENARIOS, dest="scenarios"
+    )
+    parser.add_argument("--endpoint-url")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--run-step", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_step:
+        # In the scenario's own interpreter, see `measure`.
+        with open(args.run_step, "r+") as f:
+            step = json.load(f)
+            result = run_step(step["handler"], step["event"])
+            f.seek(0)
+            f.truncate()
+            json.dump(result, f)
+        return
+
+    endpoint_url = args.endpoint_url
+    if endpoint_url is None:
+        endpoint_url = start_moto_server()
+
+    results = {
+        name: measure(name, args.rows, endpoint_url)
+        for name in args.scenarios or SCENARIOS
+    }
+    output = json.dumps(results, indent=2)
+    print(output)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    found = regressions(results, baseline, args.tolerance)
+
+    for regression in found:
+        print(regression, file=sys.stderr)
+
+    if found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,3 +3,8 @@ CONFIDENTIALITY_MAP = {
     "restricted": "yellow",
     "non-public": "red",
 }
+
+# Libraries to instrument with AWS X-Ray. Patching only the ones we actually
+# use is considerably cheaper at cold start than `patch_all()`, which imports
+# every library X-Ray knows how to patch.
+XRAY_PATCHED_MODULES = ("botocore", "requests")
@@ -1,15 +1,22 @@
+import io
 import os
 import re
 from dataclasses import asdict, dataclass
 
-import awswrangler as wr
 import boto3
-import pandas as pd
+from botocore.exceptions import ClientError
 
-from okdata.aws.logging import log_add
+from okdata.pipeline.converters.dates import parse_dates
 from okdata.pipeline.converters.exceptions import ConversionError
+from okdata.pipeline.converters.inference import infer_dtypes
+from okdata.pipeline.instrumentation import log_add, stage
 from okdata.pipeline.models import Config, StepData
 
+# Note: `awswrangler` and `pandas` are imported where they're used rather than
+# at module level, since they're expensive to import and not every Lambda
+# handler importing this module needs them. The same goes for the modules
+# only used by some of the exporters.
+
 BUCKET = os.environ["BUCKET_NAME"]
 JSONSCHEMA_TO_DTYPE_MAP = {
     "string": "string[pyarrow]",
@@ -18,6 +25,8 @@ JSONSCHEMA_TO_DTYPE_MAP = {
     "number": "float64[pyarrow]",
 }
 DATE_FORMATS = ["date-time", "date", "year"]
+# Formats converted to dates rather than timestamps.
+DATE_ONLY_FORMATS = ["date", "year"]
 DATE_FORMATS_INPUT_FORMAT = {
     "year": "%Y",
     "date": "%Y-%m-%d",
@@ -30,7 +39,15 @@ class Exporter:
         self.s3 = boto3.client("s3")
         self.s3fs_prefix = f"s3://{BUCKET}/"
         self.config = Config.from_lambda_event(event)
+        from okdata.pipeline.schema_cache import SchemaCache
+
         self.task_config = TaskConfig.from_config(self.config)
+        self.schema_cache = SchemaCache(self.config.payload.output_dataset, self.s3)
+        # What was detected about the input, to be saved to the schema cache.
+        self.detected = {}
+        # Whether each string column is a date-time column, see `infer_dtypes`.
+        self.datetime_columns = {}
+        self.fingerprints = None
         log_add(input_config=asdict(self.task_config))
 
     def _list_s3_objects(self):
@@ -38,62 +55,156 @@ class Exporter:
             iter(self.config.payload.step_data.s3_input_prefixes.values())
         )
 
-        return self.s3.list_objects_v2(Bucket=BUCKET, Prefix=input_prefix)["Contents"]
+        with stage("list"):
+            return self.s3.list_objects_v2(Bucket=BUCKET, Prefix=input_prefix)[
+                "Contents"
+            ]
+
+    def _fingerprints(self, s3_prefix):
+        """Return the fingerprints of the input to output written to
+        `s3_prefix`, see `okdata.pipeline.fingerprints`."""
+        from okdata.pipeline.fingerprints import Fingerprints
+
+        return Fingerprints(
+            self.config.payload.output_dataset,
+            self.config.task,
+            self.config.task_config,
+            s3_prefix,
+            self.s3,
+        )
+
+    def reuse_unchanged(self, s3_objects, whole=False):
+        """Copy the output of the input files in `s3_objects` that are
+        unchanged since the previous edition from there, instead of
+        converting them again.
+
+        With `whole`, output is only reused if every file is unchanged (for
+        output made from all of them together, like a Delta table).
+
+        Return the keys of the copied output and the objects of the files
+        that are left to convert.
+        """
+        unchanged = {}
+
+        try:
+            with stage("fingerprint"):
+                for s3_object in s3_objects:
+                    filename = Exporter.filename(s3_object["Key"])
+                    previous = self.fingerprints.unchanged(filename, s3_object)
+                    if previous and previous.get("outputs"):
+                        unchanged[s3_object["Key"]] = (filename, previous)
+
+            if whole and len(unchanged) < len(s3_objects):
+                unchanged = {}
+
+            with stage("reuse"):
+                outputs = [
+                    key
+                    for filename, previous in unchanged.values()
+                    for key in self.fingerprints.reuse(filename, previous)
+                ]
+        except ClientError as e:
+            # E.g. the previous edition was deleted; convert everything.
+            log_add(fingerprints_error=str(e))
+            self.fingerprints.reset_outputs()
+            return [], s3_objects
+
+        log_add(unchanged_inputs=list(unchanged))
+        return outputs, [obj for obj in s3_objects if obj["Key"] not in unchanged]
+
+    def copy_previous_table(self, s3_prefix):
+        """With `merge_keys`, copy the Delta table of the previous edition to
+        `s3_prefix` for this edition to be merged into, see
+        `okdata.pipeline.converters.delta`."""
+        from okdata.pipeline.converters.delta import copy_previous_table
+
+        if self.task_config.merge_keys:
+            with stage("copy_previous_table"):
+                copy_previous_table(self.s3, s3_prefix)
+
+    def add_table_outputs(self, filenames):
+        """Record everything under the output prefix (like a Delta table) as
+        made from all of the input files `filenames` together."""
+        paginator = self.s3.get_paginator("list_objects_v2")
+        outputs = [
+            obj["Key"].removeprefix(self.fingerprints.prefix)
+            for page in paginator.paginate(
+                Bucket=BUCKET, Prefix=self.fingerprints.prefix
+            )
+            for obj in page.get("Contents", [])
+        ]
+
+        for filename in filenames:
+            self.fingerprints.add_outputs(filename, outputs)
 
     @staticmethod
-    def _read_csv_data(s3_key, schema, delimiter, chunksize):
+    def _read_csv_data(s3_key, schema, delimiter, chunksize, dtype=None, data=None):
+        """Read the CSV file at `s3_key`, or its content `data` if already
+        downloaded."""
+        import awswrangler as wr
+        import pandas as pd
+
         # Note: awswrangler does not seem to pass the Pandas `delimiter`
         # parameter alias for `sep` to `pandas_kwargs`. When the latter is set
         # to `None`, Pandas automatically attempts to detect the separator
         # using Python’s builtin sniffer tool, csv.Sniffer.
 
+        kwargs = {
+            "compression": "gzip" if s3_key.endswith(".gz") else "infer",
+            "sep": delimiter,
+            "chunksize": chunksize if chunksize else None,
+            "dtype": Exporter.get_dtype(schema) or dtype,
+            "dtype_backend": "pyarrow",
+            "engine": "python",
+        }
+
         try:
-            df = wr.s3.read_csv(
-                path=s3_key,
-                compression="gzip" if s3_key.endswith(".gz") else "infer",
-                sep=delimiter,
-                chunksize=chunksize if chunksize else None,
-                dtype=Exporter.get_dtype(schema),
-                dtype_backend="pyarrow",
-                engine="python",
-            )
+            if data is None:
+                df = wr.s3.read_csv(path=s3_key, **kwargs)
+            else:
+                df = pd.read_csv(io.BytesIO(data), **kwargs)
         except ValueError as ve:
             raise ConversionError(str(ve)) from ve
 
         return df
 
-    @staticmethod
-    def _read_json_data(s3_key, chunksize):
-        try:
-            return wr.s3.read_json(
-                path=s3_key,
-                compression="gzip" if s3_key.endswith(".gz") else "infer",
-                chunksize=chunksize if chunksize else None,
-                dtype=False,
-                dtype_backend="pyarrow",
-            )
-        except ValueError as ve:
-            raise ConversionError(str(ve)) from ve
+    def _read_intermediate(self, key, schema, chunksize, data=None):
+        """Read the intermediate written by `validate_csv` at `key` (or its
+        content `data` if already downloaded) into a DataFrame (or an iterator
+        of DataFrames of `chunksize` rows), typed like when reading the CSV
+        file it was made from."""
+        import pandas as pd
 
-    @staticmethod
-    def _read_xlsx_data(s3_key):
-        return wr.s3.read_excel(s3_key)
+        from okdata.pipeline import intermediate
 
-    @staticmethod
-    def infer_column_dtype_from_input(col):
-        # Check for date(time) type.
-        if getattr(col.dtypes, "pyarrow_dtype", None) == "string":
-            try:
-                return pd.to_datetime(col, format="ISO8601")
-            except ValueError:
-                # Ignore errors and keep string type.
-                pass
+        if data is None:
+            table = intermediate.read(self.s3, key)
+        else:
+            table = intermediate.load(data, key)
+        dtype = {
+            name: dtype
+            for name, dtype in (Exporter.get_dtype(schema) or {}).items()
+            if name in table.column_names
+        }
+
+        def to_pandas(table):
+            return table.to_pandas(types_mapper=pd.ArrowDtype).astype(dtype)
 
-        # Default to string type for column with missing values.
-        if getattr(col.dtypes, "pyarrow_dtype", None) in ("null", None):
-            return col.astype(pd.StringDtype("pyarrow"))
+        if not chunksize:
+            return to_pandas(table)
 
-        return col
+        return (
+            to_pandas(table.slice(offset, chunksize))
+            for offset in range(0, max(table.num_rows, 1), chunksize)
+        )
+
+    @staticmethod
+    def infer_dtypes(df, datetime_columns=None):
+        """Return `df` with column types inferred from its values, see
+        `okdata.pipeline.converters.inference`."""
+        with stage("infer_types") as s:
+            s.add(rows=len(df))
+            return infer_dtypes(df, datetime_columns)
 
     @staticmethod
     def get_dtype(schema=None):
@@ -130,6 +241,12 @@ class Exporter:
     def remove_suffix(str):
         return re.sub(r"\.csv(\.gz)?$", "", str, flags=re.IGNORECASE)
 
+    @staticmethod
+    def filename(s3_key):
+        """Return the name of the input file at `s3_key`, used to name its
+        output."""
+        return Exporter.remove_suffix(s3_key.split("/")[-1])
+
     @staticmethod
     def get_convert_date_columns(schema):
         if not schema:
@@ -143,21 +260,27 @@ class Exporter:
     @staticmethod
     def set_date_columns_on_dataframe(df, schema):
         """
-        Pandas have a date-range limitation from 1677 to 2262,
-        see https://pandas.pydata.org/pandas-docs/stable/user_guide/timeseries.html#timeseries-timestamp-limits
-        for more information on this.
+        Convert the date columns of `df` defined by `schema` to Arrow `date32`
+        (for the `date` and `year` formats) or `timestamp[us]` (for
+        `date-time`) columns, see `okdata.pipeline.converters.dates`.
 
-        If content in reader now contains data that is NOT parsable by pandas the `to_datetime()`
-        will throw an exception and the execution will stop.
+        Unlike Pandas' own timestamps, these aren't limited to the years 1677
+        to 2262.
 
-        `to_datetime()` will also throw `ValueError` if the date is invalid or not formatted
-        according to the format found in `DATE_FORMATS_INPUT_FORMAT`.
+        Raises `ValueError` if a date is invalid or not formatted according
+        to the format found in `DATE_FORMATS_INPUT_FORMAT`.
         """
         date_columns_convert = Exporter.get_convert_date_columns(schema)
 
         if date_columns_convert is False:
             return df
 
+        with stage("convert_dates") as s:
+            s.add(rows=len(df))
+            return Exporter._convert_date_columns(df, date_columns_convert)
+
+    @staticmethod
+    def _convert_date_columns(df, date_columns_convert):
         for column in date_columns_convert:
             if column["format"] not in DATE_FORMATS_INPUT_FORMAT:
                 raise KeyError(f"""Date column: {column["name"]} defined but
@@ -165,67 +288,178 @@ class Exporter:
 
             date_format = DATE_FORMATS_INPUT_FORMAT[column["format"]]
 
-            df[column["name"]] = pd.to_datetime(
+            df[column["name"]] = parse_dates(
                 df[column["name"]],
-                format=date_format,
-                # Allow the format to match anywhere in the target string.
-                exact=False,
+                date_format,
+                date_only=column["format"] in DATE_ONLY_FORMATS,
             )
 
         return df
 
-    def read_csv(self):
-        s3_objects = self._list_s3_objects()
+    def _cached_dtypes(self):
+        """Return the column types to read CSV files with, pinning the
+        columns cached as strings so that they stay strings even if a later
+        edition happens to only have numbers in them."""
+        import pandas as pd
+        import pyarrow as pa
+
+        if self.task_config.schema:
+            return None
+
+        # Not the "string[pyarrow]" alias, which is Pandas' own string type.
+        string_dtype = pd.ArrowDtype(pa.string())
+
+        return {
+            name: string_dtype
+            for name, dtype in self.schema_cache.get("dtypes", {}).items()
+            if dtype == str(string_dtype)
+        } or None
+
+    def _seed_inference(self):
+        """Let type inference reuse the date columns found in earlier
+        editions, from the schema cache."""
+        dtypes = self.schema_cache.get("dtypes")
+        if self.task_config.schema or not dtypes:
+            return
+
+        date_formats = self.schema_cache.get("date_formats", {})
+        self.datetime_columns = {
+            **{
+                name: name in date_formats
+                for name, dtype in dtypes.items()
+                if dtype == "string[pyarrow]"
+            },
+            **self.datetime_columns,
+        }
+
+    def _record_dtypes(self, df):
+        # Chunked input is read lazily, and its types aren't known up front.
+        if not self.task_config.schema and hasattr(df, "columns"):
+            self.detected.setdefault("dtypes", {}).update(
+                {name: str(dtype) for name, dtype in df.dtypes.items()}
+            )
+
+    def save_schema_cache(self):
+        """Save what was detected about the input to the schema cache."""
+        date_formats = None
+
+        if not self.task_config.schema and self.datetime_columns:
+            date_formats = {
+                name: "ISO8601"
+                for name, is_datetime in self.datetime_columns.items()
+                if is_datetime
+            }
+
+        self.schema_cache.update(**self.detected, date_formats=date_formats)
+
+    def read_csv(self, s3_objects=None):
+        if s3_objects is None:
+            s3_objects = self._list_s3_objects()
+
+        _, read = self._csv_reader(s3_objects)
+        return [read(s3_object) for s3_object in s3_objects]
+
+    def _csv_reader(self, s3_objects):
+        """Work out how to read the CSV files `s3_objects`.
+
+        Return a dict from their keys to the keys to read them from (which
+        are intermediates for files already parsed by `validate_csv`), and a
+        function reading one of them into a `(filename, DataFrame)` pair,
+        given its content if already downloaded.
+        """
+        from okdata.pipeline import intermediate
+
         schema = self.task_config.schema
         delimiter = self.task_config.delimiter
+        intermediates = intermediate.find(
+            self.s3, self.config.payload.output_dataset, s3_objects
+        )
+        csv_objects = [obj for obj in s3_objects if obj["Key"] not in intermediates]
+
+        if delimiter is None and csv_objects:
+            delimiter = self.schema_cache.delimiter(csv_objects[0]["Key"])
+
+        self.detected["delimiter"] = delimiter
+        self._seed_inference()
+        dtype = self._cached_dtypes()
 
         log_add(
             schema=schema,
-            delimiter=schema,
+            delimiter=delimiter,
             s3_keys=[obj["Key"] for obj in s3_objects],
+            intermediates=intermediates,
         )
 
-        files = []
-
-        for s3_object in s3_objects:
+        def read(s3_object, data=None):
             key = self.s3fs_prefix + s3_object["Key"]
 
-            df = self._read_csv_data(
-                key,
-                schema=schema,
-                delimiter=delimiter,
-                chunksize=self.task_config.chunksize,
-            )
-            filename = key.split("/")[-1]
-            filename = Exporter.remove_suffix(filename)
-            files.append((filename, df))
-        return files
+            # With `chunksize` set, the file is read lazily as the chunks are
+            # consumed, and that time is attributed to the stages consuming
+            # them instead.
+            with stage("read") as s:
+                if s3_object["Key"] in intermediates:
+                    # Already parsed by `validate_csv`.
+                    df = self._read_intermediate(
+                        intermediates[s3_object["Key"]],
+                        schema,
+                        self.task_config.chunksize,
+                        data=data,
+                    )
+                else:
+                    df = self._read_csv_data(
+                        key,
+                        schema=schema,
+                        delimiter=delimiter,
+                        chunksize=self.task_config.chunksize,
+                        dtype=dtype,
+                        data=data,
+                    )
+                s.add(rows=_num_rows(df), bytes_in=s3_object["Size"])
+            self._record_dtypes(df)
+            return Exporter.filename(key), df
+
+        sources = {
+            obj["Key"]: intermediates.get(obj["Key"], obj["Key"]) for obj in s3_objects
+        }
+        return sources, read
 
-    def read_json(self):
-        s3_objects = self._list_s3_objects()
-        log_add(s3_keys=[obj["Key"] for obj in s3_objects])
+    def convert_csv_pipelined(self, s3_objects, convert, write):
+        """Read the CSV files `s3_objects`, convert them and write the
+        results, one file at a time or, with the `pipeline` task config,
+        overlapping the downloads, the conversions and the uploads (see
+        `okdata.pipeline.converters.pipeline`).
 
-        files = []
-        for s3_object in s3_objects:
-            key = self.s3fs_prefix + s3_object["Key"]
-            df = self._read_json_data(key, self.task_config.chunksize)
-            filename = key.split("/")[-1]
-            filename = Exporter.remove_suffix(filename)
-            files.append((filename, df))
-        return files
-
-    def read_xlsx(self):
-        s3_objects = self._list_s3_objects()
-        log_add(s3_keys=[obj["Key"] for obj in s3_objects])
-
-        files = []
-        for s3_object in s3_objects:
-            key = self.s3fs_prefix + s3_object["Key"]
-            df = self._read_xlsx_data(key)
-            filename = key.split("/")[-1]
-            filename = Exporter.remove_suffix(filename)
-            files.append((filename, df))
-        return files
+        `convert` takes a DataFrame read from a file and returns it
+        converted. `write` takes the name of the file and the converted
+        DataFrame, and returns what it wrote. Yield the results of `write`.
+        """
+        sources, read = self._csv_reader(s3_objects)
+
+        if not self.task_config.pipeline:
+            for s3_object in s3_objects:
+                filename, df = read(s3_object)
+                yield write(filename, convert(df))
+            return
+
+        def fetch(s3_object):
+            with stage("download") as s:
+                body = self.s3.get_object(Bucket=BUCKET, Key=sources[s3_object["Key"]])
+                data = body["Body"].read()
+                s.add(bytes_in=len(data))
+            return data
+
+        def process(s3_object, data):
+            filename, df = read(s3_object, data)
+            return filename, convert(df)
+
+        from okdata.pipeline.converters.pipeline import Pipeline
+
+        yield from Pipeline(
+            fetch,
+            process,
+            lambda converted: write(*converted),
+            self.task_config.pipeline,
+        ).run(s3_objects)
 
     def export(self):
         raise NotImplementedError
@@ -248,12 +482,39 @@ class Exporter:
 class TaskConfig(object):
     delimiter: str
 
-    def __init__(self, chunksize=None, delimiter=None, schema=None):
+    def __init__(
+        self,
+        chunksize=None,
+        delimiter=None,
+        schema=None,
+        parquet=None,
+        merge_keys=None,
+        pipeline=None,
+        nested=None,
+    ):
+        from okdata.pipeline.converters.json.reader import NESTED
+        from okdata.pipeline.converters.parquet_options import ParquetOptions
+        from okdata.pipeline.converters.pipeline import PipelineOptions
+
         if delimiter == "tab":
             delimiter = "\t"
+        if merge_keys is not None and not (
+            isinstance(merge_keys, list)
+            and merge_keys
+            and all(isinstance(key, str) for key in merge_keys)
+        ):
+            raise ValueError(
+                "merge_keys must be a non-empty list of column names: ", merge_keys
+            )
+        if nested is not None and nested not in NESTED:
+            raise ValueError(f"nested must be one of {NESTED}: ", nested)
         self.chunksize = chunksize
         self.delimiter = delimiter
         self.schema = schema
+        self.parquet = ParquetOptions.from_task_config(parquet)
+        self.merge_keys = merge_keys
+        self.pipeline = PipelineOptions.from_task_config(pipeline)
+        self.nested = nested or NESTED[0]
 
     @classmethod
     def from_config(cls, config: Config):
@@ -262,4 +523,14 @@ class TaskConfig(object):
             chunksize=task_config.get("chunksize"),
             delimiter=task_config.get("delimiter"),
             schema=task_config.get("schema"),
+            parquet=task_config.get("parquet"),
+            merge_keys=task_config.get("merge_keys"),
+            pipeline=task_config.get("pipeline"),
+            nested=task_config.get("nested"),
         )
+
+
+def _num_rows(df):
+    """Return the number of rows in `df`, or 0 if it's a lazy iterator of
+    chunks."""
+    return len(df) if hasattr(df, "columns") else 0
@@ -1,42 +1,71 @@
-import awswrangler as wr
 from pandas.errors import OutOfBoundsDatetime
 
 from okdata.pipeline.converters.base import BUCKET, Exporter
+from okdata.pipeline.converters.delta import write_delta
+from okdata.pipeline.instrumentation import stage
 
 
 class DeltaExporter(Exporter):
     @staticmethod
-    def _export(source, schema, out_prefix):
+    def _export(source, schema, out_prefix, datetime_columns=None, merge_keys=None):
+        return DeltaExporter._write(
+            DeltaExporter._convert(source, schema, datetime_columns),
+            out_prefix,
+            merge_keys,
+        )
+
+    @staticmethod
+    def _convert(source, schema, datetime_columns=None):
         if schema:
-            source = Exporter.set_date_columns_on_dataframe(source, schema)
-        else:
-            source = source.apply(Exporter.infer_column_dtype_from_input)
+            return Exporter.set_date_columns_on_dataframe(source, schema)
+        return Exporter.infer_dtypes(source, datetime_columns)
 
-        wr.s3.to_deltalake(
-            df=source,
-            path=out_prefix,
-            s3_allow_unsafe_rename=True,
-        )
+    @staticmethod
+    def _write(source, out_prefix, merge_keys=None):
+        with stage("write_delta") as s:
+            s.add(rows=len(source))
+            write_delta(source, out_prefix, merge_keys)
 
         return out_prefix
 
     def export(self):
-        inputs = self.read_csv()
-        outputs = []
         errors = []
         s3_prefix = self.config.payload.output_dataset.s3_prefix.replace(
             "%stage%", "intermediate"
         )
+        self.fingerprints = self._fingerprints(s3_prefix)
+        reused, s3_objects = self.reuse_unchanged(self._list_s3_objects(), whole=True)
+        outputs = [f"s3://{BUCKET}/{s3_prefix}"] if reused else []
+        if s3_objects:
+            self.copy_previous_table(s3_prefix)
+        out_prefix = f"s3://{BUCKET}/{s3_prefix}"
+        filenames = []
+
+        def write(filename, source):
+            # Written one file at a time by the pipeline's uploader, in the
+            # order of the input files.
+            filenames.append(filename)
+            return self._write(source, out_prefix, self.task_config.merge_keys)
 
         try:
-            for filename, source in inputs:
-                out_prefix = f"s3://{BUCKET}/{s3_prefix}"
-                outputs.append(
-                    self._export(source, self.task_config.schema, out_prefix)
+            if s3_objects:
+                outputs.extend(
+                    self.convert_csv_pipelined(
+                        s3_objects,
+                        lambda source: self._convert(
+                            source, self.task_config.schema, self.datetime_columns
+                        ),
+                        write,
+                    )
                 )
         except OutOfBoundsDatetime as e:
             errors.append({"error": "OutOfBoundsDatetime", "message": str(e)})
         except ValueError as e:
             errors.append({"error": "ValueError", "message": str(e)})
+        else:
+            self.save_schema_cache()
+            if filenames:
+                self.add_table_outputs(filenames)
+            self.fingerprints.save()
 
         return self.export_response(s3_prefix, outputs, errors)
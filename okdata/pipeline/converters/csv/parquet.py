@@ -1,15 +1,35 @@
+import os
+import tempfile
+from collections import deque
 from multiprocessing import Pipe, Process, connection
 
 import awswrangler as wr
+import pandas as pd
+import pyarrow as pa
+from botocore.exceptions import ClientError
+from okdata.aws.logging import log_add
 from pandas.errors import OutOfBoundsDatetime
 
 from okdata.pipeline.converters.base import BUCKET, Exporter
+from okdata.pipeline.converters.parquet_options import ParquetOptions
+from okdata.pipeline.instrumentation import (
+    merge_stages,
+    recorded_stages,
+    reset_stages,
+    stage,
+)
 
 # The maximum number of processes to run simultaneously when exporting in
 # parallel. Set to match the number of vCPUs available in AWS Lambda, which is
 # 6 as of 2021-04-15.
 MAX_PROCESSES = 6
 
+# The maximum number of chunks, and their total size in bytes, read ahead of
+# the running processes. They're spilled to local disk (`/tmp` in AWS Lambda,
+# 512 MB by default) rather than held in memory.
+MAX_SPILLED_CHUNKS = MAX_PROCESSES
+MAX_SPILLED_BYTES = 256 * 1024 * 1024
+
 
 class ParquetExporter(Exporter):
     def s3_prefix(self):
@@ -23,62 +43,235 @@ class ParquetExporter(Exporter):
         return s3_prefix
 
     @staticmethod
-    def _export(source, schema, out_prefix, part=None, connection=None):
-        if schema:
-            source = Exporter.set_date_columns_on_dataframe(source, schema)
-        else:
-            source = source.apply(Exporter.infer_column_dtype_from_input)
-
-        outfile = "{}.{}parquet.gz".format(out_prefix, f"part.{part}." if part else "")
+    def _export(
+        source,
+        schema,
+        out_prefix,
+        part=None,
+        connection=None,
+        datetime_columns=None,
+        parquet_options=None,
+    ):
+        if connection:
+            # Only report the stages of this part back to the parent process.
+            reset_stages()
 
-        wr.s3.to_parquet(source, outfile, compression="gzip")
+        outfile = ParquetExporter._write_parquet(
+            ParquetExporter._convert(source, schema, datetime_columns),
+            out_prefix,
+            part,
+            parquet_options,
+        )
 
         if connection:
-            connection.send(outfile)
+            connection.send((outfile, recorded_stages()))
+
+        return outfile
+
+    @staticmethod
+    def _convert(source, schema, datetime_columns=None):
+        if schema:
+            return Exporter.set_date_columns_on_dataframe(source, schema)
+        return Exporter.infer_dtypes(source, datetime_columns)
+
+    @staticmethod
+    def _write_parquet(source, out_prefix, part=None, parquet_options=None):
+        parquet_options = parquet_options or ParquetOptions()
+        outfile = "{}{}{}".format(
+            out_prefix, f".part.{part}" if part else "", parquet_options.extension()
+        )
+
+        with stage("write_parquet") as s:
+            s.add(rows=len(source))
+            wr.s3.to_parquet(
+                source,
+                outfile,
+                compression=parquet_options.codec(),
+                pyarrow_additional_kwargs=parquet_options.wrangler_kwargs(source),
+            )
 
         return outfile
 
+    @staticmethod
+    def _export_spilled(path, schema, out_prefix, part, connection, dtypes, **kwargs):
+        """Export the chunk spilled to `path` by `_spill`, like `_export`."""
+        with stage("read_spilled"):
+            source = _read_spilled(path, dtypes)
+
+        return ParquetExporter._export(
+            source, schema, out_prefix, part, connection, **kwargs
+        )
+
     def _parallel_export(self, filename, source, schema, out_prefix):
         # Unfortunately AWS Lambda doesn't support `multiprocessing.Pool`, so
         # we'll have to take care of the connections ourselves.
-        connections = []
+        connections = {}
+
+        # Chunks read while every process is busy are spilled to Arrow files,
+        # which the processes memory map, rather than held in memory until a
+        # process is free.
+        spilled = deque()
+        spilled_bytes = 0
 
-        for i, df in enumerate(source):
+        kwargs = {
+            "datetime_columns": self.datetime_columns,
+            "parquet_options": self.task_config.parquet,
+        }
+
+        def start(i, target, source, path=None, **extra):
             parent_connection, child_connection = Pipe()
-            connections.append(parent_connection)
+            connections[parent_connection] = (i, path)
             Process(
-                target=self._export,
-                args=(df, schema, out_prefix, i + 1, child_connection),
+                target=target,
+                args=(source, schema, out_prefix, i + 1, child_connection),
+                kwargs={**kwargs, **extra},
             ).start()
 
-            if len(connections) >= MAX_PROCESSES:
-                for c in connection.wait(connections):
-                    yield c.recv()
-                    connections.remove(c)
+        def start_spilled():
+            nonlocal spilled_bytes
+            while spilled and len(connections) < MAX_PROCESSES:
+                i, path, size, dtypes = spilled.popleft()
+                spilled_bytes -= size
+                start(i, self._export_spilled, path, path, dtypes=dtypes)
+
+        def receive(timeout=None):
+            for c in connection.wait(list(connections), timeout):
+                i, path = connections.pop(c)
+                if path:
+                    os.remove(path)
+                yield self._receive(c, filename, i)
+
+        with tempfile.TemporaryDirectory(prefix="okdata-chunks-") as spill_dir:
+            for i, df in enumerate(source):
+                # Only chunks that changed since the previous edition are
+                # converted again.
+                with stage("fingerprint"):
+                    previous = self.fingerprints.unchanged_chunk(filename, i, df)
+                if previous and previous.get("outputs"):
+                    try:
+                        keys = self.fingerprints.reuse_chunk(filename, i, previous)
+                    except ClientError as e:
+                        log_add(fingerprints_error=str(e))
+                    else:
+                        yield from (f"s3://{BUCKET}/{key}" for key in keys)
+                        continue
 
-        while connections:
-            for c in connection.wait(connections):
-                yield c.recv()
-                connections.remove(c)
+                yield from receive(timeout=0)
+                start_spilled()
+
+                if len(connections) < MAX_PROCESSES:
+                    # The child process gets its own copy of the chunk.
+                    start(i, self._export, df)
+                else:
+                    with stage("spill") as s:
+                        path = os.path.join(spill_dir, f"{i}.arrow")
+                        size = _spill(df, path)
+                        s.add(rows=len(df), bytes_out=size)
+                        spilled.append((i, path, size, df.dtypes.to_dict()))
+                        spilled_bytes += size
+                del df
+
+                if (
+                    len(spilled) >= MAX_SPILLED_CHUNKS
+                    or spilled_bytes >= MAX_SPILLED_BYTES
+                ):
+                    yield from receive()
+                    start_spilled()
+
+            while spilled or connections:
+                start_spilled()
+                yield from receive()
+
+    def _receive(self, c, filename, chunk):
+        """Return the output file sent by a child process over `c`, merging
+        its stage metrics into the ones of this process and recording it as
+        made from chunk number `chunk` of `filename`."""
+        outfile, stages = c.recv()
+        merge_stages(stages)
+        self._add_output(filename, outfile, chunk)
+        return outfile
+
+    def _add_output(self, filename, outfile, chunk=None):
+        self.fingerprints.add_outputs(
+            filename,
+            [outfile.removeprefix(f"s3://{BUCKET}/{self.fingerprints.prefix}")],
+            chunk,
+        )
 
     def export(self):
-        inputs = self.read_csv()
         s3_prefix = self.s3_prefix()
-        outputs = []
+        self.fingerprints = self._fingerprints(s3_prefix)
+        outputs, s3_objects = self.reuse_unchanged(self._list_s3_objects())
+        outputs = [f"s3://{BUCKET}/{key}" for key in outputs]
         schema = self.task_config.schema
         errors = []
+
+        def write(filename, source):
+            outfile = self._write_parquet(
+                source,
+                f"s3://{BUCKET}/{s3_prefix}{filename}",
+                parquet_options=self.task_config.parquet,
+            )
+            self._add_output(filename, outfile)
+            return outfile
+
         try:
-            for filename, source in inputs:
-                out_prefix = f"s3://{BUCKET}/{s3_prefix}{filename}"
-                if self.task_config.chunksize:
+            if not s3_objects:
+                # Everything was reused from the previous edition.
+                pass
+            elif self.task_config.chunksize:
+                for filename, source in self.read_csv(s3_objects):
+                    out_prefix = f"s3://{BUCKET}/{s3_prefix}{filename}"
                     outputs.extend(
                         self._parallel_export(filename, source, schema, out_prefix)
                     )
-                else:
-                    outputs.append(self._export(source, schema, out_prefix))
+            else:
+                outputs.extend(
+                    self.convert_csv_pipelined(
+                        s3_objects,
+                        lambda source: self._convert(
+                            source, schema, self.datetime_columns
+                        ),
+                        write,
+                    )
+                )
         except OutOfBoundsDatetime as e:
             errors.append({"error": "OutOfBoundsDatetime", "message": str(e)})
         except ValueError as e:
             errors.append({"error": "ValueError", "message": str(e)})
+        else:
+            self.save_schema_cache()
+            self.fingerprints.save()
 
         return self.export_response(s3_prefix, outputs, errors)
+
+
+def _spill(df, path):
+    """Write the DataFrame `df` to `path` as an Arrow IPC file, returning its
+    size in bytes.
+
+    The file is left uncompressed so that it can be read without copying,
+    see `_read_spilled`.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        return sink.tell()
+
+
+def _read_spilled(path, dtypes):
+    """Return the DataFrame spilled to `path` by `_spill`, with its columns
+    of `dtypes` restored.
+
+    The file is memory mapped and its Arrow-backed columns aren't copied.
+    """
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    df = table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    # Pandas' own string type comes back as an Arrow string type.
+    return df.astype(
+        {name: dtype for name, dtype in dtypes.items() if df[name].dtype != dtype}
+    )
@@ -0,0 +1,106 @@
+"""Schema-driven parsing of date columns with Arrow.
+
+Values are parsed with Arrow's `strptime` into `date32` (dates and years) or
+`timestamp[us]` (date-times) arrays. Unlike Pandas' nanosecond timestamps,
+which are limited to the years 1677 to 2262, these cover any four digit year.
+
+The format is first matched against the whole of each value, which is the
+fast path. Columns where that fails are parsed again with the format matching
+anywhere in the values (like `pd.to_datetime(..., exact=False)`), by first
+extracting the matching part of each value with a regular expression.
+"""
+
+import functools
+import re
+
+# Regular expressions matching the `strptime` directives of the supported
+# input formats. Like `strptime` itself, the fields other than the year
+# accept values without a leading zero.
+_DIRECTIVE_PATTERNS = {
+    "%Y": r"\d{4}",
+    "%m": r"\d{1,2}",
+    "%d": r"\d{1,2}",
+    "%H": r"\d{1,2}",
+    "%M": r"\d{1,2}",
+    "%S": r"\d{1,2}",
+}
+
+
+@functools.cache
+def format_pattern(date_format):
+    """Return a regular expression matching values of `date_format`."""
+    return "".join(
+        _DIRECTIVE_PATTERNS[part] if part in _DIRECTIVE_PATTERNS else re.escape(part)
+        for part in re.split(r"(%[A-Za-z])", date_format)
+        if part
+    )
+
+
+def parse_dates(values, date_format, date_only=False):
+    """Parse the Pandas series of strings `values` with `date_format`.
+
+    Return a series of Arrow `date32` values if `date_only` is true, and
+    `timestamp[us]` values otherwise. Missing values are kept as nulls.
+
+    Raise `ValueError` if a value doesn't contain a valid date in the given
+    format.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    strings = pa.array(values, from_pandas=True)
+    if not (pa.types.is_string(strings.type) or pa.types.is_large_string(strings.type)):
+        strings = strings.cast(pa.string())
+
+    try:
+        timestamps = pc.strptime(strings, format=date_format, unit="us")
+    except pa.ArrowInvalid:
+        timestamps = pc.strptime(
+            _extract(strings, values.name, date_format), format=date_format, unit="us"
+        )
+
+    if date_only:
+        timestamps = timestamps.cast(pa.date32())
+
+    return pd.Series(
+        pd.arrays.ArrowExtensionArray(timestamps), index=values.index, name=values.name
+    )
+
+
+def _extract(strings, name, date_format):
+    """Return the first part of each of `strings` matching `date_format`."""
+    import pyarrow.compute as pc
+
+    pattern = format_pattern(date_format)
+
+    # Values typically start with the date, followed by something else (like
+    # a time). Matching from the start only is much faster than searching.
+    extracted = _extract_regex(strings, f"^{pattern}")
+    unmatched = pc.and_(pc.is_valid(strings), pc.is_null(extracted))
+
+    if pc.any(unmatched).as_py():
+        extracted = pc.coalesce(extracted, _extract_regex(strings, pattern))
+        unmatched = pc.and_(pc.is_valid(strings), pc.is_null(extracted))
+
+    if pc.any(unmatched).as_py():
+        value = pc.filter(strings, unmatched)[0].as_py()
+        raise ValueError(
+            f"Date column {name}: '{value}' doesn't match the format '{date_format}'"
+        )
+
+    return extracted
+
+
+def _extract_regex(strings, pattern):
+    """Return the first part of each of `strings` matching `pattern`, or null
+    where it doesn't match."""
+    import pyarrow.compute as pc
+
+    anchor = "^" if pattern.startswith("^") else ""
+    return pc.struct_field(
+        pc.extract_regex(
+            strings, pattern=f"{anchor}(?P<value>{pattern.removeprefix('^')})"
+        ),
+        [0],
+    )
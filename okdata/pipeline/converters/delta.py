@@ -0,0 +1,209 @@
+"""Writing converter output to Delta tables.
+
+By default each edition is appended to the table. With `merge_keys` in the
+task config, editions are instead merged into it: rows whose key columns
+match a row in the table replace it, and the others are inserted. Rows left
+out of an edition are kept.
+
+Each edition has a table of its own under its prefix. Before merging, the
+table of the latest earlier edition is copied there (see
+`copy_previous_table`), so that the merge builds on what the dataset held
+before this edition.
+
+Only rows that actually changed are updated, so only the files holding them
+are rewritten. Merging a daily full snapshot costs work in proportion to what
+changed since the day before rather than to the size of the table.
+"""
+
+import os
+import re
+
+from okdata.pipeline.instrumentation import log_add
+
+BUCKET = os.environ["BUCKET_NAME"]
+
+SOURCE_ALIAS = "source"
+TARGET_ALIAS = "target"
+
+
+def write_delta(df, path, merge_keys=None):
+    """Write the DataFrame `df` to the Delta table at `path`, merging it on
+    `merge_keys` if given."""
+    import awswrangler as wr
+    import pyarrow as pa
+
+    if not merge_keys:
+        wr.s3.to_deltalake(df=df, path=path, s3_allow_unsafe_rename=True)
+        return
+
+    _merge(pa.Table.from_pandas(df, preserve_index=False), path, merge_keys)
+
+
+def copy_previous_table(s3_client, s3_prefix):
+    """Copy the Delta table of the latest edition before the one at
+    `s3_prefix` to `s3_prefix`, unless there's a table there already.
+
+    Return the edition copied from, or `None` if there was nothing to copy.
+    """
+    match = re.fullmatch("(.*/)edition=([^/]*)/(.*)", s3_prefix)
+    if not match or _has_table(s3_client, s3_prefix):
+        return None
+
+    version_prefix, edition, table_path = match.groups()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    editions = sorted(
+        (
+            prefix["Prefix"][len(version_prefix) :].removeprefix("edition=")[:-1]
+            for page in paginator.paginate(
+                Bucket=BUCKET, Prefix=f"{version_prefix}edition=", Delimiter="/"
+            )
+            for prefix in page.get("CommonPrefixes", [])
+        ),
+        reverse=True,
+    )
+
+    for previous in editions:
+        previous_prefix = f"{version_prefix}edition={previous}/{table_path}"
+        if previous < edition and _has_table(s3_client, previous_prefix):
+            break
+    else:
+        return None
+
+    for page in paginator.paginate(Bucket=BUCKET, Prefix=previous_prefix):
+        for obj in page.get("Contents", []):
+            s3_client.copy_object(
+                Bucket=BUCKET,
+                Key=s3_prefix + obj["Key"][len(previous_prefix) :],
+                CopySource={"Bucket": BUCKET, "Key": obj["Key"]},
+            )
+
+    log_add(delta_previous_edition=previous)
+    return previous
+
+
+def _has_table(s3_client, s3_prefix):
+    return "Contents" in s3_client.list_objects_v2(
+        Bucket=BUCKET, Prefix=f"{s3_prefix}_delta_log/", MaxKeys=1
+    )
+
+
+def write_delta_arrow(data, path, merge_keys=None):
+    """Write `data` (an Arrow table or record batch reader) to the Delta
+    table at `path`, merging it on `merge_keys` if given.
+
+    Record batches are written as they're read, unless merging, which needs
+    all of them at once.
+    """
+    import pyarrow as pa
+    from deltalake import write_deltalake
+
+    if not merge_keys:
+        write_deltalake(path, data, mode="append", storage_options=_storage_options())
+        return
+
+    if isinstance(data, pa.RecordBatchReader):
+        data = data.read_all()
+
+    _merge(data, path, merge_keys)
+
+
+def write_delta_streaming(dfs, path, merge_keys=None):
+    """Write the DataFrames `dfs` to the Delta table at `path` as they come,
+    or merge them on `merge_keys` all at once if given."""
+    import awswrangler as wr
+    import pandas as pd
+
+    if not merge_keys:
+        wr.s3.to_deltalake_streaming(dfs=dfs, path=path, s3_allow_unsafe_rename=True)
+        return
+
+    # A key may appear in more than one of the DataFrames, and only the last
+    # of its rows should be merged.
+    dfs = list(dfs)
+    if dfs:
+        write_delta(pd.concat(dfs, ignore_index=True), path, merge_keys)
+
+
+def _merge(table, path, merge_keys):
+    from deltalake import DeltaTable, write_deltalake
+    from deltalake.exceptions import TableNotFoundError
+
+    missing = [key for key in merge_keys if key not in table.column_names]
+    if missing:
+        raise ValueError(f"Merge key columns missing from the input: {missing}")
+
+    source = _drop_duplicates(table, merge_keys)
+    storage_options = _storage_options()
+
+    try:
+        table = DeltaTable(path, storage_options=storage_options)
+    except TableNotFoundError:
+        write_deltalake(path, source, storage_options=storage_options)
+        log_add(delta_merge={"num_target_rows_inserted": source.num_rows})
+        return
+
+    merger = table.merge(
+        source=source,
+        predicate=" AND ".join(
+            f"{TARGET_ALIAS}.{_quote(key)} = {SOURCE_ALIAS}.{_quote(key)}"
+            for key in merge_keys
+        ),
+        source_alias=SOURCE_ALIAS,
+        target_alias=TARGET_ALIAS,
+    )
+
+    changed = _changed_predicate(
+        [name for name in source.column_names if name not in merge_keys]
+    )
+    if changed:
+        merger = merger.when_matched_update_all(predicate=changed)
+
+    log_add(delta_merge=merger.when_not_matched_insert_all().execute())
+
+
+def _drop_duplicates(table, keys):
+    """Return the Arrow `table` with only the last row of each combination of
+    values of the `keys` columns, in their original order."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    rows = table.select(keys).append_column(
+        "__row", pa.array(range(table.num_rows), pa.int64())
+    )
+    last = rows.group_by(keys, use_threads=False).aggregate([("__row", "max")])
+    indices = last["__row_max"]
+    return table.take(pc.take(indices, pc.sort_indices(indices)))
+
+
+def _changed_predicate(columns):
+    """Return a predicate matching rows where any of `columns` differ between
+    the source and the target, or `None` if there are no such columns."""
+    # DataFusion binds `OR` tighter than `IS DISTINCT FROM`.
+    return (
+        " OR ".join(
+            f"({TARGET_ALIAS}.{_quote(name)} IS DISTINCT FROM {SOURCE_ALIAS}.{_quote(name)})"
+            for name in columns
+        )
+        or None
+    )
+
+
+def _quote(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def _storage_options():
+    """Return the storage options for `deltalake`, set up like
+    `wr.s3.to_deltalake` does for the appending writes."""
+    import boto3
+
+    session = boto3.Session()
+    credentials = session.get_credentials().get_frozen_credentials()
+
+    return {
+        "AWS_ACCESS_KEY_ID": credentials.access_key,
+        "AWS_SECRET_ACCESS_KEY": credentials.secret_key,
+        "AWS_SESSION_TOKEN": credentials.token or "",
+        "AWS_REGION": session.region_name,
+        "AWS_S3_ALLOW_UNSAFE_RENAME": "TRUE",
+    }
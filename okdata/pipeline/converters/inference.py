@@ -0,0 +1,86 @@
+"""Column type inference for schema-less inputs.
+
+String columns holding ISO 8601 dates or date-times are converted to
+timestamps, and columns without any values to strings. Other columns keep the
+types they were read with.
+
+Parsing a whole column as dates only to find out that it isn't one is
+expensive, so a sample of each string column is first checked for values
+shaped like ISO 8601 dates with a regular expression. Only the columns that
+pass are parsed in full.
+
+The outcome can be passed on to the inference of later input (see the
+exporters' use of `okdata.pipeline.schema_cache`), so that later editions of
+a dataset skip the sampling and get the same column types.
+"""
+
+import random
+import re
+
+# Number of values sampled from the start of a column, and the number sampled
+# at random from the rest of it.
+SAMPLE_SIZE = 100
+
+# A lenient match of the ISO 8601 variants accepted by
+# `pd.to_datetime(..., format="ISO8601")`, which has the final say.
+_ISO8601_SHAPE = re.compile(
+    r"\s*\d{4}(?:[-/. ]?\d{2}(?:[-/. ]?\d{2})?)?"
+    r"(?:[T ]\d{2}(?::?\d{2}(?::?\d{2}(?:[.,]\d+)?)?)?)?"
+    r"\s*(?:Z|[+-]\d{2}(?::?\d{2})?)?\s*"
+)
+
+
+def sample(col, size=SAMPLE_SIZE, seed=0):
+    """Return the non-null values among the first `size` values of `col` and
+    `size` values picked at random from the rest of it."""
+    positions = list(range(min(size, len(col))))
+
+    if len(col) > size:
+        rng = random.Random(seed)
+        positions += rng.sample(range(size, len(col)), min(size, len(col) - size))
+
+    return col.iloc[positions].dropna().tolist()
+
+
+def looks_like_iso8601(values):
+    """Return true if all of `values` are shaped like ISO 8601 dates."""
+    return all(
+        isinstance(value, str) and _ISO8601_SHAPE.fullmatch(value) for value in values
+    )
+
+
+def infer_dtypes(df, datetime_columns=None):
+    """Return `df` with the types of its columns inferred from their values.
+
+    `datetime_columns` is a dict telling whether string columns are
+    date-time columns, as inferred for earlier input. The columns in it keep
+    that type, and the ones inferred are added to it.
+    """
+    import pandas as pd
+
+    if datetime_columns is None:
+        datetime_columns = {}
+    df = df.copy(deep=False)
+
+    for name, col in list(df.items()):
+        pyarrow_dtype = getattr(col.dtypes, "pyarrow_dtype", None)
+
+        if pyarrow_dtype == "string":
+            is_datetime = datetime_columns.get(name)
+            if is_datetime is None:
+                is_datetime = looks_like_iso8601(sample(col))
+
+            if is_datetime:
+                try:
+                    df[name] = pd.to_datetime(col, format="ISO8601")
+                except ValueError:
+                    # Ignore errors and keep string type.
+                    is_datetime = False
+
+            datetime_columns[name] = is_datetime
+
+        # Default to string type for column with missing values.
+        elif pyarrow_dtype in ("null", None):
+            df[name] = col.astype(pd.StringDtype("pyarrow"))
+
+    return df
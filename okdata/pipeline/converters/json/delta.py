@@ -1,34 +1,63 @@
-import awswrangler as wr
-from pandas.errors import OutOfBoundsDatetime
+from okdata.aws.logging import log_add
 
 from okdata.pipeline.converters.base import BUCKET, Exporter
+from okdata.pipeline.converters.delta import write_delta_arrow
+from okdata.pipeline.converters.json import reader
+from okdata.pipeline.instrumentation import stage
 
 
 class DeltaExporter(Exporter):
-    @staticmethod
-    def _export(source, out_prefix):
-        wr.s3.to_deltalake(
-            df=source.apply(Exporter.infer_column_dtype_from_input),
-            path=out_prefix,
-            s3_allow_unsafe_rename=True,
-        )
+    def _export(self, s3_object, out_prefix):
+        """Write the JSON file `s3_object` to the Delta table at
+        `out_prefix`, one record batch at a time."""
+        import pyarrow as pa
+
+        with stage("write_delta") as s:
+            s.add(bytes_in=s3_object["Size"])
+            batches = reader.read(
+                self.s3,
+                s3_object["Key"],
+                schema=self.task_config.schema,
+                nested=self.task_config.nested,
+                stream=bool(self.task_config.chunksize),
+            )
+
+            def counted():
+                for batch in batches:
+                    s.add(rows=batch.num_rows)
+                    yield batch
+
+            write_delta_arrow(
+                pa.RecordBatchReader.from_batches(batches.schema, counted()),
+                out_prefix,
+                self.task_config.merge_keys,
+            )
+
         return out_prefix
 
     def export(self):
-        inputs = self.read_json()
-        outputs = []
         errors = []
         s3_prefix = self.config.payload.output_dataset.s3_prefix.replace(
             "%stage%", "intermediate"
         )
+        self.fingerprints = self._fingerprints(s3_prefix)
+        reused, s3_objects = self.reuse_unchanged(self._list_s3_objects(), whole=True)
+        outputs = [f"s3://{BUCKET}/{s3_prefix}"] if reused else []
+        if s3_objects:
+            self.copy_previous_table(s3_prefix)
+        out_prefix = f"s3://{BUCKET}/{s3_prefix}"
+        log_add(s3_keys=[obj["Key"] for obj in s3_objects])
 
         try:
-            for filename, source in inputs:
-                out_prefix = f"s3://{BUCKET}/{s3_prefix}"
-                outputs.append(self._export(source, out_prefix))
-        except OutOfBoundsDatetime as e:
-            errors.append({"error": "OutOfBoundsDatetime", "message": str(e)})
+            for s3_object in s3_objects:
+                outputs.append(self._export(s3_object, out_prefix))
         except ValueError as e:
             errors.append({"error": "ValueError", "message": str(e)})
+        else:
+            if s3_objects:
+                self.add_table_outputs(
+                    [Exporter.filename(obj["Key"]) for obj in s3_objects]
+                )
+            self.fingerprints.save()
 
         return self.export_response(s3_prefix, outputs, errors)
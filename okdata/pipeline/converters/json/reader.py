@@ -0,0 +1,321 @@
+"""Reading JSON input straight into Arrow record batches.
+
+Input files hold either one JSON object per line (NDJSON) or a JSON array of
+objects. NDJSON is parsed by Arrow's JSON reader. Arrow can't read arrays,
+so their elements are decoded one by one with `JsonStream` and handed to
+Arrow as NDJSON a block at a time. With `chunksize` set, either is read and
+converted a block at a time, so that only a block is held in memory.
+
+Column types are inferred by Arrow, unless given by a JSON schema in the
+`schema` task config. Fields left out of the schema are still inferred.
+Without a schema, the types of a streamed file are inferred from its first
+block. Nested objects become struct columns, or with `"nested": "flatten"`,
+one column per field named by the path to it:
+
+    {"bydel": {"id": 1, "navn": "Alna"}} -> bydel_id, bydel_navn
+"""
+
+import io
+import itertools
+import json
+import os
+import zlib
+
+BUCKET = os.environ["BUCKET_NAME"]
+
+NESTED = ["struct", "flatten"]
+FLATTEN_SEPARATOR = "_"
+
+# Number of bytes read from S3 at a time.
+CHUNK_SIZE = 1024 * 1024
+# Number of bytes of array elements handed to Arrow at a time, like the block
+# size of its JSON reader.
+ARRAY_BLOCK_SIZE = 1024 * 1024
+
+
+def arrow_schema(schema, for_reading=False):
+    """Return the Arrow schema of the properties of the JSON `schema` with
+    types that map to Arrow types.
+
+    Arrow's JSON reader can't parse dates, so with `for_reading` they're
+    given as timestamps, to be cast to dates after reading.
+    """
+    import pyarrow as pa
+
+    return pa.schema(_fields(schema.get("properties", {}), for_reading))
+
+
+def _fields(properties, for_reading):
+    import pyarrow as pa
+
+    fields = []
+
+    for name, prop in properties.items():
+        arrow_type = _arrow_type(prop, for_reading)
+        if arrow_type is not None:
+            fields.append(pa.field(name, arrow_type))
+
+    return fields
+
+
+def _arrow_type(prop, for_reading):
+    import pyarrow as pa
+
+    jsonschema_type = prop.get("type")
+    if isinstance(jsonschema_type, list):
+        types = [t for t in jsonschema_type if t != "null"]
+        jsonschema_type = types[0] if len(types) == 1 else None
+
+    if jsonschema_type == "string":
+        if prop.get("format") == "date-time":
+            return pa.timestamp("us")
+        if prop.get("format") == "date":
+            return pa.timestamp("s") if for_reading else pa.date32()
+        return pa.string()
+    if jsonschema_type == "integer":
+        return pa.int64()
+    if jsonschema_type == "number":
+        return pa.float64()
+    if jsonschema_type == "boolean":
+        return pa.bool_()
+    if jsonschema_type == "object" and prop.get("properties"):
+        fields = _fields(prop["properties"], for_reading)
+        return pa.struct(fields) if fields else None
+    if jsonschema_type == "array" and isinstance(prop.get("items"), dict):
+        item_type = _arrow_type(prop["items"], for_reading)
+        return pa.list_(item_type) if item_type is not None else None
+
+    # Left to be inferred.
+    return None
+
+
+def delta_type(arrow_type):
+    """Return `arrow_type` as a type that Delta tables can hold: columns of
+    only nulls become strings, and timestamps get microsecond precision."""
+    import pyarrow as pa
+
+    if pa.types.is_null(arrow_type):
+        return pa.string()
+    if pa.types.is_timestamp(arrow_type):
+        return pa.timestamp("us", arrow_type.tz)
+    if pa.types.is_struct(arrow_type):
+        return pa.struct(
+            [field.with_type(delta_type(field.type)) for field in arrow_type]
+        )
+    if pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type):
+        return pa.list_(
+            arrow_type.value_field.with_type(delta_type(arrow_type.value_type))
+        )
+
+    return arrow_type
+
+
+def flatten(batch, separator=FLATTEN_SEPARATOR):
+    """Return the record `batch` with its struct columns replaced by a column
+    for each of their fields, recursively."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    names = []
+    arrays = []
+
+    def add(name, array):
+        if pa.types.is_struct(array.type):
+            for i, field in enumerate(array.type):
+                add(f"{name}{separator}{field.name}", pc.struct_field(array, [i]))
+        else:
+            names.append(name)
+            arrays.append(array)
+
+    for name, column in zip(batch.schema.names, batch.columns):
+        add(name, column)
+
+    return pa.RecordBatch.from_arrays(arrays, names=names)
+
+
+def read(s3_client, key, schema=None, nested="struct", stream=False):
+    """Return a record batch reader over the JSON file at `key`, typed by
+    the JSON `schema` if given, with nested objects kept as structs or
+    flattened by `nested`.
+
+    With `stream`, the file is read a block at a time.
+    """
+    import pyarrow as pa
+    import pyarrow.json as pj
+
+    if nested not in NESTED:
+        raise ValueError(f"nested must be one of {NESTED}: ", nested)
+
+    parse_options = pj.ParseOptions(
+        explicit_schema=arrow_schema(schema, for_reading=True) if schema else None,
+        unexpected_field_behavior="infer",
+    )
+    chunks = _chunks(s3_client, key)
+    first, chunks = _first_character(chunks)
+
+    if first == b"[":
+        batches, read_schema = _read_array(chunks, parse_options, stream)
+    elif stream:
+        reader = pj.open_json(_file(chunks), parse_options=parse_options)
+        batches, read_schema = iter(reader), reader.schema
+    else:
+        table = pj.read_json(_file(chunks), parse_options=parse_options)
+        batches, read_schema = table.to_batches(), table.schema
+
+    target_schema = _target_schema(read_schema, schema)
+    convert = (lambda batch: batch) if nested == "struct" else flatten
+
+    return pa.RecordBatchReader.from_batches(
+        convert(pa.RecordBatch.from_pylist([], schema=target_schema)).schema,
+        (convert(batch.cast(target_schema)) for batch in batches),
+    )
+
+
+def _read_array(chunks, parse_options, stream):
+    """Return the record batches of the elements of the JSON array in
+    `chunks` and their schema.
+
+    With `stream` the batches are read lazily, typed like the first block.
+    Otherwise each block is typed by itself and their types unified.
+    """
+    import pyarrow as pa
+    import pyarrow.json as pj
+
+    from okdata.pipeline.validators.json.stream import JsonStream
+
+    blocks = _array_blocks(JsonStream(chunks).items(unwrap_array=True))
+    first = next(blocks, None)
+
+    if first is None:
+        table = pa.table({}, schema=parse_options.explicit_schema or pa.schema([]))
+        return table.to_batches(), table.schema
+
+    first = pj.read_json(pa.BufferReader(first), parse_options=parse_options)
+
+    if not stream:
+        table = pa.concat_tables(
+            [
+                first,
+                *(
+                    pj.read_json(pa.BufferReader(block), parse_options=parse_options)
+                    for block in blocks
+                ),
+            ],
+            promote_options="permissive",
+        )
+        return table.to_batches(), table.schema
+
+    # Later blocks are parsed with the types of the first, like Arrow's
+    # streaming reader does.
+    fixed_options = pj.ParseOptions(
+        explicit_schema=first.schema, unexpected_field_behavior="error"
+    )
+
+    def batches():
+        yield from first.to_batches()
+        for block in blocks:
+            yield from pj.read_json(
+                pa.BufferReader(block), parse_options=fixed_options
+            ).to_batches()
+
+    return batches(), first.schema
+
+
+def _target_schema(read_schema, schema):
+    """Return the schema to convert batches read with `read_schema` to."""
+    import pyarrow as pa
+
+    typed = arrow_schema(schema) if schema else pa.schema([])
+
+    return pa.schema(
+        [
+            field.with_type(
+                delta_type(
+                    typed.field(field.name).type
+                    if field.name in typed.names
+                    else field.type
+                )
+            )
+            for field in read_schema
+        ]
+    )
+
+
+def _chunks(s3_client, key):
+    """Yield the (decompressed) content of the object at `key` in chunks."""
+    body = s3_client.get_object(Bucket=BUCKET, Key=key)["Body"]
+
+    if not key.endswith(".gz"):
+        yield from body.iter_chunks(CHUNK_SIZE)
+        return
+
+    decompressor = zlib.decompressobj(wbits=31)
+    for chunk in body.iter_chunks(CHUNK_SIZE):
+        yield decompressor.decompress(chunk)
+    yield decompressor.flush()
+
+
+def _file(chunks):
+    import pyarrow as pa
+
+    return pa.PythonFile(_ChunkFile(chunks), mode="r")
+
+
+def _first_character(chunks):
+    """Return the first non-whitespace byte of `chunks` (or `b""` if there
+    is none), and an iterator over all of `chunks`."""
+    read = []
+
+    for chunk in chunks:
+        read.append(chunk)
+        stripped = chunk.lstrip()
+        if stripped:
+            return stripped[:1], itertools.chain(read, chunks)
+
+    return b"", iter(read)
+
+
+def _array_blocks(items):
+    """Yield the elements of the JSON array decoded by `items` (an iterator
+    of `JsonItem`s) as NDJSON in blocks of about `ARRAY_BLOCK_SIZE` bytes."""
+    lines = []
+    size = 0
+
+    for item in items:
+        if not item.in_array or not isinstance(item.value, dict):
+            raise ValueError("Expected a JSON array of objects")
+
+        line = json.dumps(item.value).encode("utf-8") + b"\n"
+        lines.append(line)
+        size += len(line)
+
+        if size >= ARRAY_BLOCK_SIZE:
+            yield b"".join(lines)
+            lines = []
+            size = 0
+
+    if lines:
+        yield b"".join(lines)
+
+
+class _ChunkFile(io.RawIOBase):
+    """A file reading from an iterator of byte chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._chunk = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._chunk:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._chunk = memoryview(chunk)
+
+        n = min(len(buffer), len(self._chunk))
+        buffer[:n] = self._chunk[:n]
+        self._chunk = self._chunk[n:]
+        return n
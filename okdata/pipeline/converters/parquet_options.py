@@ -0,0 +1,152 @@
+"""Options for writing Parquet output, set by the `parquet` task config.
+
+    {
+      "compression": "zstd",     # or "snappy", "gzip", "none"
+      "compression_level": 3,    # default depends on the codec
+      "dictionary": "auto",      # or true, false, or a list of column names
+      "statistics": true,
+      "page_index": false,
+      "row_group_size": 1000000  # rows, default is Arrow's
+    }
+
+The defaults were picked by `benchmarks/parquet_options.py`. On our tables
+Zstandard at its default level writes files about the size of gzip's in a
+small fraction of the time, and reads them faster.
+
+With `"dictionary": "auto"` only columns with few distinct values compared to
+their number of rows (like district names or categories) are dictionary
+encoded; for columns of mostly unique values the dictionary is only overhead.
+The distinct values are counted in the first `DICTIONARY_SAMPLE_SIZE` rows.
+"""
+
+import re
+from dataclasses import dataclass
+
+CODECS = ["zstd", "snappy", "gzip", "none"]
+
+# Columns with at most this share of distinct values are dictionary encoded
+# with `"dictionary": "auto"`.
+DICTIONARY_MAX_DISTINCT_RATIO = 0.5
+
+# Number of rows from the start of the data to count distinct values in.
+DICTIONARY_SAMPLE_SIZE = 10_000
+
+# Characters replaced by underscores in column names by the "spark" flavor of
+# Parquet used by `wr.s3.to_parquet`.
+_SPARK_DISALLOWED_CHARS = re.compile("[ ,;{}()\n\t=]")
+
+
+@dataclass
+class ParquetOptions:
+    compression: str = "zstd"
+    compression_level: int = None
+    dictionary: object = "auto"
+    statistics: bool = True
+    page_index: bool = False
+    row_group_size: int = None
+
+    def __post_init__(self):
+        if self.compression not in CODECS:
+            raise ValueError(f"compression must be one of {CODECS}: ", self.compression)
+        if self.compression_level is not None and self.compression in [
+            "snappy",
+            "none",
+        ]:
+            raise ValueError(f"{self.compression} doesn't support compression levels")
+        if not (isinstance(self.dictionary, (bool, list)) or self.dictionary == "auto"):
+            raise ValueError(
+                'dictionary must be true, false, "auto" or a list of columns: ',
+                self.dictionary,
+            )
+        if self.row_group_size is not None and self.row_group_size < 1:
+            raise ValueError("row_group_size must be positive: ", self.row_group_size)
+
+    @classmethod
+    def from_task_config(cls, options):
+        if not options:
+            return cls()
+
+        unknown = set(options) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown Parquet options: {sorted(unknown)}")
+
+        return cls(**options)
+
+    def use_dictionary(self, data):
+        """Return the `use_dictionary` argument to write `data` (a DataFrame
+        or an Arrow table) with."""
+        if self.dictionary != "auto":
+            return self.dictionary
+
+        sample = _head(data, DICTIONARY_SAMPLE_SIZE)
+
+        return [
+            name
+            for name in _column_names(sample)
+            if _num_distinct(sample, name)
+            <= DICTIONARY_MAX_DISTINCT_RATIO * max(len(sample), 1)
+        ]
+
+    def extension(self):
+        """Return the file extension of output written with these options,
+        marking gzip compressed files as such."""
+        return ".parquet.gz" if self.compression == "gzip" else ".parquet"
+
+    def codec(self):
+        """Return the codec as named by `wr.s3.to_parquet`."""
+        return None if self.compression == "none" else self.compression
+
+    def writer_kwargs(self, data):
+        """Return the arguments to `pyarrow.parquet.ParquetWriter` (but
+        `where` and `schema`) to write `data` with."""
+        return {
+            "compression": self.compression,
+            "compression_level": self.compression_level,
+            "use_dictionary": self.use_dictionary(data),
+            "write_statistics": self.statistics,
+            "write_page_index": self.page_index,
+        }
+
+    def wrangler_kwargs(self, data):
+        """Return the `pyarrow_additional_kwargs` to `wr.s3.to_parquet` to
+        write `data` with."""
+        kwargs = self.writer_kwargs(data)
+        del kwargs["compression"]
+
+        # Dictionary columns are named as written.
+        if isinstance(kwargs["use_dictionary"], list):
+            kwargs["use_dictionary"] = [
+                _SPARK_DISALLOWED_CHARS.sub("_", name)
+                for name in kwargs["use_dictionary"]
+            ]
+
+        if self.row_group_size:
+            kwargs["write_table_args"] = {"row_group_size": self.row_group_size}
+
+        return kwargs
+
+
+def _head(data, n):
+    if hasattr(data, "column_names"):
+        return data.slice(0, n)
+    return data.iloc[:n]
+
+
+def _column_names(data):
+    if hasattr(data, "column_names"):
+        return data.column_names
+    return list(data.columns)
+
+
+def _num_distinct(data, name):
+    """Return the number of distinct values in column `name` of `data`, or
+    infinity for types that can't be counted (like nested ones)."""
+    try:
+        if hasattr(data, "column_names"):
+            import pyarrow.compute as pc
+
+            return pc.count_distinct(data[name], mode="all").as_py()
+
+        return data[name].nunique(dropna=False)
+    except (TypeError, NotImplementedError):
+        return float("inf")
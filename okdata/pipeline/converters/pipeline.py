@@ -0,0 +1,190 @@
+"""Overlapping the download, conversion and upload of input files.
+
+Converting a file means downloading it from S3, parsing and converting it,
+and writing the output back to S3. Done one after another for each file, the
+network sits idle while converting, and the CPU while downloading and
+uploading. `Pipeline` runs the three in their own threads, connected by
+bounded queues:
+
+    download -> convert -> upload
+
+so that the next file is downloaded while the current one is converted and
+the previous one is uploaded. The wall time of many files then approaches
+that of the slowest stage rather than the sum of the stages.
+
+Only the I/O overlaps with the conversion: parsing and converting holds the
+GIL, so files are converted one at a time.
+
+The pipeline is off unless enabled by the `pipeline` task config, which also
+sets the size of the queues:
+
+    {
+      "prefetch": 1,  # files downloaded ahead of the conversion
+      "upload": 1     # converted files waiting to be uploaded
+    }
+
+Each file in the pipeline is held in memory; up to `prefetch` + `upload` + 3
+of them (counting the ones being downloaded, converted and uploaded), so
+only enable it where the Lambda function has memory for that.
+
+`log_add` isn't thread-safe, so the fields logged by the stages are
+collected per file and logged by the thread running the pipeline.
+"""
+
+import queue
+import threading
+from dataclasses import dataclass
+
+from okdata.pipeline.instrumentation import collect_log, log_add, with_trace_entity
+
+# Seconds between checking whether the other stages have failed while
+# waiting on a queue.
+POLL_INTERVAL = 0.1
+
+_DONE = object()
+
+
+@dataclass
+class PipelineOptions:
+    prefetch: int = 1
+    upload: int = 1
+
+    def __post_init__(self):
+        for name in self.__dataclass_fields__:
+            value = getattr(self, name)
+            if not isinstance(value, int) or value < 1:
+                raise ValueError(f"pipeline {name} must be a positive integer: ", value)
+
+    @classmethod
+    def from_task_config(cls, options):
+        """Return the options given by the `pipeline` task config, or `None`
+        if the pipeline isn't enabled."""
+        if options is None:
+            return None
+
+        unknown = set(options) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown pipeline options: {sorted(unknown)}")
+
+        return cls(**options)
+
+
+class Pipeline:
+    """Run `fetch(item)`, then `process(item, fetched)`, then
+    `upload(processed)` for each item, in their own threads.
+
+    `fetch` and `upload` are meant for I/O, and `process` for CPU work.
+    Exceptions raised by any of them stop the pipeline and are raised again
+    by `run`.
+    """
+
+    def __init__(self, fetch, process, upload, options=None):
+        self.fetch = fetch
+        self.process = process
+        self.upload = upload
+        self.options = options or PipelineOptions()
+
+    def run(self, items):
+        """Yield the results of `upload` for `items`, in the order of
+        `items`."""
+        fetched = queue.Queue(self.options.prefetch)
+        processed = queue.Queue(self.options.upload)
+        uploaded = queue.Queue()
+        self._stop = threading.Event()
+        self._errors = []
+
+        threads = [
+            threading.Thread(
+                target=with_trace_entity(self._fetcher), args=(items, fetched)
+            ),
+            threading.Thread(
+                target=with_trace_entity(self._worker), args=(fetched, processed)
+            ),
+            threading.Thread(
+                target=with_trace_entity(self._uploader), args=(processed, uploaded)
+            ),
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            while True:
+                result = self._get(uploaded)
+                if result is _DONE:
+                    break
+                result, log = result
+                log_add(**log)
+                yield result
+        finally:
+            # Also stop the threads if the caller stops consuming.
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+    def _fetcher(self, items, fetched):
+        try:
+            for item in items:
+                if self._stop.is_set():
+                    break
+                with collect_log() as log:
+                    data = self.fetch(item)
+                self._put(fetched, (item, data, log))
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(fetched, _DONE)
+
+    def _worker(self, fetched, processed):
+        try:
+            while (job := self._get(fetched)) is not _DONE:
+                item, data, log = job
+                del job
+                with collect_log() as process_log:
+                    result = self.process(item, data)
+                del data
+                self._put(processed, (result, {**log, **process_log}))
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(processed, _DONE)
+
+    def _uploader(self, processed, uploaded):
+        try:
+            while (job := self._get(processed)) is not _DONE:
+                result, log = job
+                del job
+                with collect_log() as upload_log:
+                    uploaded.put((self.upload(result), {**log, **upload_log}))
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            uploaded.put(_DONE)
+
+    def _fail(self, e):
+        self._errors.append(e)
+        self._stop.set()
+
+    def _put(self, q, item):
+        """Put `item` on `q`, unless the pipeline is stopped while waiting
+        for room."""
+        while True:
+            try:
+                q.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                if self._stop.is_set():
+                    return
+
+    def _get(self, q):
+        """Return the next item on `q`, or `_DONE` if the pipeline is stopped
+        while waiting for one."""
+        while True:
+            try:
+                return q.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _DONE
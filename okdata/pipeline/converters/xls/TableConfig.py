@@ -54,9 +54,9 @@ class TableSource(object):
     The TableSource represents the location of a single source sub-table
     in the Excel file.
 
-    It defines the starting row and column of the sub-table. In addition,
-    it may contain the location of the cell that will populate the
-    extra column.
+    It defines the starting row and column of the sub-table, and optionally
+    its last row. In addition, it may contain the location of the cell that
+    will populate the extra column.
     """
 
     def __init__(self, json_source):
@@ -86,6 +86,14 @@ class TableSource(object):
 
         self.start_row = json_source["start_row"]
         self.start_col = json_source["start_col"]
+        self.end_row = json_source.get("end_row")
+
+        if self.end_row is not None:
+            if not type(self.end_row) is int:
+                raise TypeError("Table source end row must be an integer")
+            if self.end_row < self.start_row:
+                raise ValueError("Table source end row must not be before start row")
+
         self.extra_row = None
         self.extra_col = None
 
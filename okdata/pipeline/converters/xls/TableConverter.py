@@ -1,13 +1,16 @@
-import os
+import io
 
-import openpyxl
 import pandas as pd
+from openpyxl.cell.cell import ERROR_CODES
+from pandas.io.parsers import TextParser
 
 from okdata.pipeline.converters.xls.TableConfig import TableConfig
+from okdata.pipeline.converters.xls.readers import open_workbook
 
 
 class TableConverter:
-    """Functions to read an XLSX file and convert it to a Pandas DataFrame."""
+    """Functions to read a spreadsheet file and convert it to a Pandas
+    DataFrame."""
 
     def __init__(self, config):
         if not isinstance(config, TableConfig):
@@ -17,36 +20,59 @@ class TableConverter:
 
     @staticmethod
     def read_excel_table(source_file):
-        """Load an XLSX file from the file system and return a workbook."""
+        """Load a spreadsheet file and return a workbook.
 
-        if not isinstance(source_file, str):
-            raise TypeError("source_file must be a string")
+        `source_file` is either a path on the file system or a seekable binary
+        file object, such as an `S3File`. XLSX, legacy XLS and ODS files are
+        supported; the format is detected from the file content (see
+        `readers`).
 
-        if not os.path.splitext(source_file)[1] == ".xlsx":
-            raise ValueError(f"source_file must end in .xlsx: {source_file}")
+        The workbook is opened in read-only mode, meaning that cells are read
+        lazily from the file as rows are iterated. Call `close()` on the
+        workbook when done with it.
+        """
+
+        if isinstance(source_file, io.IOBase):
+            if not (source_file.readable() and source_file.seekable()):
+                raise ValueError("source_file must be readable and seekable")
 
-        return openpyxl.load_workbook(source_file)
+        elif not isinstance(source_file, str):
+            raise TypeError("source_file must be a string or a file object")
+
+        return open_workbook(source_file)
 
     def convert_table(self, wb):
-        """Convert an openpyxl workbook to a Pandas DataFrame.
+        """Convert a workbook to a Pandas DataFrame.
 
         The conversion is based on the table conversion configuration. If the
         configuration contains multiple sub-table data sources, it will
         concatenate them together into a single DataFrame.
         """
-        df = None
+        dfs = list(self.iter_tables(wb))
+
+        return dfs[0] if len(dfs) == 1 else pd.concat(dfs)
 
+    def iter_tables(self, wb):
+        """Yield a Pandas DataFrame for each configured sub-table in `wb`.
+
+        The sheet is read in a single pass, routing the rows to every
+        sub-table at once, and each DataFrame is yielded as soon as the last
+        row of its sub-table has been read (see `_read_sub_tables`). Callers
+        writing them out batch by batch thus don't need to hold the rows of
+        the whole sheet in memory.
+        """
         num_subtables = len(self.config.table_sources)
         if num_subtables > 1 and not self.config.column_names:
             raise ValueError(
                 "Reading multiple subtables requires setting column names explicitly"
             )
 
-        for ts in self.config.table_sources:
-            df_ts = self._extract_sub_table(wb, ts)
-            df = df_ts.copy() if df is None else pd.concat((df, df_ts))
+        sheet = self._get_sheet(wb)
 
-        return df
+        for rows, extra_value in self._read_sub_tables(
+            sheet, self.config.table_sources
+        ):
+            yield self._to_data_frame(rows, extra_value)
 
     def _extract_sub_table(self, wb, table_source):
         """Extract a sub-table based on the table source configuration.
@@ -55,17 +81,153 @@ class TableConverter:
         add this to the DataFrame and populate it using the defined extra data
         cell.
         """
-        start_row = table_source.start_row - 1
-        start_col = table_source.start_col - 1
+        sheet = self._get_sheet(wb)
+        ((rows, extra_value),) = self._read_sub_tables(sheet, [table_source])
 
-        num_subtables = len(self.config.table_sources)
+        return self._to_data_frame(rows, extra_value)
 
+    def _column_range(self, table_source):
+        """Return the first and last column of `table_source`.
+
+        The last column is `None` when the width of the table isn't known, in
+        which case every column of the sheet is read, like `pd.read_excel`.
+        """
         if self.config.column_names:
-            num_columns = len(self.config.column_names)
-            cols = range(start_col, start_col + num_columns)
-        else:
-            cols = None
+            min_col = table_source.start_col
+            return min_col, min_col + len(self.config.column_names) - 1
+
+        return 1, None
+
+    @staticmethod
+    def _end_rows(table_sources, column_ranges):
+        """Return the last row of each of `table_sources`, or `None` if it
+        runs to the end of the sheet.
+
+        A sub-table ends at its `end_row` if given, and otherwise right above
+        the first other sub-table below it in any of its columns. Extra cells
+        don't bound sub-tables; they may well lie within their own table.
+        """
+
+        def overlaps(a, b):
+            return (a[1] is None or b[0] <= a[1]) and (b[1] is None or a[0] <= b[1])
+
+        end_rows = []
+
+        for ts, column_range in zip(table_sources, column_ranges):
+            if ts.end_row is not None:
+                end_rows.append(ts.end_row)
+                continue
+
+            below = [
+                other.start_row
+                for other, other_range in zip(table_sources, column_ranges)
+                if other.start_row > ts.start_row
+                and overlaps(column_range, other_range)
+            ]
+            end_rows.append(min(below) - 1 if below else None)
+
+        return end_rows
 
+    def _read_sub_tables(self, sheet, table_sources):
+        """Yield the rows of every table source in `table_sources` from `sheet`.
+
+        Yield a `(rows, extra_value)` tuple for each table source in order,
+        where `extra_value` is the value of its extra column cell (if
+        configured). The sheet is read in a single pass, and each sub-table is
+        yielded as soon as its last row (see `_end_rows`) and extra cell have
+        been read.
+        """
+        column_ranges = [self._column_range(ts) for ts in table_sources]
+
+        if len(table_sources) == 1 and not self.config.extra_col:
+            ts = table_sources[0]
+            yield (
+                self._read_rows(
+                    sheet, ts.start_row, *column_ranges[0], max_row=ts.end_row
+                ),
+                None,
+            )
+            return
+
+        # Read the bounding box of all the sub-tables (and their extra cells)
+        # once, slicing each row into the sub-tables it belongs to.
+        extra_cells = (
+            [(ts.extra_row, ts.extra_col) for ts in table_sources]
+            if self.config.extra_col
+            else []
+        )
+        end_rows = self._end_rows(table_sources, column_ranges)
+        # The row after which each sub-table is complete.
+        done_rows = [
+            None if end is None else max([end] + [r for r, _ in extra_cells[i : i + 1]])
+            for i, end in enumerate(end_rows)
+        ]
+        min_row = min(
+            [ts.start_row for ts in table_sources] + [r for r, _ in extra_cells]
+        )
+        max_row = None if None in done_rows else max(done_rows)
+        min_col = min([c for c, _ in column_ranges] + [c for _, c in extra_cells])
+        max_col = (
+            None
+            if any(c is None for _, c in column_ranges)
+            else max([c for _, c in column_ranges] + [c for _, c in extra_cells])
+        )
+
+        sub_table_rows = [[] for _ in table_sources]
+        extra_values = [None for _ in table_sources]
+        # The number of sub-tables yielded so far.
+        num_done = 0
+
+        def sub_table(i):
+            rows = self._trim_rows(
+                sub_table_rows[i], trim_columns=column_ranges[i][1] is None
+            )
+            sub_table_rows[i] = None
+            return rows, extra_values[i]
+
+        for row_num, row in enumerate(
+            sheet.iter_rows(
+                min_row=min_row,
+                max_row=max_row,
+                min_col=min_col,
+                max_col=max_col,
+                values_only=True,
+            ),
+            start=min_row,
+        ):
+            for i, ts in enumerate(table_sources[num_done:], start=num_done):
+                if extra_cells and extra_cells[i][0] == row_num:
+                    extra_col = extra_cells[i][1] - min_col
+                    extra_values[i] = row[extra_col] if extra_col < len(row) else None
+
+                if ts.start_row <= row_num and (
+                    end_rows[i] is None or row_num <= end_rows[i]
+                ):
+                    first, last = column_ranges[i]
+                    sub_table_rows[i].append(
+                        [
+                            self._convert_cell(value)
+                            for value in row[
+                                first
+                                - min_col : None if last is None else last - min_col + 1
+                            ]
+                        ]
+                    )
+
+            while (
+                num_done < len(table_sources)
+                and done_rows[num_done] is not None
+                and done_rows[num_done] <= row_num
+            ):
+                yield sub_table(num_done)
+                num_done += 1
+
+        for i in range(num_done, len(table_sources)):
+            yield sub_table(i)
+
+    def _to_data_frame(self, rows, extra_value=None):
+        """Parse the rows of a sub-table into a DataFrame."""
+        num_subtables = len(self.config.table_sources)
         header_arg = 0 if self.config.table_has_header else None
 
         if self.config.table_has_header and num_subtables == 1:
@@ -73,15 +235,10 @@ class TableConverter:
         else:
             names_arg = self.config.column_names
 
-        df = pd.read_excel(
-            io=wb,
-            sheet_name=self.config.sheet_name,
-            engine="openpyxl",
-            header=header_arg,
-            names=names_arg,
-            usecols=cols,
-            skiprows=start_row,
-        )
+        if rows:
+            df = TextParser(rows, header=header_arg, names=names_arg).read()
+        else:
+            df = pd.DataFrame()
 
         if self.config.table_has_header:
             self.check_column_names(df)
@@ -90,13 +247,76 @@ class TableConverter:
             df = self.pivot_table(df)
 
         if self.config.extra_col:
-            sheet = wb[self.config.sheet_name]
-            value = sheet.cell(table_source.extra_row, table_source.extra_col).value
-            value = self._to_dtype(value)
-            df[self.config.extra_col.name] = value
+            df[self.config.extra_col.name] = self._to_dtype(extra_value)
 
         return self.filter_empty_rows(df)
 
+    def _get_sheet(self, wb):
+        """Return the configured worksheet of workbook `wb`."""
+        sheet_name = self.config.sheet_name
+
+        if isinstance(sheet_name, int):
+            return wb.worksheets[sheet_name]
+
+        if sheet_name not in wb.sheetnames:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+
+        return wb[sheet_name]
+
+    @staticmethod
+    def _read_rows(sheet, min_row, min_col, max_col=None, max_row=None):
+        """Read the cell values of `sheet` from `min_row` down to `max_row`,
+        in the columns from `min_col` to `max_col` (inclusive).
+
+        Cell values are converted and empty trailing rows and columns are
+        dropped the same way `pd.read_excel` does it, so that the rows can be
+        parsed into a DataFrame by `TextParser`.
+        """
+        rows = [
+            [TableConverter._convert_cell(value) for value in row]
+            for row in sheet.iter_rows(
+                min_row=min_row,
+                max_row=max_row,
+                min_col=min_col,
+                max_col=max_col,
+                values_only=True,
+            )
+        ]
+        return TableConverter._trim_rows(rows, trim_columns=max_col is None)
+
+    @staticmethod
+    def _trim_rows(rows, trim_columns):
+        """Drop empty trailing rows from `rows`, and empty trailing columns too
+        if `trim_columns` is true, padding the rows to equal length."""
+        last_row_with_data = -1
+
+        for i, row in enumerate(rows):
+            if trim_columns:
+                while row and row[-1] == "":
+                    row.pop()
+
+            if any(value != "" for value in row):
+                last_row_with_data = i
+
+        rows = rows[: last_row_with_data + 1]
+
+        if rows:
+            width = max(len(row) for row in rows)
+            rows = [row + [""] * (width - len(row)) for row in rows]
+
+        return rows
+
+    @staticmethod
+    def _convert_cell(value):
+        """Convert a cell value the same way `pd.read_excel` does."""
+        if value is None:
+            return ""
+        if isinstance(value, str) and value in ERROR_CODES:
+            return float("nan")
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
     def _to_dtype(self, value):
         """Convert cell value `value` to a defined data type."""
 
@@ -1,5 +1,12 @@
-import pandas as pd
 import csv
+from gzip import GzipFile
+
+import pandas as pd
+
+# Number of DataFrame rows formatted as CSV at a time when streaming.
+BATCH_SIZE = 10000
+
+CSV_DELIMITER = ";"
 
 
 class TableWriter(object):
@@ -30,11 +37,42 @@ class TableWriter(object):
         if not filepath:
             raise ValueError("Empty file path")
 
-        csv_string = df.to_csv(index=False, sep=";", quoting=csv.QUOTE_NONNUMERIC)
+        with open(filepath, "wb") as f:
+            self.write_csv_stream(df, f, gzip=gzip, quoting=csv.QUOTE_NONNUMERIC)
+
+    @staticmethod
+    def write_csv_stream(df, fileobj, gzip=False, batch_size=BATCH_SIZE, **kwargs):
+        """
+        Write the Pandas DataFrame as UTF-8 encoded CSV to a binary file object.
+
+        The rows are formatted `batch_size` at a time and written to
+        `fileobj` as they're ready, so the full CSV output is never held in
+        memory at once. This makes it suitable for streaming to S3 through an
+        `S3MultipartWriter`.
+
+        Args:
+            df (DataFrame): the table contents
+            fileobj (file object): binary file object to write to
+            gzip (boolean): whether to gzip the output or not
+            batch_size (int): number of rows to format at a time
+            **kwargs: extra arguments passed to `DataFrame.to_csv`
+
+        Returns:
+            None
+        """
+
+        out = GzipFile(fileobj=fileobj, mode="wb", compresslevel=5) if gzip else fileobj
 
-        if gzip:
-            with gzip.open(filepath, "wt", compresslevel=5) as f:
-                f.write(csv_string)
-        else:
-            with open(filepath, "wt", encoding="utf-8") as f:
-                f.write(csv_string)
+        try:
+            # Always write at least one batch to get the header row of empty
+            # tables.
+            for start in range(0, max(len(df), 1), batch_size):
+                batch = df.iloc[start : start + batch_size]
+                csv_string = batch.to_csv(
+                    index=False, sep=CSV_DELIMITER, header=start == 0, **kwargs
+                )
+                out.write(csv_string.encode("utf-8"))
+        finally:
+            if gzip:
+                # Flushes the gzip trailer, but leaves `fileobj` open.
+                out.close()
@@ -1,52 +1,259 @@
 import os
-import tempfile
 
 import boto3
-import awswrangler as wr
+from okdata.aws.logging import log_add
+from pandas.errors import OutOfBoundsDatetime
 
 from okdata.pipeline.converters.base import BUCKET, Exporter
+from okdata.pipeline.converters.delta import write_delta_streaming
+from okdata.pipeline.converters.inference import infer_dtypes
+from okdata.pipeline.converters.xls.TableConfig import TableConfig
 from okdata.pipeline.converters.xls.TableConverter import TableConverter
+from okdata.pipeline.converters.xls.TableWriter import TableWriter
+from okdata.pipeline.converters.xls.s3_reader import S3File
+from okdata.pipeline.converters.xls.s3_writer import S3MultipartWriter
+from okdata.pipeline.instrumentation import stage
 
 
-def convert_to_csv(xlsx_input, output, config):
-    s3 = boto3.resource("s3", region_name=os.environ["AWS_REGION"])
+def drop_unnamed_columns(df):
+    """Drop unnamed columns from `df`.
+
+    These typically appear because of some unintended whitespace in cells and
+    cause us trouble later if not removed.
+    """
+    unnamed_cols = [col for col in df.columns if col.startswith("Unnamed:")]
+    return df.drop(columns=unnamed_cols)
 
-    with tempfile.NamedTemporaryFile(suffix=".xlsx") as tmpfile:
-        s3.Bucket(BUCKET).download_file(xlsx_input, tmpfile.name)
 
+def convert_to_csv(xlsx_input, output, config, gzip=False):
+    s3 = boto3.resource("s3", region_name=os.environ["AWS_REGION"])
+
+    # Read the workbook straight from S3 instead of downloading it to `/tmp`
+    # first, so that its size isn't bounded by the Lambda's ephemeral storage.
+    with S3File(s3.meta.client, BUCKET, xlsx_input) as xlsx_file:
         conv = TableConverter(config)
-        wb = conv.read_excel_table(tmpfile.name)
-        df = conv.convert_table(wb)
-
-        # Drop unnamed columns; these typically appear because of some
-        # unintended whitespace in cells and cause us trouble later if not
-        # removed.
-        unnamed_cols = [col for col in df.columns if col.startswith("Unnamed:")]
-        df = df.drop(columns=unnamed_cols)
-
-        csv = df.to_csv(sep=";", index=False)
-        s3.Object(BUCKET, output).put(
-            Body=csv, ContentType="text/csv", ContentEncoding="utf-8"
-        )
+        wb = conv.read_excel_table(xlsx_file)
+        try:
+            df = conv.convert_table(wb)
+        finally:
+            wb.close()
 
+        log_add(xlsx_size=xlsx_file.size, xlsx_range_requests=xlsx_file.requests)
 
-class DeltaExporter(Exporter):
-    def _export(self, source, out_prefix):
-        wr.s3.to_deltalake(df=source, path=out_prefix, s3_allow_unsafe_rename=True)
-        return out_prefix
+    df = drop_unnamed_columns(df)
+
+    # Stream the CSV output to S3 in parts rather than building it as one big
+    # string first.
+    content_args = (
+        {"ContentType": "application/gzip"}
+        if gzip
+        else {"ContentType": "text/csv", "ContentEncoding": "utf-8"}
+    )
+    with S3MultipartWriter(s3.meta.client, BUCKET, output, **content_args) as out:
+        TableWriter.write_csv_stream(df, out, gzip=gzip)
+
+    log_add(csv_upload_parts=out.parts)
+
+
+class XlsxExporter(Exporter):
+    """Base class for exporters writing XLSX workbooks to a columnar format.
+
+    Tables are extracted from each workbook according to the task's
+    `TableConfig` and handed to `_export` as a stream of typed DataFrames, one
+    per sub-table, which are written out as Arrow record batches without an
+    intermediate CSV step.
+    """
+
+    def __init__(self, event):
+        super().__init__(event)
+        self.table_config = TableConfig(self.config.task_config)
+
+    def s3_prefix(self):
+        raise NotImplementedError
+
+    def _export(self, filename, tables, s3_prefix):
+        raise NotImplementedError
+
+    def _tables(self, wb, dtype):
+        schema = self.task_config.schema
+        cached_dtypes = self._cached_dtypes()
+        tables = TableConverter(self.table_config).iter_tables(wb)
+
+        while True:
+            # Measure reading each table separately, so that the time spent by
+            # the consumer between tables isn't counted.
+            with stage("read") as s:
+                df = next(tables, None)
+                if df is None:
+                    return
+
+                df = drop_unnamed_columns(df)
+                s.add(rows=len(df))
+
+                if dtype:
+                    df = df.astype({k: v for k, v in dtype.items() if k in df.columns})
+                    df = Exporter.set_date_columns_on_dataframe(df, schema)
+                else:
+                    df = df.convert_dtypes(dtype_backend="pyarrow")
+                    if cached_dtypes:
+                        df = df.astype(
+                            {k: v for k, v in cached_dtypes.items() if k in df.columns}
+                        )
+                    self._record_dtypes(df)
+                    df = infer_dtypes(df, self.datetime_columns)
+
+            yield df
 
     def export(self):
-        inputs = self.read_xlsx()
+        s3_objects = self._list_s3_objects()
+        log_add(s3_keys=[obj["Key"] for obj in s3_objects])
+        self._seed_inference()
+
+        s3_prefix = self.s3_prefix()
+        dtype = self.get_dtype(self.task_config.schema)
         outputs = []
         errors = []
-        s3_prefix = self.config.payload.output_dataset.s3_prefix.replace(
-            "%stage%", "intermediate"
-        )
+
         try:
-            for filename, source in inputs:
-                out_prefix = f"s3://{BUCKET}/{s3_prefix}"
-                outputs.append(self._export(source, out_prefix))
+            for s3_object in s3_objects:
+                key = s3_object["Key"]
+                filename = os.path.splitext(key.split("/")[-1])[0]
+
+                with S3File(self.s3, BUCKET, key) as xlsx_file:
+                    wb = TableConverter.read_excel_table(xlsx_file)
+                    try:
+                        outputs.append(
+                            self._export(filename, self._tables(wb, dtype), s3_prefix)
+                        )
+                    finally:
+                        wb.close()
+        except OutOfBoundsDatetime as e:
+            errors.append({"error": "OutOfBoundsDatetime", "message": str(e)})
         except ValueError as e:
             errors.append({"error": "ValueError", "message": str(e)})
+        else:
+            self.save_schema_cache()
 
         return self.export_response(s3_prefix, outputs, errors)
+
+
+class DeltaExporter(XlsxExporter):
+    def s3_prefix(self):
+        return self.config.payload.output_dataset.s3_prefix.replace(
+            "%stage%", "intermediate"
+        )
+
+    def export(self):
+        self.copy_previous_table(self.s3_prefix())
+        return super().export()
+
+    def _export(self, filename, tables, s3_prefix):
+        out_prefix = f"s3://{BUCKET}/{s3_prefix}"
+
+        # The tables are read while being written, so this stage includes the
+        # "read" stages.
+        with stage("write_delta"):
+            write_delta_streaming(tables, out_prefix, self.task_config.merge_keys)
+        return out_prefix
+
+
+class ParquetExporter(XlsxExporter):
+    def s3_prefix(self):
+        return (
+            self.config.payload.output_dataset.s3_prefix.replace(
+                "%stage%", "intermediate"
+            )
+            + self.config.task
+            + "/"
+        )
+
+    def _export(self, filename, tables, s3_prefix):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        options = self.task_config.parquet
+        key = f"{s3_prefix}{filename}{options.extension()}"
+        writer = None
+
+        tables = (pa.Table.from_pandas(df, preserve_index=False) for df in tables)
+
+        if not self.task_config.schema:
+            # Without a schema the column types are inferred per sub-table,
+            # and may differ between them. Parquet needs the schema up front,
+            # so read every sub-table before writing any of them.
+            tables = list(tables)
+            schema = _unified_schema([table.schema for table in tables])
+        else:
+            schema = None
+
+        # Stream the row groups to S3 as they're written rather than building
+        # the whole file in memory.
+        with S3MultipartWriter(self.s3, BUCKET, key) as out:
+            try:
+                for table in tables:
+                    with stage("write_parquet") as s:
+                        written = out.tell()
+                        if writer is None:
+                            writer = pq.ParquetWriter(
+                                out,
+                                _parquet_schema(schema or table.schema),
+                                **options.writer_kwargs(table),
+                            )
+                        writer.write_table(
+                            table.cast(writer.schema),
+                            row_group_size=options.row_group_size,
+                        )
+                        s.add(rows=table.num_rows, bytes_out=out.tell() - written)
+            finally:
+                if writer:
+                    writer.close()
+
+        return f"s3://{BUCKET}/{key}"
+
+
+def _unified_schema(schemas):
+    """Return a schema that every one of `schemas` can be cast to.
+
+    Types are promoted like `pa.unify_schemas` does, and columns with types
+    that can't be promoted to a common one become strings.
+    """
+    import pyarrow as pa
+
+    try:
+        return pa.unify_schemas(schemas, promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+
+    fields = {}
+    for schema in schemas:
+        for field in schema:
+            fields.setdefault(field.name, []).append(pa.schema([field]))
+
+    unified = []
+    for name, field_schemas in fields.items():
+        try:
+            field = pa.unify_schemas(field_schemas, promote_options="permissive")[0]
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            field = pa.field(name, pa.string())
+        unified.append(field)
+
+    return pa.schema(unified, metadata=schemas[0].metadata)
+
+
+def _parquet_schema(schema):
+    """Return `schema` with large strings (as used by Pandas' string dtype)
+    replaced by regular strings, matching what `wr.s3.to_parquet` writes for
+    the other converters."""
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            (
+                field.with_type(pa.string())
+                if pa.types.is_large_string(field.type)
+                else field
+            )
+            for field in schema
+        ],
+        metadata=schema.metadata,
+    )
@@ -1,13 +1,28 @@
+import os
 from dataclasses import asdict
+from multiprocessing import Pipe, Process, connection
 
 import boto3
 from aws_xray_sdk.core import xray_recorder
-from okdata.aws.logging import logging_wrapper
+from okdata.aws.logging import log_add, log_exception, logging_wrapper
 
 from okdata.pipeline.converters.base import BUCKET
 from okdata.pipeline.converters.xls.TableConfig import TableConfig
+from okdata.pipeline.converters.xls.TableWriter import CSV_DELIMITER
+from okdata.pipeline.instrumentation import log_stages
 from okdata.pipeline.models import Config
-from okdata.pipeline.converters.xls.export import convert_to_csv, DeltaExporter
+from okdata.pipeline.schema_cache import SchemaCache
+from okdata.pipeline.converters.xls.export import (
+    convert_to_csv,
+    DeltaExporter,
+    ParquetExporter,
+)
+
+# The maximum number of workbooks to convert simultaneously. Conversion is
+# partly bound by S3 I/O, so this is set somewhat above the number of vCPUs
+# available to the function, while keeping memory use of the workbooks in
+# flight within the function's memory size.
+MAX_PROCESSES = 4
 
 
 @logging_wrapper("xlsx-to-csv")
@@ -30,25 +45,123 @@ def xlsx_to_csv(event, context):
         output_dataset.s3_prefix.replace("%stage%", "intermediate") + config.task + "/"
     )
     table_config = TableConfig(config.task_config)
+    gzip = config.task_config.get("gzip", False)
+    extension = ".csv.gz" if gzip else ".csv"
 
-    response = s3_client.list_objects_v2(Bucket=BUCKET, Prefix=input_prefix)
+    jobs = []
+    paginator = s3_client.get_paginator("list_objects_v2")
 
-    for content in response["Contents"]:
-        xlsx_input = content["Key"]
+    for page in paginator.paginate(Bucket=BUCKET, Prefix=input_prefix):
+        for content in page.get("Contents", []):
+            xlsx_input = content["Key"]
 
-        filename = xlsx_input[len(input_prefix) :]
-        filename_prefix = filename[0 : filename.lower().rfind(".xls")]
+            filename = xlsx_input[len(input_prefix) :]
+            filename_prefix = os.path.splitext(filename)[0]
 
-        convert_to_csv(
-            xlsx_input, f"{output_prefix}{filename_prefix}.csv", table_config
-        )
+            jobs.append((xlsx_input, f"{output_prefix}{filename_prefix}{extension}"))
+
+    errors = convert_all(jobs, table_config, gzip)
+
+    log_add(num_workbooks=len(jobs), num_failed_workbooks=len(errors))
+
+    if len(errors) < len(jobs):
+        # Let the later steps reading the CSV output skip detecting its
+        # delimiter.
+        SchemaCache(output_dataset, s3_client).update(delimiter=CSV_DELIMITER)
 
     config.payload.step_data.s3_input_prefixes = {output_dataset.id: output_prefix}
-    config.payload.step_data.status = "OK"
+    config.payload.step_data.status = "CONVERSION_FAILED" if errors else "OK"
+    config.payload.step_data.errors = errors
     return asdict(config.payload.step_data)
 
 
+def convert_all(jobs, table_config, gzip=False):
+    """Convert every `(xlsx_input, output)` pair in `jobs` to CSV.
+
+    Multiple workbooks are converted in parallel in up to `MAX_PROCESSES`
+    child processes. A failing workbook doesn't stop the others; return a list
+    with an error for each workbook that couldn't be converted.
+    """
+    if len(jobs) <= 1 or MAX_PROCESSES <= 1:
+        return [
+            error
+            for error in (_convert(*job, table_config, gzip) for job in jobs)
+            if error
+        ]
+
+    # Unfortunately AWS Lambda doesn't support `multiprocessing.Pool`, so
+    # we'll have to take care of the connections ourselves.
+    errors = []
+    running = {}
+
+    def collect():
+        for c in connection.wait(running):
+            process, xlsx_input = running.pop(c)
+            try:
+                error = c.recv()
+            except EOFError:
+                error = EOFError
+            c.close()
+            # The process exits right after sending its result; reap it.
+            process.join()
+            if error is EOFError:
+                error = _error(
+                    xlsx_input,
+                    "ProcessError",
+                    f"Conversion process exited with code {process.exitcode}",
+                )
+            if error:
+                errors.append(error)
+
+    for xlsx_input, output in jobs:
+        parent_connection, child_connection = Pipe(duplex=False)
+        process = Process(
+            target=_convert,
+            args=(xlsx_input, output, table_config, gzip, child_connection),
+        )
+        process.start()
+        child_connection.close()
+        running[parent_connection] = (process, xlsx_input)
+
+        if len(running) >= MAX_PROCESSES:
+            collect()
+
+    while running:
+        collect()
+
+    return errors
+
+
+def _convert(xlsx_input, output, table_config, gzip, connection=None):
+    """Convert a single workbook, returning (or sending through `connection`)
+    an error if the conversion failed, otherwise `None`."""
+    try:
+        convert_to_csv(xlsx_input, output, table_config, gzip=gzip)
+        error = None
+    except Exception as e:
+        log_exception(e)
+        error = _error(xlsx_input, type(e).__name__, str(e))
+
+    if connection:
+        connection.send(error)
+        connection.close()
+
+    return error
+
+
+def _error(xlsx_input, error, message):
+    return {"error": error, "message": message, "file": xlsx_input}
+
+
 @logging_wrapper("xlsx-to-delta")
+@log_stages
 @xray_recorder.capture("xlsx_to_delta")
 def xlsx_to_delta(event, context):
     return DeltaExporter(event).export()
+
+
+@logging_wrapper("xlsx-to-parquet")
+@log_stages
+@xray_recorder.capture("xlsx_to_parquet")
+def xlsx_to_parquet(event, context):
+    return ParquetExporter(event).export()
@@ -0,0 +1,296 @@
+"""Spreadsheet readers keyed by file signature.
+
+Every reader loads a spreadsheet into a workbook object with the (read-only)
+interface of an openpyxl workbook that `TableConverter` relies on:
+
+- `wb.sheetnames`: list of sheet names
+- `wb.worksheets`: list of sheets
+- `wb[name]`: sheet by name
+- `wb.close()`
+- `sheet.iter_rows(min_row, min_col, max_col, values_only=True)`: iterator of
+  row tuples of cell values, with `None` for empty cells
+
+The format of a file is determined by looking at its first bytes, so the file
+extension doesn't matter.
+"""
+
+import datetime
+import io
+import itertools
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+import openpyxl
+
+# Number of bytes read from the start of a file to determine its format.
+HEADER_SIZE = 128
+
+_READERS = []
+
+
+def register_reader(signature, offset=0):
+    """Register the decorated function as the loader of files having
+    `signature` at byte `offset`.
+
+    The loader is called with a path or a seekable binary file object and
+    must return a workbook. When several signatures match a file, the loader
+    with the longest (most specific) one is used.
+    """
+
+    def decorator(load):
+        _READERS.append((offset, signature, load))
+        _READERS.sort(key=lambda reader: reader[0] + len(reader[1]), reverse=True)
+        return load
+
+    return decorator
+
+
+def open_workbook(source_file):
+    """Open the spreadsheet `source_file` (a path or a seekable binary file
+    object) with the reader matching its file signature.
+
+    Raise `ValueError` if the format isn't supported.
+    """
+    if isinstance(source_file, io.IOBase):
+        header = source_file.read(HEADER_SIZE)
+        source_file.seek(0)
+    else:
+        with open(source_file, "rb") as f:
+            header = f.read(HEADER_SIZE)
+
+    for offset, signature, load in _READERS:
+        if header[offset : offset + len(signature)] == signature:
+            return load(source_file)
+
+    raise ValueError(
+        "Unsupported spreadsheet format (expected XLSX, XLS or ODS): {}".format(
+            source_file if isinstance(source_file, str) else type(source_file).__name__
+        )
+    )
+
+
+class Workbook:
+    """Base class for workbooks of the non-openpyxl readers."""
+
+    def __init__(self, worksheets):
+        self.worksheets = worksheets
+
+    @property
+    def sheetnames(self):
+        return [sheet.title for sheet in self.worksheets]
+
+    def __getitem__(self, name):
+        for sheet in self.worksheets:
+            if sheet.title == name:
+                return sheet
+        raise KeyError(f"Worksheet {name} does not exist.")
+
+    def close(self):
+        pass
+
+
+def _row_slice(values, min_col, max_col):
+    """Return the cells from `min_col` to `max_col` (1-based, inclusive) of
+    `values`, padded with `None` up to `max_col`."""
+    row = values[min_col - 1 : max_col]
+    if max_col is not None and len(row) < max_col - min_col + 1:
+        row = row + [None] * (max_col - min_col + 1 - len(row))
+    return tuple(row)
+
+
+@register_reader(b"PK\x03\x04")
+def load_xlsx(source_file):
+    return openpyxl.load_workbook(source_file, read_only=True, data_only=True)
+
+
+# Legacy Excel (BIFF) files are OLE2 compound documents.
+@register_reader(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1")
+def load_xls(source_file):
+    import xlrd
+
+    # Sheets are only parsed once they're accessed.
+    if isinstance(source_file, io.IOBase):
+        book = xlrd.open_workbook(file_contents=source_file.read(), on_demand=True)
+    else:
+        book = xlrd.open_workbook(source_file, on_demand=True)
+
+    return XlsWorkbook(book)
+
+
+class XlsWorkbook(Workbook):
+    def __init__(self, book):
+        self.book = book
+        super().__init__(
+            [XlsSheet(book, i, name) for i, name in enumerate(book.sheet_names())]
+        )
+
+    def close(self):
+        self.book.release_resources()
+
+
+class XlsSheet:
+    def __init__(self, book, index, title):
+        self.book = book
+        self.index = index
+        self.title = title
+
+    def iter_rows(
+        self, min_row=1, max_row=None, min_col=1, max_col=None, values_only=True
+    ):
+        sheet = self.book.sheet_by_index(self.index)
+        num_rows = sheet.nrows if max_row is None else min(max_row, sheet.nrows)
+
+        for i in range(min_row - 1, num_rows):
+            values = [
+                self._convert_cell(cell_type, value)
+                for cell_type, value in zip(sheet.row_types(i), sheet.row_values(i))
+            ]
+            yield _row_slice(values, min_col, max_col)
+
+    def _convert_cell(self, cell_type, value):
+        import xlrd
+
+        if cell_type in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+            return None
+        if cell_type == xlrd.XL_CELL_DATE:
+            return xlrd.xldate.xldate_as_datetime(value, self.book.datemode)
+        if cell_type == xlrd.XL_CELL_BOOLEAN:
+            return bool(value)
+        if cell_type == xlrd.XL_CELL_ERROR:
+            return xlrd.error_text_from_code.get(value)
+        return value
+
+
+_ODS_MIMETYPE = b"mimetypeapplication/vnd.oasis.opendocument.spreadsheet"
+
+_OFFICE = "{urn:oasis:names:tc:opendocument:xmlns:office:1.0}"
+_TABLE = "{urn:oasis:names:tc:opendocument:xmlns:table:1.0}"
+_TEXT = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+
+
+# ODS files are zip archives starting with an uncompressed `mimetype` entry,
+# whose name and content follow the 30 byte local file header.
+@register_reader(_ODS_MIMETYPE, offset=30)
+def load_ods(source_file):
+    return OdsWorkbook(source_file)
+
+
+class OdsWorkbook(Workbook):
+    """A workbook reading an OpenDocument spreadsheet incrementally.
+
+    The sheet content is parsed as a stream of XML events each time the rows
+    of a sheet are iterated, so that only a single row is held in memory at a
+    time.
+    """
+
+    def __init__(self, source_file):
+        self.archive = zipfile.ZipFile(source_file)
+        super().__init__([OdsSheet(self, title) for title in self._sheet_titles()])
+
+    def _sheet_titles(self):
+        titles = []
+
+        with self.archive.open("content.xml") as content:
+            for event, elem in iterparse(content, events=("start", "end")):
+                if event == "start" and elem.tag == f"{_TABLE}table":
+                    titles.append(elem.get(f"{_TABLE}name"))
+                elif event == "end" and elem.tag == f"{_TABLE}table-row":
+                    elem.clear()
+
+        return titles
+
+    def close(self):
+        self.archive.close()
+
+
+class OdsSheet:
+    def __init__(self, workbook, title):
+        self.workbook = workbook
+        self.title = title
+
+    def iter_rows(
+        self, min_row=1, max_row=None, min_col=1, max_col=None, values_only=True
+    ):
+        row_num = 0
+        # Empty rows are only yielded once followed by a non-empty one, since
+        # spreadsheet applications pad sheets with up to a million repeated
+        # empty rows.
+        empty_rows = 0
+
+        for values, repeat in self._rows(max_col):
+            if not any(value is not None for value in values):
+                empty_rows += repeat
+                continue
+
+            for row in itertools.chain(
+                itertools.repeat([], empty_rows), itertools.repeat(values, repeat)
+            ):
+                row_num += 1
+                if max_row is not None and row_num > max_row:
+                    return
+                if row_num >= min_row:
+                    yield _row_slice(row, min_col, max_col)
+            empty_rows = 0
+
+    def _rows(self, max_col):
+        """Yield `(values, repeat)` for each row element of the sheet."""
+        in_sheet = False
+
+        with self.workbook.archive.open("content.xml") as content:
+            for event, elem in iterparse(content, events=("start", "end")):
+                if elem.tag == f"{_TABLE}table":
+                    if event == "start":
+                        in_sheet = elem.get(f"{_TABLE}name") == self.title
+                    elif in_sheet:
+                        return
+
+                elif event == "end" and elem.tag == f"{_TABLE}table-row":
+                    if in_sheet:
+                        repeat = int(elem.get(f"{_TABLE}number-rows-repeated", 1))
+                        yield self._row_values(elem, max_col), repeat
+                    elem.clear()
+
+    def _row_values(self, row, max_col):
+        values = []
+        # Repeated empty cells are only added once followed by a value, since
+        # rows are typically padded with empty cells up to the maximum number
+        # of columns.
+        empty_cells = 0
+
+        for cell in row:
+            if cell.tag not in (f"{_TABLE}table-cell", f"{_TABLE}covered-table-cell"):
+                continue
+
+            repeat = int(cell.get(f"{_TABLE}number-columns-repeated", 1))
+            value = self._convert_cell(cell)
+
+            if value is None:
+                empty_cells += repeat
+                continue
+
+            if max_col is not None and len(values) + empty_cells >= max_col:
+                break
+
+            values.extend([None] * empty_cells)
+            values.extend([value] * repeat)
+            empty_cells = 0
+
+        return values
+
+    @staticmethod
+    def _convert_cell(cell):
+        value_type = cell.get(f"{_OFFICE}value-type")
+
+        if value_type is None:
+            return None
+        if value_type in ("float", "percentage", "currency"):
+            return float(cell.get(f"{_OFFICE}value"))
+        if value_type == "boolean":
+            return cell.get(f"{_OFFICE}boolean-value") == "true"
+        if value_type == "date":
+            return datetime.datetime.fromisoformat(cell.get(f"{_OFFICE}date-value"))
+
+        # Strings, and times which are kept in their display form.
+        return "\n".join(
+            "".join(p.itertext()) for p in cell.iter(f"{_TEXT}p")
+        ) or cell.get(f"{_OFFICE}string-value")
@@ -0,0 +1,133 @@
+import errno
+import io
+from collections import OrderedDict
+
+# Number of bytes fetched from S3 per cached block.
+BLOCK_SIZE = 1024 * 1024
+
+# Number of blocks to fetch ahead of the current one when the file is being
+# read sequentially.
+READ_AHEAD_BLOCKS = 4
+
+# Maximum number of blocks kept in memory at once.
+CACHE_BLOCKS = 16
+
+
+class S3File(io.RawIOBase):
+    """A read-only, seekable file object backed by ranged GETs against an S3
+    object.
+
+    The object is fetched in blocks of `block_size` bytes which are kept in a
+    bounded LRU cache. Random access (like reading the central directory at
+    the end of a zip archive) only fetches the blocks that are touched, while
+    sequential reads fetch `read_ahead` extra blocks per request to keep the
+    number of round trips down.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket,
+        key,
+        block_size=BLOCK_SIZE,
+        read_ahead=READ_AHEAD_BLOCKS,
+        cache_blocks=CACHE_BLOCKS,
+    ):
+        if cache_blocks <= read_ahead:
+            raise ValueError("cache_blocks must be larger than read_ahead")
+
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.block_size = block_size
+        self.read_ahead = read_ahead
+        self.cache_blocks = cache_blocks
+        self.size = s3_client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        self.requests = 0
+
+        self._pos = 0
+        self._cache = OrderedDict()
+        self._next_block = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+
+        if pos < 0:
+            # Like regular files, which e.g. `zipfile` relies on when probing
+            # small files.
+            raise OSError(errno.EINVAL, f"Negative seek position: {pos}")
+
+        self._pos = pos
+        return self._pos
+
+    def readinto(self, b):
+        view = memoryview(b).cast("B")
+        n = 0
+
+        while n < len(view) and self._pos < self.size:
+            index, offset = divmod(self._pos, self.block_size)
+            chunk = self._block(index)[offset : offset + len(view) - n]
+            view[n : n + len(chunk)] = chunk
+            n += len(chunk)
+            self._pos += len(chunk)
+
+        return n
+
+    def close(self):
+        self._cache.clear()
+        super().close()
+
+    def _block(self, index):
+        """Return block number `index`, fetching it from S3 if needed."""
+        if index in self._cache:
+            self._cache.move_to_end(index)
+            return self._cache[index]
+
+        last_block = (self.size - 1) // self.block_size
+        end = index
+
+        # Only read ahead when continuing where the previous fetch ended.
+        if index == self._next_block:
+            while (
+                end < min(index + self.read_ahead, last_block)
+                and end + 1 not in self._cache
+            ):
+                end += 1
+
+        data = self._get_range(
+            index * self.block_size,
+            min((end + 1) * self.block_size, self.size) - 1,
+        )
+
+        for i in range(index, end + 1):
+            offset = (i - index) * self.block_size
+            self._cache[i] = data[offset : offset + self.block_size]
+
+        while len(self._cache) > self.cache_blocks:
+            self._cache.popitem(last=False)
+
+        self._next_block = end + 1
+        return self._cache[index]
+
+    def _get_range(self, first, last):
+        self.requests += 1
+        response = self.s3_client.get_object(
+            Bucket=self.bucket, Key=self.key, Range=f"bytes={first}-{last}"
+        )
+        return response["Body"].read()
@@ -0,0 +1,126 @@
+import io
+
+# S3 requires every part of a multipart upload except the last one to be at
+# least 5 MiB.
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+# Number of bytes buffered in memory before being uploaded as a part.
+PART_SIZE = 8 * 1024 * 1024
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """A write-only file object streaming its content to an S3 object.
+
+    Written data is buffered until `part_size` bytes are available, which are
+    then uploaded as a part of a multipart upload, keeping memory use bounded
+    by the part size regardless of the size of the object. Objects smaller
+    than a single part are uploaded with a plain `put_object` on `close()`.
+
+    Extra keyword arguments (like `ContentType`) are passed on to S3 when
+    creating the object.
+
+    When used as a context manager, the upload is completed on a clean exit
+    and aborted if an exception is raised, so no partial object is left
+    behind.
+    """
+
+    _upload_id = None
+
+    def __init__(self, s3_client, bucket, key, part_size=PART_SIZE, **kwargs):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.kwargs = kwargs
+
+        self._buffer = bytearray()
+        self._parts = []
+        self._written = 0
+
+    def __del__(self):
+        # `IOBase` closes the file when it's garbage collected, which would
+        # publish whatever was written so far. Abort instead.
+        self.abort()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._written
+
+    def write(self, b):
+        self._buffer += b
+        self._written += len(b)
+
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(self._buffer[: self.part_size])
+            del self._buffer[: self.part_size]
+
+        return len(b)
+
+    def close(self):
+        if self.closed:
+            return
+
+        if self._upload_id is None:
+            self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=bytes(self._buffer),
+                **self.kwargs,
+            )
+        else:
+            if self._buffer:
+                self._upload_part(self._buffer)
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+
+        self._buffer = bytearray()
+        super().close()
+
+    def abort(self):
+        """Discard the written data without creating the object."""
+        if self.closed:
+            return
+
+        if self._upload_id is not None:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
+
+        self._buffer = bytearray()
+        super().close()
+
+    @property
+    def parts(self):
+        """Number of parts uploaded so far."""
+        return len(self._parts)
+
+    def _upload_part(self, data):
+        if self._upload_id is None:
+            self._upload_id = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, **self.kwargs
+            )["UploadId"]
+
+        part_number = len(self._parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=bytes(data),
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
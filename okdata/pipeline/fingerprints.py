@@ -0,0 +1,221 @@
+"""Detection of unchanged input between editions of a dataset.
+
+Many datasets are uploaded again every day with few or no changes. The
+converters record a fingerprint of each of their input files along with the
+output they made from it, and compare it with the fingerprints of the
+previous edition. Output of unchanged files is copied from the previous
+edition instead of being converted again.
+
+The fingerprints of the last edition converted by each task are stored per
+dataset version (see `okdata.pipeline.version_record`):
+
+    {
+      "config": "<hash of the task config>",
+      "edition": "20200120T133701",
+      "prefix": "intermediate/green/boligpriser/version=1/edition=.../task/",
+      "files": {
+        "husholdninger": {
+          "etag": "\\"...\\"",
+          "size": 1234,
+          "sha256": "...",
+          "outputs": ["husholdninger.parquet"],
+          "chunks": [{"hash": "...", "outputs": [...]}]
+        }
+      }
+    }
+
+Output paths are relative to `prefix`. `chunks` are only recorded by
+converters that convert files in chunks, which then only convert the chunks
+that changed.
+"""
+
+import hashlib
+import json
+import os
+
+from okdata.pipeline import version_record
+from okdata.pipeline.version_record import VersionRecord
+
+BUCKET = os.environ["BUCKET_NAME"]
+
+# Number of bytes read at a time when hashing an object.
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def record_key(output_dataset, task):
+    """Return the S3 key of the fingerprints of `task` for the version of
+    `output_dataset`, or `None` if the dataset has no S3 prefix."""
+    return version_record.record_key(output_dataset, f"fingerprints/{task}.json")
+
+
+def config_hash(task_config):
+    """Return a hash of `task_config`; output made with another config can't
+    be reused."""
+    return hashlib.sha256(
+        json.dumps(task_config, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def object_sha256(s3_client, key):
+    """Return the SHA-256 hex digest of the content of the object at `key`."""
+    digest = hashlib.sha256()
+    body = s3_client.get_object(Bucket=BUCKET, Key=key)["Body"]
+
+    for block in iter(lambda: body.read(HASH_BLOCK_SIZE), b""):
+        digest.update(block)
+
+    return digest.hexdigest()
+
+
+def chunk_hash(df):
+    """Return a hash of the values of the DataFrame `df`."""
+    import pandas as pd
+
+    digest = hashlib.sha256(",".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class Fingerprints:
+    def __init__(self, output_dataset, task, task_config, prefix, s3_client=None):
+        self.record = VersionRecord(
+            record_key(output_dataset, task), "fingerprints", s3_client
+        )
+        self.edition = output_dataset.edition
+        self.config = config_hash(task_config)
+        self.prefix = prefix
+        self.files = {}
+        self._previous = None
+        self._copied = set()
+
+    def previous(self):
+        """Return the fingerprints of the previous edition, reading them from
+        S3 on first use. Fingerprints made with another task config or of
+        this same edition are ignored."""
+        if self._previous is None:
+            record = self.record.read()
+
+            if record.get("config") != self.config or record.get("edition") in (
+                None,
+                self.edition,
+            ):
+                record = {}
+
+            self._previous = record
+
+        return self._previous
+
+    def unchanged(self, filename, s3_object):
+        """Fingerprint `s3_object` (as listed by `list_objects_v2`) as input
+        file `filename`. Return its fingerprint from the previous edition if
+        it's unchanged since then, and otherwise `None`."""
+        previous = self.previous().get("files", {}).get(filename)
+        fingerprint = {"etag": s3_object["ETag"], "size": s3_object.get("Size")}
+        self.files[filename] = fingerprint
+
+        if not previous:
+            return None
+
+        if previous.get("etag") == fingerprint["etag"]:
+            fingerprint["sha256"] = previous.get("sha256")
+            return previous
+
+        # Content of another size has changed, and hashing it would mean
+        # downloading it twice (again for converting it).
+        if previous.get("size") not in (None, fingerprint["size"]):
+            return None
+
+        # Equal content doesn't always give equal ETags (e.g. for multipart
+        # uploads, or with KMS encryption), so compare the content itself.
+        fingerprint["sha256"] = object_sha256(self.record.client(), s3_object["Key"])
+
+        if previous.get("sha256") == fingerprint["sha256"]:
+            return previous
+
+        return None
+
+    def unchanged_chunk(self, filename, i, df):
+        """Fingerprint the DataFrame `df` as chunk number `i` of input file
+        `filename`. Return the chunk's fingerprint from the previous edition
+        if it's unchanged since then, and otherwise `None`."""
+        chunks = self.files.setdefault(filename, {}).setdefault("chunks", [])
+        chunks.append({"hash": chunk_hash(df)})
+
+        previous = self.previous().get("files", {}).get(filename, {})
+        previous_chunks = previous.get("chunks", [])
+
+        if i < len(previous_chunks) and previous_chunks[i]["hash"] == chunks[i]["hash"]:
+            return previous_chunks[i]
+
+        return None
+
+    def reuse(self, filename, previous):
+        """Copy the output made from input file `filename` in the previous
+        edition, given its `previous` fingerprint, returning the new keys."""
+        keys = self._copy(previous.get("outputs", []))
+        self.add_outputs(filename, previous.get("outputs", []))
+
+        if previous.get("chunks"):
+            self.files[filename]["chunks"] = previous["chunks"]
+
+        return keys
+
+    def reuse_chunk(self, filename, i, previous):
+        """Copy the output made from chunk number `i` of input file
+        `filename` in the previous edition, given its `previous` fingerprint,
+        returning the new keys."""
+        keys = self._copy(previous.get("outputs", []))
+        self.add_outputs(filename, previous.get("outputs", []), chunk=i)
+        return keys
+
+    def add_outputs(self, filename, outputs, chunk=None):
+        """Record `outputs` (paths relative to the output prefix) as made from
+        input file `filename`, or from its chunk number `chunk`."""
+        fingerprint = self.files.setdefault(filename, {})
+        fingerprint.setdefault("outputs", []).extend(outputs)
+
+        if chunk is not None:
+            fingerprint["chunks"][chunk]["outputs"] = outputs
+
+    def reset_outputs(self):
+        """Forget the outputs recorded so far, e.g. after failing to reuse
+        them."""
+        for fingerprint in self.files.values():
+            fingerprint.pop("outputs", None)
+            fingerprint.pop("chunks", None)
+
+        self._copied.clear()
+
+    def save(self):
+        """Save the fingerprints recorded for this edition."""
+        self.record.write(
+            {
+                "config": self.config,
+                "edition": self.edition,
+                "prefix": self.prefix,
+                "files": self.files,
+            }
+        )
+
+    def _copy(self, outputs):
+        keys = []
+
+        # Output made from several input files (like a Delta table) is only
+        # copied once.
+        for output in outputs:
+            if output in self._copied:
+                continue
+
+            key = self.prefix + output
+            self.record.client().copy_object(
+                Bucket=BUCKET,
+                Key=key,
+                CopySource={
+                    "Bucket": BUCKET,
+                    "Key": self.previous()["prefix"] + output,
+                },
+            )
+            self._copied.add(output)
+            keys.append(key)
+
+        return keys
@@ -0,0 +1,201 @@
+"""Per-stage timing and resource metrics for pipeline steps.
+
+Wrap each stage of a step (listing, reading, parsing, uploading, ...) in
+`stage`:
+
+    with stage("read") as s:
+        df = read(...)
+        s.add(rows=len(df), bytes_in=size)
+
+For every stage the wall time, CPU time (including that of finished child
+processes), rows and bytes processed and the peak RSS of the process are
+recorded. Repeated stages within an invocation are summed. Each stage is
+traced as an X-Ray subsegment with its metrics as metadata, and handlers
+wrapped in `log_stages` log the totals under `stages` once they return.
+
+The peak RSS (`process_peak_rss_mb`) is the high-water mark of the whole
+process at the end of the stage. A warm Lambda function keeps its process
+between invocations, so it may stem from an earlier invocation.
+
+Set the environment variable `STAGE_METRICS_ENABLED` to `false` to disable
+the instrumentation, making `stage` a no-op.
+
+The logger behind `okdata.aws.logging.log_add` isn't thread-safe. Code that
+may run in other threads logs with `log_add` from here instead, which within
+`collect_log` collects the fields for the thread that started the others to
+log.
+"""
+
+import functools
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+from aws_xray_sdk.core import xray_recorder
+from okdata.aws.logging import log_add as _log_add
+
+ENABLED = os.environ.get("STAGE_METRICS_ENABLED", "true").lower() != "false"
+
+_COUNTERS = ("rows", "bytes_in", "bytes_out")
+
+_stages = {}
+_stages_lock = threading.Lock()
+
+_collected_log = threading.local()
+
+
+def reset_stages():
+    """Forget the stages recorded so far.
+
+    Called at the start of each invocation, since module state survives
+    between invocations of a warm Lambda function.
+    """
+    with _stages_lock:
+        _stages.clear()
+
+
+def recorded_stages():
+    """Return the metrics of the stages recorded since the last reset."""
+    with _stages_lock:
+        return {name: dict(metrics) for name, metrics in _stages.items()}
+
+
+def merge_stages(stages):
+    """Add `stages` recorded elsewhere (e.g. in a child process) to the
+    stages recorded by this process."""
+    for name, metrics in stages.items():
+        _record(name, metrics)
+
+
+def log_stages(handler):
+    """Wrap the Lambda `handler` to record the stages of each invocation from
+    scratch, logging their totals once it returns (or raises)."""
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        reset_stages()
+        try:
+            return handler(event, context)
+        finally:
+            stages = recorded_stages()
+            if stages:
+                log_add(stages=stages)
+
+    return wrapper
+
+
+def stage(name):
+    """Return a context manager measuring the stage `name`."""
+    return Stage(name) if ENABLED else _NULL_STAGE
+
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.counters = dict.fromkeys(_COUNTERS, 0)
+
+    def add(self, rows=0, bytes_in=0, bytes_out=0):
+        """Count rows and bytes processed by the stage."""
+        self.counters["rows"] += rows
+        self.counters["bytes_in"] += bytes_in
+        self.counters["bytes_out"] += bytes_out
+
+    def __enter__(self):
+        self._subsegment = xray_recorder.begin_subsegment(self.name)
+        self._start_wall = time.perf_counter()
+        self._start_cpu = _cpu_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        metrics = {
+            "calls": 1,
+            "wall_ms": round((time.perf_counter() - self._start_wall) * 1000, 3),
+            "cpu_ms": round((_cpu_time() - self._start_cpu) * 1000, 3),
+            **{key: value for key, value in self.counters.items() if value},
+            "process_peak_rss_mb": round(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+            ),
+        }
+
+        if self._subsegment:
+            self._subsegment.put_metadata("metrics", metrics, "stage")
+            xray_recorder.end_subsegment()
+
+        _record(self.name, metrics)
+
+
+class _NullStage:
+    def add(self, rows=0, bytes_in=0, bytes_out=0):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def log_add(**fields):
+    """Log `fields` like `okdata.aws.logging.log_add`, or collect them if
+    called within `collect_log` in this thread."""
+    collected = getattr(_collected_log, "fields", None)
+
+    if collected is None:
+        _log_add(**fields)
+    else:
+        collected.update(fields)
+
+
+@contextmanager
+def collect_log():
+    """Collect the fields logged with `log_add` in this thread within the
+    block into the dict returned, instead of logging them."""
+    previous = getattr(_collected_log, "fields", None)
+    _collected_log.fields = fields = {}
+
+    try:
+        yield fields
+    finally:
+        _collected_log.fields = previous
+
+
+def with_trace_entity(f):
+    """Wrap `f` so that it runs within the caller's X-Ray trace entity.
+
+    Needed for functions running in a separate thread, where the X-Ray
+    recorder otherwise can't find the current segment.
+    """
+    trace_entity = xray_recorder.get_trace_entity()
+
+    def wrapper(*args, **kwargs):
+        xray_recorder.set_trace_entity(trace_entity)
+        try:
+            return f(*args, **kwargs)
+        finally:
+            xray_recorder.clear_trace_entities()
+
+    return wrapper
+
+
+def _cpu_time():
+    """Return the CPU time spent by this process and its reaped children."""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def _record(name, metrics):
+    # Stages may run in several threads at once, see
+    # `okdata.pipeline.converters.pipeline`.
+    with _stages_lock:
+        totals = _stages.setdefault(name, {})
+
+        for key, value in metrics.items():
+            if key == "process_peak_rss_mb":
+                totals[key] = max(totals.get(key, 0), value)
+            else:
+                totals[key] = round(totals.get(key, 0) + value, 3)
@@ -0,0 +1,196 @@
+"""Typed intermediates of validated CSV files.
+
+When configured to, `validate_csv` writes the rows it has parsed and
+validated as an Arrow IPC or Parquet file, so that the CSV converters can
+read them from there instead of parsing the CSV file again:
+
+    intermediate/green/boligpriser/version=1/validated/edition=.../t.arrow
+
+String values that `pd.read_csv` reads as missing by default (like "NA" and
+"null") are written as nulls, so that the converters get the same values
+from an intermediate as from its CSV file.
+
+Each intermediate records the ETag of the CSV file it was made from, and is
+only used as long as the CSV file is unchanged. Validation only covers the
+first file of an input, so inputs of several files are partly read from CSV.
+"""
+
+import os
+import re
+
+from botocore.exceptions import ClientError
+
+BUCKET = os.environ["BUCKET_NAME"]
+
+# Supported formats, by their file extension.
+FORMATS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+JSONSCHEMA_TO_ARROW_TYPE = {
+    "string": "string",
+    "integer": "int64",
+    "boolean": "bool",
+    "number": "float64",
+    "null": "null",
+}
+
+# The values read as missing by `pd.read_csv` by default, see the `na_values`
+# parameter.
+NA_VALUES = [
+    "",
+    "#N/A",
+    "#N/A N/A",
+    "#NA",
+    "-1.#IND",
+    "-1.#QNAN",
+    "-NaN",
+    "-nan",
+    "1.#IND",
+    "1.#QNAN",
+    "<NA>",
+    "N/A",
+    "NA",
+    "NULL",
+    "NaN",
+    "None",
+    "n/a",
+    "nan",
+    "null",
+]
+
+
+def prefix(output_dataset):
+    """Return the S3 prefix of the intermediates of `output_dataset`.
+
+    They're kept outside of the edition's own prefix, which the converters
+    write their output to.
+    """
+    s3_prefix = output_dataset.s3_prefix.replace("%stage%", "intermediate")
+    validated_prefix = re.sub("(edition=[^/]*/)$", r"validated/\1", s3_prefix)
+
+    if validated_prefix == s3_prefix:
+        return f"{s3_prefix}validated/"
+
+    return validated_prefix
+
+
+def _arrow_type(jsonschema_type):
+    # Values of columns with several types are kept as strings by the parser.
+    if isinstance(jsonschema_type, str):
+        return JSONSCHEMA_TO_ARROW_TYPE.get(jsonschema_type, "string")
+    return "string"
+
+
+def _basename(s3_key):
+    return re.sub(r"\.csv(\.gz)?$", "", s3_key.split("/")[-1], flags=re.IGNORECASE)
+
+
+def write(s3_client, output_dataset, input_key, etag, rows, columns, fmt, names=None):
+    """Write `rows` parsed from the CSV file at `input_key` with `etag` as an
+    intermediate in `fmt`, returning its key.
+
+    `rows` are dicts from column names to parsed values, with missing values
+    left out. `columns` is a list of `(name, jsonschema_type)` pairs. The
+    columns are renamed to `names` if given.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported intermediate format: {fmt}")
+
+    schema = pa.schema(
+        [(name, _arrow_type(jsonschema_type)) for name, jsonschema_type in columns]
+    )
+    table = _with_nulls(pa.Table.from_pylist(rows, schema=schema))
+    if names:
+        table = table.rename_columns(names)
+
+    sink = pa.BufferOutputStream()
+
+    if fmt == "arrow":
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, sink)
+
+    key = prefix(output_dataset) + _basename(input_key) + FORMATS[fmt]
+    s3_client.put_object(
+        Bucket=BUCKET,
+        Key=key,
+        Body=sink.getvalue().to_pybytes(),
+        Metadata={"source-etag": etag},
+    )
+    return key
+
+
+def _with_nulls(table):
+    """Return `table` with the values of its string columns found in
+    `NA_VALUES` replaced by nulls."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    na_values = pa.array(NA_VALUES)
+
+    for i, field in enumerate(table.schema):
+        if pa.types.is_string(field.type):
+            column = table.column(i)
+            table = table.set_column(
+                i,
+                field,
+                pc.if_else(
+                    pc.is_in(column, value_set=na_values),
+                    pa.scalar(None, field.type),
+                    column,
+                ),
+            )
+
+    return table
+
+
+def find(s3_client, output_dataset, input_objects):
+    """Return a dict from the keys of `input_objects` (as listed by
+    `list_objects_v2`) to the keys of their intermediates, for the ones
+    having an intermediate made from their current content."""
+    listed = s3_client.list_objects_v2(
+        Bucket=BUCKET, Prefix=prefix(output_dataset)
+    ).get("Contents", [])
+    intermediates = {}
+
+    for intermediate in listed:
+        name, extension = os.path.splitext(intermediate["Key"].split("/")[-1])
+        if extension in FORMATS.values():
+            intermediates[name] = intermediate["Key"]
+
+    found = {}
+
+    for input_object in input_objects:
+        key = intermediates.get(_basename(input_object["Key"]))
+        if not key:
+            continue
+
+        try:
+            metadata = s3_client.head_object(Bucket=BUCKET, Key=key)["Metadata"]
+        except ClientError:
+            continue
+
+        if metadata.get("source-etag") == input_object["ETag"]:
+            found[input_object["Key"]] = key
+
+    return found
+
+
+def read(s3_client, key):
+    """Return the intermediate at `key` as an Arrow table."""
+    return load(s3_client.get_object(Bucket=BUCKET, Key=key)["Body"].read(), key)
+
+
+def load(body, key):
+    """Return the intermediate `body` downloaded from `key` as an Arrow
+    table."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if key.endswith(FORMATS["arrow"]):
+        return pa.ipc.open_file(pa.BufferReader(body)).read_all()
+
+    return pq.read_table(pa.BufferReader(body))
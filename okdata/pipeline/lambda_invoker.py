@@ -1,42 +1,116 @@
+import hashlib
 import json
+import os
 
 import boto3
-from aws_xray_sdk.core import patch_all, xray_recorder
+from aws_xray_sdk.core import patch, xray_recorder
+from botocore.config import Config as BotoConfig
 
 from okdata.aws.logging import log_add, logging_wrapper
+from okdata.pipeline.common import XRAY_PATCHED_MODULES
 from okdata.pipeline.models import Config
 
-patch_all()
+patch(XRAY_PATCHED_MODULES)
 
-lambda_client = boto3.client("lambda", "eu-west-1")
+# Synchronously invoked functions may run for up to 15 minutes, so the read
+# timeout must cover that. Retries are disabled since a retried invocation
+# would run the pipeline step twice.
+lambda_client = boto3.client(
+    "lambda",
+    "eu-west-1",
+    config=BotoConfig(
+        connect_timeout=5,
+        read_timeout=900,
+        retries={"max_attempts": 0},
+        tcp_keepalive=True,
+    ),
+)
+s3_client = boto3.client("s3")
 
 
 @logging_wrapper("lambda-invoker")
 @xray_recorder.capture("invoke_lambda")
 def invoke_lambda(event, context):
     config = Config.from_lambda_event(event)
-    function_arn = config.payload.pipeline.task_config.get(config.task).get("arn")
+    task_config = config.payload.pipeline.task_config.get(config.task)
+    function_arn = task_config.get("arn")
+    invocation_type = task_config.get("invocation_type", "RequestResponse")
 
-    log_add(function_arn=function_arn)
-    log_add(event=event)
+    log_add(function_arn=function_arn, invocation_type=invocation_type)
+
+    if invocation_type == "Event":
+        result_key = result_s3_key(config)
+        event = {**event, "result_s3_key": result_key}
+
+    payload = json.dumps(event).encode("utf-8")
+
+    # Only log a summary of the event; it may be large.
+    log_add(
+        event_size=len(payload),
+        event_sha256=hashlib.sha256(payload).hexdigest(),
+    )
 
     response = lambda_client.invoke(
         FunctionName=function_arn,
-        Payload=json.dumps(event),
-        InvocationType="RequestResponse",
+        Payload=payload,
+        InvocationType=invocation_type,
     )
-    result = read_result(response)
-    return result
+
+    if invocation_type == "Event":
+        # The result is picked up by `collect_result` in a later state.
+        return {"result_s3_key": result_key}
+
+    return read_result(response)
+
+
+@logging_wrapper("lambda-invoker")
+@xray_recorder.capture("collect_result")
+def collect_result(event, context):
+    """Return the result of an asynchronous invocation by `invoke_lambda`,
+    deleting it from S3.
+
+    Raise `ResultNotReady` if the invoked function hasn't written it yet, to
+    be retried by the state machine.
+    """
+    result_key = event["result_s3_key"]
+    bucket = os.environ["BUCKET_NAME"]
+
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=result_key)
+    except s3_client.exceptions.NoSuchKey:
+        raise ResultNotReady(f"No result at {result_key} yet")
+
+    log_add(result_size=response["ContentLength"])
+
+    try:
+        return read_result({"Payload": response["Body"]})
+    finally:
+        s3_client.delete_object(Bucket=bucket, Key=result_key)
 
 
 class InvokedLambdaError(Exception):
     pass
 
 
+class ResultNotReady(Exception):
+    pass
+
+
 def read_result(response):
-    result = json.loads(response.get("Payload").read().decode("utf-8"))
+    # `json.loads` accepts bytes directly, sparing us a decoded copy.
+    result = json.loads(response.get("Payload").read())
 
     if "errorMessage" in result:
         raise InvokedLambdaError(result)
 
     return result
+
+
+def result_s3_key(config):
+    """Return the S3 key where an asynchronously invoked function should
+    write its result."""
+    return "{}{}/{}.json".format(
+        config.payload.output_dataset.s3_prefix.replace("%stage%", "intermediate"),
+        config.task,
+        config.execution_name,
+    )
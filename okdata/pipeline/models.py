@@ -1,5 +1,12 @@
+import json
+import os
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, Iterator, List
+
+# Input events larger than this (in bytes, serialized) are written to S3 and
+# passed between steps by reference instead of inline, staying well clear of
+# the Lambda and Step Functions payload limits.
+INPUT_EVENTS_SPILL_THRESHOLD = 128 * 1024
 
 
 @dataclass(frozen=True)
@@ -22,6 +29,7 @@ class StepData:
     errors: list
     s3_input_prefixes: dict = None
     input_events: List[Dict] = None
+    input_events_ref: dict = None
 
     def __init__(
         self,
@@ -29,13 +37,24 @@ class StepData:
         errors,
         s3_input_prefixes: dict = None,
         input_events: List[Dict] = None,
+        input_events_ref: dict = None,
     ):
-        if input_events and s3_input_prefixes:
+        """`input_events_ref` points to input events stored in S3 as
+        newline-delimited JSON, and is used in place of `input_events` when
+        they're too large to pass inline. It's a dict with the keys `bucket`,
+        `key` and `count`.
+        """
+        if input_events and input_events_ref:
+            raise ValueError(
+                "Can only set values for one of 'input_events' or 'input_events_ref'"
+            )
+
+        if (input_events or input_events_ref) and s3_input_prefixes:
             raise ValueError(
                 "Can only set values for one of 's3_input_prefixes' or 'input_events'"
             )
 
-        if not (input_events or s3_input_prefixes):
+        if not (input_events or input_events_ref or s3_input_prefixes):
             raise ValueError(
                 "Either 's3_input_prefixes' or 'input_events' must be assigned a value"
             )
@@ -44,6 +63,7 @@ class StepData:
         self.errors = errors
         self.s3_input_prefixes = s3_input_prefixes
         self.input_events = input_events
+        self.input_events_ref = input_events_ref
 
     @property
     def input_count(self):
@@ -51,8 +71,58 @@ class StepData:
             return len(self.s3_input_prefixes.items())
         if self.input_events:
             return len(self.input_events)
+        if self.input_events_ref:
+            return self.input_events_ref["count"]
         return 0
 
+    def iter_input_events(self, s3_client=None) -> Iterator[Dict]:
+        """Iterate over the input events.
+
+        Events passed by reference are streamed from S3 one line at a time
+        rather than loaded up front.
+        """
+        if self.input_events_ref:
+            s3_client = s3_client or _s3_client()
+            response = s3_client.get_object(
+                Bucket=self.input_events_ref["bucket"],
+                Key=self.input_events_ref["key"],
+            )
+            for line in response["Body"].iter_lines():
+                if line:
+                    yield json.loads(line)
+        elif self.input_events:
+            yield from self.input_events
+
+    def spill_input_events(self, key, threshold=None, s3_client=None):
+        """Move inline input events to S3 at `key` if they're larger than
+        `threshold` bytes serialized (`INPUT_EVENTS_SPILL_THRESHOLD` by
+        default).
+
+        The events are stored as newline-delimited JSON in the pipeline bucket
+        and replaced by a reference in `input_events_ref`.
+        """
+        if not self.input_events:
+            return
+
+        lines = [json.dumps(event).encode("utf-8") for event in self.input_events]
+
+        if threshold is None:
+            threshold = INPUT_EVENTS_SPILL_THRESHOLD
+
+        if sum(len(line) + 1 for line in lines) <= threshold:
+            return
+
+        bucket = os.environ["BUCKET_NAME"]
+        s3_client = s3_client or _s3_client()
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=b"\n".join(lines),
+            ContentType="application/x-ndjson",
+        )
+        self.input_events_ref = {"bucket": bucket, "key": key, "count": len(lines)}
+        self.input_events = None
+
 
 @dataclass(frozen=True)
 class Payload:
@@ -95,3 +165,9 @@ class Config:
             payload=payload,
             task_config=task_config,
         )
+
+
+def _s3_client():
+    import boto3
+
+    return boto3.client("s3")
@@ -0,0 +1,107 @@
+"""A persisted cache of what the steps detect about the input of a dataset.
+
+Steps without a schema in their task config detect the column types of their
+input themselves. What they find is stored per dataset version (see
+`okdata.pipeline.version_record`), so that later editions skip the detection
+and keep the same output schema:
+
+    {
+      "date_formats": {"created": "ISO8601"},
+      "delimiter": ";",
+      "dtypes": {"created": "string[pyarrow]", "id": "int64[pyarrow]"}
+    }
+
+`dtypes` are the column types as read, before `date_formats` are applied.
+
+The CSV delimiter is still sniffed from the first line of each input, as a
+later edition may well come with another one. The cached delimiter is only
+used when it can't be sniffed, and is replaced by the one sniffed otherwise.
+"""
+
+import csv
+import os
+import zlib
+
+from okdata.aws.logging import log_add
+
+from okdata.pipeline.version_record import VersionRecord, record_key
+
+BUCKET = os.environ["BUCKET_NAME"]
+CACHE_FILENAME = "schema_cache.json"
+
+# Number of bytes read from the start of a CSV file to detect its delimiter,
+# and the delimiters considered.
+SNIFF_SIZE = 64 * 1024
+SNIFF_DELIMITERS = ",;\t|"
+
+
+def cache_key(output_dataset):
+    """Return the S3 key of the cache of the version of `output_dataset`, or
+    `None` if the dataset has no S3 prefix."""
+    return record_key(output_dataset, CACHE_FILENAME)
+
+
+def sniff_delimiter(s3_client, key):
+    """Return the delimiter of the CSV file at `key`, detected from its first
+    line like Pandas does, or `None` if it can't be detected."""
+    response = s3_client.get_object(
+        Bucket=BUCKET, Key=key, Range=f"bytes=0-{SNIFF_SIZE - 1}"
+    )
+    data = response["Body"].read()
+
+    if key.endswith(".gz"):
+        data = zlib.decompressobj(wbits=31).decompress(data)
+
+    text = data.decode("utf-8", errors="replace")
+    first_line, newline, _ = text.partition("\n")
+
+    if not newline:
+        return None
+
+    try:
+        return csv.Sniffer().sniff(first_line, SNIFF_DELIMITERS).delimiter
+    except csv.Error:
+        return None
+
+
+class SchemaCache:
+    def __init__(self, output_dataset, s3_client=None):
+        self.record = VersionRecord(
+            cache_key(output_dataset), "schema_cache", s3_client
+        )
+        self._entry = None
+
+    @property
+    def key(self):
+        return self.record.key
+
+    def load(self):
+        """Return the cached entry, reading it from S3 on first use."""
+        if self._entry is None:
+            self._entry = self.record.read()
+            if self.key:
+                log_add(schema_cache_hit=bool(self._entry))
+
+        return self._entry
+
+    def get(self, name, default=None):
+        return self.load().get(name, default)
+
+    def delimiter(self, key):
+        """Return the delimiter of the CSV file at `key`: the one sniffed
+        from it, or the cached one if none can be sniffed."""
+        return sniff_delimiter(self.record.client(), key) or self.get("delimiter")
+
+    def update(self, **values):
+        """Merge `values` (ignoring `None`s) into the cached entry, writing it
+        back to S3 if it changed."""
+        entry = self.load()
+        updated = {**entry, **{k: v for k, v in values.items() if v is not None}}
+
+        if not self.key or updated == entry:
+            return
+
+        self._entry = updated
+
+        if self.record.write(updated):
+            log_add(schema_cache_updated=sorted(updated))
@@ -1,7 +1,20 @@
 import functools
+import random
+import threading
+import time
 
 from okdata.aws.ssm import get_secret
 from okdata.sdk.config import Config
+from okdata.sdk.data.dataset import Dataset
+
+# Number of seconds an authenticated SDK client (and the access token it
+# holds) is reused across warm Lambda invocations before a fresh one is made.
+SDK_CLIENT_TTL = 300
+
+_dataset_client = None
+_dataset_client_created_at = None
+# The client is shared with the threads of `write_s3`.
+_dataset_client_lock = threading.Lock()
 
 
 @functools.cache
@@ -11,3 +24,38 @@ def sdk_config():
         "/dataplatform/okdata-pipeline/keycloak-client-secret"
     )
     return sdk_config
+
+
+def dataset_client():
+    """Return a `Dataset` SDK client shared between invocations.
+
+    A new client is created when the cached one is older than
+    `SDK_CLIENT_TTL` seconds.
+    """
+    global _dataset_client, _dataset_client_created_at
+
+    with _dataset_client_lock:
+        now = time.monotonic()
+
+        if _dataset_client is None or now - _dataset_client_created_at > SDK_CLIENT_TTL:
+            _dataset_client = Dataset(sdk_config())
+            _dataset_client_created_at = now
+
+        return _dataset_client
+
+
+def retry_with_backoff(f, retries=3, base_delay=0.2, max_delay=5.0):
+    """Call `f` and return its result, retrying up to `retries` times.
+
+    Retries are delayed using exponential backoff with full jitter; the Nth
+    retry waits a random amount of time between zero and
+    `min(max_delay, base_delay * 2**N)` seconds. The last exception is
+    re-raised when all retries are exhausted.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return f()
+        except Exception:
+            if attempt >= retries:
+                raise
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2**attempt)))
@@ -3,7 +3,14 @@ class ParseErrors(Exception):
         self.errors = errors
 
 
-def parse_csv(reader, schema, header=[]):
+def parse_csv(reader, schema, header=[], lenient_columns=None):
+    """Parse the rows of `reader` to dicts typed by the `schema` of an array
+    of objects.
+
+    The names of columns with values that the CSV converters would parse
+    differently or not at all (see `is_lenient`) are added to the set
+    `lenient_columns` if given.
+    """
     if "items" not in schema or "properties" not in schema["items"]:
         return list(reader)
 
@@ -36,6 +43,9 @@ def parse_csv(reader, schema, header=[]):
                 insert_row[key] = parse_value(value, value_type)
             except ValueError as e:
                 errors.append({"row": row_i, "column": key, "message": str(e)})
+            else:
+                if lenient_columns is not None and is_lenient(value, value_type):
+                    lenient_columns.add(key)
 
         data.append(insert_row)
 
@@ -45,6 +55,13 @@ def parse_csv(reader, schema, header=[]):
     return data
 
 
+def is_lenient(value, value_type):
+    """Return true if `value` is only accepted as a `value_type` by the
+    leniency of `parse_value`, like decimal commas, and not by the CSV
+    converters."""
+    return value_type in ("integer", "number") and ("," in value or "_" in value)
+
+
 def parse_value(value, value_type="string"):
     if value_type == "null":
         if value == "null":
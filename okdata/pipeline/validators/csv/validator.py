@@ -5,17 +5,22 @@ from dataclasses import dataclass, asdict
 from enum import Enum
 
 import boto3
-from aws_xray_sdk.core import patch_all, xray_recorder
+from aws_xray_sdk.core import patch, xray_recorder
 from okdata.aws.logging import log_add, logging_wrapper
 from okdata.aws.status import status_wrapper, status_add
 
+from okdata.pipeline import intermediate
+from okdata.pipeline.intermediate import FORMATS as INTERMEDIATE_FORMATS
+from okdata.pipeline.common import XRAY_PATCHED_MODULES
+from okdata.pipeline.instrumentation import log_stages, stage
 from okdata.pipeline.models import Config
+from okdata.pipeline.schema_cache import SchemaCache
 from okdata.pipeline.util import sdk_config
 from okdata.pipeline.validators.csv import string_reader
 from okdata.pipeline.validators.csv.parser import ParseErrors, parse_csv
 from okdata.pipeline.validators.jsonschema_validator import JsonSchemaValidator
 
-patch_all()
+patch(XRAY_PATCHED_MODULES)
 
 BUCKET = os.environ["BUCKET_NAME"]
 
@@ -27,13 +32,26 @@ class Status(Enum):
 
 @dataclass
 class StepConfig:
-    def __init__(self, schema="", header_row=True, delimiter=",", quote='"'):
-        if len(delimiter) != 1:
+    def __init__(
+        self,
+        schema="",
+        header_row=True,
+        delimiter=None,
+        quote='"',
+        intermediate=None,
+    ):
+        if delimiter is not None and len(delimiter) != 1:
             raise ValueError("delimiter must be a 1-character string: ", delimiter)
+        if intermediate is not None and intermediate not in INTERMEDIATE_FORMATS:
+            raise ValueError(
+                f"intermediate must be one of {list(INTERMEDIATE_FORMATS)}: ",
+                intermediate,
+            )
 
         self.header_row = header_row
         self.delimiter = delimiter
         self.quote = quote
+        self.intermediate = intermediate
         if isinstance(schema, str) and schema != "":
             self.schema = json.loads(schema)
         else:
@@ -46,6 +64,7 @@ class StepConfig:
 
 @status_wrapper(sdk_config())
 @logging_wrapper
+@log_stages
 @xray_recorder.capture("validate_csv")
 def validate_csv(event, context):
     s3 = boto3.client("s3")
@@ -63,8 +82,8 @@ def validate_csv(event, context):
 
     log_add(
         header_row=step_config.header_row,
-        delimiter=step_config.delimiter,
         quote=step_config.quote,
+        intermediate=step_config.intermediate,
         schema=step_config.schema,
         output_prefix=s3_prefix,
     )
@@ -81,11 +100,20 @@ def validate_csv(event, context):
 
     input_prefix = next(iter(config.payload.step_data.s3_input_prefixes.values()))
     log_add(s3_input_prefix=input_prefix)
-    objects = s3.list_objects_v2(Bucket=BUCKET, Prefix=input_prefix)
+    with stage("list"):
+        objects = s3.list_objects_v2(Bucket=BUCKET, Prefix=input_prefix)
 
     s3_path = next(iter(objects["Contents"]))["Key"]
     log_add(s3_input_path=s3_path)
 
+    if step_config.delimiter is None:
+        # Detect the delimiter, falling back to the one the converters
+        # detected for earlier editions.
+        step_config.delimiter = (
+            SchemaCache(output_dataset, s3).delimiter(s3_path) or ","
+        )
+    log_add(delimiter=step_config.delimiter)
+
     response = s3.get_object(Bucket=BUCKET, Key=s3_path)
     reader = csv.reader(
         string_reader.from_response(response, gzipped=s3_path.endswith(".gz")),
@@ -120,8 +148,14 @@ def validate_csv(event, context):
                 ],
             )
 
+    lenient_columns = set()
+
     try:
-        csv_data = parse_csv(reader, step_config.schema, header)
+        # The object is streamed while parsing, so this includes reading it.
+        with stage("parse") as s:
+            csv_data = parse_csv(reader, step_config.schema, header, lenient_columns)
+            s.add(rows=len(csv_data), bytes_in=response["ContentLength"])
+
         if not csv_data:
             status_add(
                 errors=[
@@ -159,7 +193,11 @@ def validate_csv(event, context):
 
     # Cut off after the first 20 error messages, otherwise the payload may get
     # too big for the status API.
-    validation_errors = JsonSchemaValidator(step_config.schema).validate(csv_data)[:20]
+    with stage("validate") as s:
+        s.add(rows=len(csv_data))
+        validation_errors = JsonSchemaValidator(step_config.schema).validate(csv_data)[
+            :20
+        ]
 
     if validation_errors:
         status_add(
@@ -178,10 +216,48 @@ def validate_csv(event, context):
         )
         return _with_error(config, errors=validation_errors)
 
+    if lenient_columns and step_config.intermediate:
+        # The converters would fail on (or read differently) what was parsed
+        # here, so leave it to them to read the CSV file.
+        log_add(intermediate_skipped_columns=sorted(lenient_columns))
+    elif (
+        step_config.intermediate
+        and header
+        and "properties" in step_config.schema.get("items", {})
+    ):
+        with stage("write_intermediate") as s:
+            s.add(rows=len(csv_data))
+            intermediate_key = _write_intermediate(
+                s3, config, s3_path, response["ETag"], csv_data, header, step_config
+            )
+        log_add(intermediate_key=intermediate_key)
+
     config.payload.step_data.status = Status.VALIDATION_SUCCESS.value
     return asdict(config.payload.step_data)
 
 
+def _write_intermediate(s3, config, s3_path, etag, csv_data, header, step_config):
+    """Write the validated rows of `s3_path` as an intermediate for the CSV
+    converters to read instead of the CSV file."""
+    row_schema = step_config.schema["items"]["properties"]
+    # Columns left out of the schema (which only pass validation when empty)
+    # are written as strings.
+    columns = [
+        (key, row_schema.get(key, {}).get("type"))
+        for key in (h.strip() for h in header)
+    ]
+    return intermediate.write(
+        s3,
+        config.payload.output_dataset,
+        s3_path,
+        etag,
+        csv_data,
+        columns,
+        step_config.intermediate,
+        names=header,
+    )
+
+
 def _with_error(config: Config, errors):
     log_add(errors=errors)
     log_add(status=Status.VALIDATION_FAILED.value)
@@ -1,22 +1,31 @@
 from dataclasses import asdict, dataclass
+from itertools import islice
 from json import JSONDecodeError
 
-from aws_xray_sdk.core import patch_all, xray_recorder
+from aws_xray_sdk.core import patch, xray_recorder
 from okdata.aws.logging import log_add, logging_wrapper
 from okdata.aws.status import status_wrapper, status_add
 
+from okdata.pipeline.common import XRAY_PATCHED_MODULES
 from okdata.pipeline.exceptions import IllegalWrite
 from okdata.pipeline.models import Config, StepData
 from okdata.pipeline.util import sdk_config
 from okdata.pipeline.validators.json.s3_reader import read_s3_data
+from okdata.pipeline.validators.json.stream import JsonStream
 from okdata.pipeline.validators.jsonschema_validator import JsonSchemaValidator
 
-patch_all()
+patch(XRAY_PATCHED_MODULES)
+
+# Maximum number of validation errors to report.
+MAX_ERRORS = 100
 
 
 @dataclass
 class StepConfig:
     schema: str = None
+    # Pass large input events on by S3 reference, for pipelines whose later
+    # steps all read them with `StepData.iter_input_events`.
+    spill_input_events: bool = False
 
     @staticmethod
     def from_dict(step_config_dict):
@@ -53,54 +62,62 @@ def validate_json(event, context):
             "cannot combine multiple S3 datasets: ", step_data.input_count
         )
 
-    if step_config.schema is None:
-        return asdict(
-            StepData(
-                input_events=step_data.input_events,
-                s3_input_prefixes=step_data.s3_input_prefixes,
-                status="VALIDATION_SUCCESS",
-                errors=[],
+    if step_config.spill_input_events and output_dataset.s3_prefix:
+        # Keep large inline input events out of the payload passed on to the
+        # next steps.
+        step_data.spill_input_events(
+            "{}{}/input_events.ndjson".format(
+                output_dataset.s3_prefix.replace("%stage%", "intermediate"),
+                config.task,
             )
         )
 
+    if step_config.schema is None:
+        return _response(step_data, "VALIDATION_SUCCESS", [])
+
+    validator = JsonSchemaValidator(step_config.schema)
+
     try:
         input_data = resolve_input_data(step_data)
+
+        if isinstance(input_data, JsonStream):
+            # Validate streamed data element by element, stopping once we have
+            # as many errors as we're going to report anyway.
+            validation_errors = list(
+                islice(
+                    validator.iter_stream_errors(
+                        input_data.items(
+                            unwrap_array=step_config.schema.get("type") == "array"
+                        )
+                    ),
+                    MAX_ERRORS,
+                )
+            )
+        else:
+            validation_errors = validator.validate_list(input_data)
     except JSONDecodeError as json_error:
         errors = [{"message": str(json_error)}]
 
         status_add(errors=format_error_messages(errors))
 
-        return asdict(
-            StepData(
-                input_events=step_data.input_events,
-                s3_input_prefixes=step_data.s3_input_prefixes,
-                status="VALIDATION_FAILED",
-                errors=errors,
-            )
-        )
-
-    validation_errors = JsonSchemaValidator(step_config.schema).validate_list(
-        input_data
-    )
+        return _response(step_data, "VALIDATION_FAILED", errors)
 
     if validation_errors:
-        status_add(errors=format_error_messages(validation_errors[:100]))
-
-        return asdict(
-            StepData(
-                input_events=step_data.input_events,
-                s3_input_prefixes=step_data.s3_input_prefixes,
-                status="VALIDATION_FAILED",
-                errors=validation_errors[:100],
-            )
-        )
+        status_add(errors=format_error_messages(validation_errors[:MAX_ERRORS]))
+
+        return _response(step_data, "VALIDATION_FAILED", validation_errors[:MAX_ERRORS])
+
+    return _response(step_data, "VALIDATION_SUCCESS", [])
+
 
+def _response(step_data: StepData, status, errors):
     return asdict(
         StepData(
             input_events=step_data.input_events,
+            input_events_ref=step_data.input_events_ref,
             s3_input_prefixes=step_data.s3_input_prefixes,
-            status="VALIDATION_SUCCESS",
-            errors=[],
+            status=status,
+            errors=errors,
         )
     )
 
@@ -108,6 +125,8 @@ def validate_json(event, context):
 def resolve_input_data(step_data: StepData):
     if step_data.input_events:
         return step_data.input_events
+    elif step_data.input_events_ref:
+        return step_data.iter_input_events()
     elif step_data.s3_input_prefixes:
         return read_s3_data(step_data.s3_input_prefixes)
     return None
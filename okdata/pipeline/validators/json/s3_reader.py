@@ -1,17 +1,26 @@
-import json
 import os
 
 import boto3
 
+from okdata.pipeline.validators.json.stream import JsonStream
+
 s3 = boto3.client("s3")
 BUCKET = os.environ["BUCKET_NAME"]
 
+# Number of bytes read from S3 at a time when streaming JSON data.
+CHUNK_SIZE = 1024 * 1024
+
+
+def read_s3_data(s3_input_prefixes: dict) -> JsonStream:
+    """Return a stream of the JSON values in the first object under the input
+    prefix.
 
-def read_s3_data(s3_input_prefixes: dict) -> list:
+    The object is read incrementally as the stream is consumed.
+    """
     prefix = next(iter(s3_input_prefixes.values()))
 
     objects = s3.list_objects_v2(Bucket=BUCKET, Prefix=prefix)
     s3_path = next(iter(objects["Contents"]))["Key"]
 
     response = s3.get_object(Bucket=BUCKET, Key=s3_path)
-    return [json.loads(response["Body"].read().decode("utf-8"))]
+    return JsonStream(response["Body"].iter_chunks(CHUNK_SIZE))
@@ -0,0 +1,145 @@
+import codecs
+import json
+from json import JSONDecodeError
+from typing import Iterable, Iterator, NamedTuple
+
+_WHITESPACE = " \t\n\r"
+
+# Decoding errors further than this from the end of the buffer can't be caused
+# by a value being cut short, as no token that can be cut is this long (save
+# for strings).
+_TRUNCATION_MARGIN = 16
+
+
+class JsonItem(NamedTuple):
+    """A value decoded from a JSON stream.
+
+    `index` is the position of the value in the stream, or in the top-level
+    array when `in_array` is true.
+    """
+
+    index: int
+    value: object
+    in_array: bool
+
+
+class JsonStream:
+    """Incrementally decode JSON values from an iterable of UTF-8 byte chunks.
+
+    Handles a single JSON document, several concatenated or newline-delimited
+    documents (NDJSON), and optionally yields the elements of a top-level array
+    one by one, so that memory use is bounded by the largest single value
+    rather than the whole input.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def __iter__(self):
+        return self.items()
+
+    def items(self, unwrap_array=False) -> Iterator[JsonItem]:
+        """Yield the values in the stream as `JsonItem`s.
+
+        With `unwrap_array`, a top-level array at the start of the stream is
+        yielded element by element instead of as a single value.
+        """
+        index = 0
+
+        if unwrap_array and self._peek() == "[":
+            self._pos += 1
+            yield from self._array_items()
+            index = 1
+
+        while self._peek() is not None:
+            yield JsonItem(index, self._decode_value(), False)
+            index += 1
+
+    def _array_items(self):
+        if self._peek() == "]":
+            self._pos += 1
+            return
+
+        index = 0
+        while True:
+            yield JsonItem(index, self._decode_value(), True)
+            index += 1
+
+            c = self._peek()
+            self._pos += 1
+            if c == "]":
+                return
+            if c != ",":
+                raise JSONDecodeError(
+                    "Expecting ',' delimiter", self._buffer, self._pos - 1
+                )
+
+    def _fill(self, min_size=0):
+        """Read chunks into the buffer until it holds at least `min_size`
+        unconsumed characters or the input is exhausted.
+
+        Return false if no more input could be read.
+        """
+        self._buffer = self._buffer[self._pos :]
+        self._pos = 0
+        read = False
+
+        while not self._eof and (not read or len(self._buffer) < min_size):
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                self._buffer += self._text_decoder.decode(b"", final=True)
+                self._eof = True
+            else:
+                self._buffer += self._text_decoder.decode(chunk)
+                read = True
+
+        return read
+
+    def _peek(self):
+        """Skip whitespace and return the next character, or `None` at the end
+        of the input."""
+        while True:
+            while self._pos < len(self._buffer):
+                if self._buffer[self._pos] not in _WHITESPACE:
+                    return self._buffer[self._pos]
+                self._pos += 1
+            if not self._fill():
+                return None
+
+    def _decode_value(self):
+        self._peek()
+
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buffer, self._pos)
+            except JSONDecodeError as e:
+                if not self._maybe_truncated(e):
+                    raise
+                # The value may continue in the next chunk(s). Grow the buffer
+                # geometrically to keep re-parsing of large values linear.
+                if not self._fill(2 * (len(self._buffer) - self._pos)):
+                    raise
+                continue
+
+            # A value ending exactly at the end of the buffer may have been cut
+            # short (e.g. a number), so make sure there's nothing more to it.
+            if end == len(self._buffer) and self._fill():
+                continue
+
+            self._pos = end
+            return value
+
+    def _maybe_truncated(self, error):
+        """Return true if the decoding `error` may be caused by the value
+        continuing past the end of the buffer, rather than by malformed
+        input."""
+        return (
+            error.msg.startswith("Unterminated string")
+            or len(self._buffer) - error.pos < _TRUNCATION_MARGIN
+        )
@@ -1,3 +1,6 @@
+import hashlib
+import json
+
 import jsonschema
 
 from okdata.aws.logging import log_add
@@ -11,6 +14,26 @@ SCHEMA_FORMATTERS = {
     "http://json-schema.org/draft-07/schema#": jsonschema.draft7_format_checker
 }
 
+# Keywords of an array schema that can be checked one element at a time when
+# validating a stream. Any other keyword (e.g. `allOf`, `enum`) applies to the
+# array as a whole.
+STREAMED_ARRAY_KEYWORDS = {
+    "$schema",
+    "$id",
+    "$comment",
+    "title",
+    "description",
+    "default",
+    "examples",
+    "definitions",
+    "type",
+    "items",
+    "minItems",
+    "maxItems",
+    "uniqueItems",
+    "contains",
+}
+
 
 class JsonSchemaValidator:
     def __init__(self, schema, *args, **kwargs):
@@ -76,3 +99,128 @@ class JsonSchemaValidator:
             return [item for sublist in lst for item in sublist]
 
         return flatten([self.validate(d) for d in data])
+
+    def iter_stream_errors(self, items):
+        """Validate a stream of JSON items one at a time, yielding errors.
+
+        `items` is an iterable of `JsonItem`s. Elements of a top-level array
+        are validated against the schema's `items` subschema, while separate
+        documents (e.g. NDJSON records) are validated against the whole
+        schema. Errors carry the index of the item as `row` and the JSON path
+        within it as `col`.
+
+        The array keywords `minItems`, `maxItems`, `uniqueItems` and
+        `contains` are checked as the elements go by. If the schema has any
+        other keyword applying to the array as a whole, the elements are
+        collected and validated together by `validate` instead.
+
+        A stream consisting of a single document is reported in the same
+        format as `validate`.
+        """
+        schema = self.validator.schema
+        is_array = "array" in _types(schema)
+        collect = is_array and not self._streams_arrays()
+        array = _ArrayChecks(self.validator)
+        elements = []
+        previous = None
+
+        for item in items:
+            if item.in_array:
+                if collect:
+                    elements.append(item.value)
+                    continue
+                array.add(item)
+            if previous:
+                yield from self._item_errors(previous)
+            previous = item
+
+        if previous and not previous.in_array and previous.index == 0:
+            yield from self.validate(previous.value)
+        elif previous:
+            yield from self._item_errors(previous)
+
+        # An empty stream is taken to be an empty array.
+        if not is_array or not (elements or array.count or previous is None):
+            return
+        if collect:
+            yield from self.validate(elements)
+        else:
+            yield from array.errors()
+
+    def _streams_arrays(self):
+        """Return true if the array keywords of the schema can all be checked
+        one element at a time."""
+        schema = self.validator.schema
+        return set(schema) <= STREAMED_ARRAY_KEYWORDS and isinstance(
+            schema.get("items", {}), dict
+        )
+
+    def _item_errors(self, item):
+        if item.in_array:
+            raw_errors = self.validator.descend(
+                item.value, self.validator.schema.get("items", {}), path=item.index
+            )
+        else:
+            raw_errors = self.validator.iter_errors(item.value)
+
+        for e in raw_errors:
+            path = list(e.path)[1:] if item.in_array else list(e.path)
+            error = {"message": e.message, "row": item.index}
+            if path:
+                error["col"] = "/".join(map(str, path))
+            yield error
+
+
+def _types(schema):
+    types = schema.get("type", [])
+    return types if isinstance(types, list) else [types]
+
+
+class _ArrayChecks:
+    """The array keywords of a schema, checked one element at a time."""
+
+    def __init__(self, validator):
+        self.validator = validator
+        self.schema = validator.schema
+        self.count = 0
+        # Hashes of the elements seen, for `uniqueItems`.
+        self.seen = set() if self.schema.get("uniqueItems") else None
+        self.duplicate = None
+        self.contained = "contains" not in self.schema
+
+    def add(self, item):
+        self.count += 1
+
+        if self.seen is not None and self.duplicate is None:
+            digest = hashlib.sha256(
+                json.dumps(item.value, sort_keys=True).encode("utf-8")
+            ).digest()
+            if digest in self.seen:
+                self.duplicate = item.index
+            self.seen.add(digest)
+
+        if not self.contained:
+            self.contained = not any(
+                self.validator.descend(item.value, self.schema["contains"])
+            )
+
+    def errors(self):
+        if "minItems" in self.schema and self.count < self.schema["minItems"]:
+            yield {
+                "message": f"Expected at least {self.schema['minItems']} items, "
+                f"found {self.count}",
+                "row": "root",
+            }
+        if "maxItems" in self.schema and self.count > self.schema["maxItems"]:
+            yield {
+                "message": f"Expected at most {self.schema['maxItems']} items, "
+                f"found {self.count}",
+                "row": "root",
+            }
+        if self.duplicate is not None:
+            yield {"message": "Item is not unique", "row": self.duplicate}
+        if not self.contained:
+            yield {
+                "message": "No item is valid under the `contains` schema",
+                "row": "root",
+            }
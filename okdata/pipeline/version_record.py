@@ -0,0 +1,86 @@
+"""JSON records kept per dataset version in S3.
+
+Some steps keep what they learned about one edition of a dataset for the
+next, like the fingerprints of its input (`okdata.pipeline.fingerprints`) and
+what was detected about it (`okdata.pipeline.schema_cache`). These records
+are stored as JSON next to the editions of the dataset version in the
+intermediate stage, outside of the editions themselves (which are copied as
+they are by the S3 writer).
+
+The records are only an optimization; failing to read or write them is
+logged and otherwise ignored.
+"""
+
+import json
+import os
+import re
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+from okdata.aws.logging import log_add
+
+BUCKET = os.environ["BUCKET_NAME"]
+
+
+def record_key(output_dataset, name):
+    """Return the S3 key of the record `name` of the version of
+    `output_dataset`, or `None` if the dataset has no S3 prefix."""
+    if not output_dataset.s3_prefix:
+        return None
+
+    prefix = output_dataset.s3_prefix.replace("%stage%", "intermediate")
+    return re.sub("edition=.*/", "", prefix) + name
+
+
+class VersionRecord:
+    """A JSON object stored at `key`, with errors logged under `log_name`."""
+
+    def __init__(self, key, log_name, s3_client=None):
+        self.key = key
+        self.log_name = log_name
+        self.s3_client = s3_client
+
+    def client(self):
+        if self.s3_client is None:
+            self.s3_client = boto3.client("s3")
+
+        return self.s3_client
+
+    def read(self):
+        """Return the stored record, or an empty dict if there is none."""
+        if not self.key:
+            return {}
+
+        try:
+            response = self.client().get_object(Bucket=BUCKET, Key=self.key)
+            record = json.loads(response["Body"].read())
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchKey":
+                self._log_error(e)
+            record = {}
+        except (BotoCoreError, ValueError) as e:
+            self._log_error(e)
+            record = {}
+
+        return record if isinstance(record, dict) else {}
+
+    def write(self, record):
+        """Store `record`, returning true if it was written."""
+        if not self.key:
+            return False
+
+        try:
+            self.client().put_object(
+                Bucket=BUCKET,
+                Key=self.key,
+                Body=json.dumps(record, indent=2, sort_keys=True).encode("utf-8"),
+                ContentType="application/json",
+            )
+        except (BotoCoreError, ClientError) as e:
+            self._log_error(e)
+            return False
+
+        return True
+
+    def _log_error(self, e):
+        log_add(**{f"{self.log_name}_error": str(e)})
@@ -1,14 +1,16 @@
 import re
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict
 
-from aws_xray_sdk.core import patch_all, xray_recorder
+from aws_xray_sdk.core import patch, xray_recorder
 from okdata.aws.logging import log_add, log_duration, log_exception, logging_wrapper
 from okdata.aws.status import status_add, status_wrapper
-from okdata.sdk.data.dataset import Dataset
 
+from okdata.pipeline.common import XRAY_PATCHED_MODULES
 from okdata.pipeline.exceptions import IllegalWrite
+from okdata.pipeline.instrumentation import log_stages, stage, with_trace_entity
 from okdata.pipeline.models import Config, StepData
-from okdata.pipeline.util import sdk_config
+from okdata.pipeline.util import dataset_client, retry_with_backoff, sdk_config
 from okdata.pipeline.writers.s3.exceptions import (
     DistributionNotCreated,
     IncompleteTransaction,
@@ -16,13 +18,14 @@ from okdata.pipeline.writers.s3.exceptions import (
 from okdata.pipeline.writers.s3.models import Distribution, TaskConfig
 from okdata.pipeline.writers.s3.services import S3Service
 
-patch_all()
+patch(XRAY_PATCHED_MODULES)
 
 s3_service = S3Service()
 
 
 @status_wrapper(sdk_config())
 @logging_wrapper
+@log_stages
 @xray_recorder.capture("write_s3")
 def write_s3(event, context):
     config = Config.from_lambda_event(event)
@@ -56,21 +59,44 @@ def write_s3(event, context):
         "%stage%", task_config.output_stage
     )
 
-    s3_sources = s3_service.resolve_s3_sources(source_prefix)
-    copied_files = copy_data(s3_sources, output_prefix)
-
-    if task_config.output_stage == "processed":
-        try:
-            create_distribution_with_retries(output_dataset, copied_files, content_type)
-        except Exception as e:
-            s3_service.delete_from_prefix(output_prefix)
-            log_exception(e)
-            raise DistributionNotCreated
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # Look up the latest edition while the data is being copied; it only
+        # depends on the output dataset.
+        latest_edition_future = (
+            executor.submit(
+                with_trace_entity(get_latest_edition),
+                output_dataset.id,
+                output_dataset.version,
+            )
+            if task_config.write_to_latest
+            else None
+        )
 
-    if task_config.write_to_latest and is_latest_edition(
-        output_dataset.id, output_dataset.version, output_dataset.edition
-    ):
-        write_data_to_latest(s3_sources, output_prefix)
+        with stage("list"):
+            s3_sources = s3_service.resolve_s3_sources(source_prefix)
+
+        with stage("copy"):
+            copied_files = copy_data(s3_sources, output_prefix)
+
+        if task_config.output_stage == "processed":
+            try:
+                with stage("create_distribution"):
+                    create_distribution_with_retries(
+                        output_dataset, copied_files, content_type
+                    )
+            except Exception as e:
+                s3_service.delete_from_prefix(output_prefix)
+                log_exception(e)
+                raise DistributionNotCreated
+
+        if latest_edition_future and is_latest_edition(
+            output_dataset,
+            log_duration(
+                latest_edition_future.result, "get_latest_edition_wait_duration"
+            ),
+        ):
+            with stage("write_latest"):
+                write_data_to_latest(s3_sources, output_prefix)
 
     output_prefixes = {output_dataset.id: output_prefix}
     response = StepData(s3_input_prefixes=output_prefixes, status="OK", errors=[])
@@ -88,6 +114,12 @@ def write_s3(event, context):
 
 def write_data_to_latest(s3_sources, output_prefix):
     output_prefix_latest = re.sub("edition=.*/", "latest/", output_prefix)
+
+    # Re-uploads of unchanged data are common; leave `latest` alone then.
+    if s3_service.has_copies(s3_sources, output_prefix_latest):
+        log_add(latest_unchanged=True)
+        return
+
     s3_service.delete_from_prefix(output_prefix_latest)
     copy_data(s3_sources, output_prefix_latest)
 
@@ -105,33 +137,32 @@ def copy_data(s3_sources, output_prefix):
 def create_distribution_with_retries(
     output_dataset, copied_files, content_type, retries=3
 ):
-    try:
-        new_distribution = Distribution(
-            filenames=copied_files, content_type=content_type
-        )
-        return log_duration(
-            lambda: Dataset(sdk_config()).create_distribution(
+    new_distribution = Distribution(filenames=copied_files, content_type=content_type)
+    return log_duration(
+        lambda: retry_with_backoff(
+            lambda: dataset_client().create_distribution(
                 output_dataset.id,
                 output_dataset.version,
                 output_dataset.edition,
                 data=new_distribution.as_dict(),
             ),
-            "create_distribution_duration",
-        )
-    except Exception as e:
-        if retries > 0:
-            return create_distribution_with_retries(
-                output_dataset, copied_files, content_type, retries - 1
-            )
-        else:
-            raise e
+            retries=retries,
+        ),
+        "create_distribution_duration",
+    )
 
 
-def is_latest_edition(dataset_id, version, edition):
-    latest_edition = log_duration(
-        lambda: Dataset(sdk_config()).get_latest_edition(dataset_id, version),
-        "get_latest_edition_duration",
+def get_latest_edition(dataset_id, version):
+    return retry_with_backoff(
+        lambda: dataset_client().get_latest_edition(dataset_id, version)
     )
-    is_latest = [dataset_id, version, edition] == latest_edition["Id"].split("/")
+
+
+def is_latest_edition(output_dataset, latest_edition):
+    is_latest = [
+        output_dataset.id,
+        output_dataset.version,
+        output_dataset.edition,
+    ] == latest_edition["Id"].split("/")
     log_add(is_latest_edition=is_latest)
     return is_latest
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 
 
@@ -6,6 +6,7 @@ from typing import Optional
 class S3Source:
     filename: str
     key: str
+    etag: Optional[str] = field(default=None, compare=False)
 
 
 class Distribution:
@@ -64,10 +64,27 @@ class S3Service:
         for obj in source_objects:
             source_key = obj["Key"]
             filename = source_key.removeprefix(source_prefix)
-            s3_sources.append(S3Source(filename=filename, key=source_key))
+            s3_sources.append(
+                S3Source(filename=filename, key=source_key, etag=obj.get("ETag"))
+            )
 
         return s3_sources
 
+    def has_copies(self, s3_sources, s3_prefix):
+        """Return true if `s3_prefix` holds exactly copies of `s3_sources`.
+
+        Copies of unchanged content keep the ETags of their sources, except
+        for sources uploaded in parts (or encrypted with KMS), which are then
+        taken to be different.
+        """
+        existing = {
+            obj["Key"].removeprefix(s3_prefix): obj["ETag"]
+            for obj in self.list_objects_contents(s3_prefix)
+        }
+        return existing == {
+            s3_source.filename: s3_source.etag for s3_source in s3_sources
+        }
+
     def list_objects_contents(self, s3_prefix):
         return log_duration(
             lambda: self._list_objects_contents(s3_prefix), "list_objects_v2_duration"
@@ -30,6 +30,7 @@ setuptools.setup(
         "pandas>2,<3",
         "python-dateutil",
         "requests",
+        "xlrd",
     ],
     python_requires="==3.13.*",
 )
@@ -1,16 +1,57 @@
 import os
+import socket
 
 import boto3
 import pytest
 from moto import mock_aws
 
 
+def pytest_collection_modifyitems(config, items):
+    # Benchmarks are slow and depend on the machine, so they're only run when
+    # asked for.
+    if os.environ.get("RUN_BENCHMARKS"):
+        return
+
+    skip = pytest.mark.skip(reason="benchmark, set RUN_BENCHMARKS=1 to run")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
 @pytest.fixture(scope="function")
 def s3_client():
     with mock_aws():
         yield boto3.client("s3")
 
 
+@pytest.fixture
+def s3_server(monkeypatch):
+    """Serve S3 from a local moto server, which unlike `mock_aws` is also
+    reachable by `deltalake`, and return a client for it with the bucket
+    created."""
+    # The moto server needs Flask, which only comes with `moto[server]`.
+    pytest.importorskip("flask")
+    from moto.server import ThreadedMotoServer
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    monkeypatch.setenv("AWS_ENDPOINT_URL", f"http://127.0.0.1:{port}")
+    monkeypatch.setenv("AWS_ALLOW_HTTP", "true")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "eu-west-1")
+
+    s3_client = boto3.client("s3")
+    s3_client.create_bucket(
+        Bucket=os.environ["BUCKET_NAME"],
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+    )
+    yield s3_client
+    server.stop()
+
+
 @pytest.fixture
 def s3_bucket(s3_client):
     bucket_name = os.environ["BUCKET_NAME"]
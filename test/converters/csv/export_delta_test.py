@@ -0,0 +1,60 @@
+from deltalake import DeltaTable
+
+from okdata.pipeline.converters.base import BUCKET
+from okdata.pipeline.converters.csv.delta import DeltaExporter
+
+
+def _event(edition, input_prefix):
+    return {
+        "execution_name": "boligpriser-UUID",
+        "task": "csv_to_delta",
+        "payload": {
+            "pipeline": {
+                "id": "husholdninger-med-barn",
+                "task_config": {
+                    "csv_to_delta": {"delimiter": ";", "merge_keys": ["id"]}
+                },
+            },
+            "output_dataset": {
+                "id": "boligpriser",
+                "version": "1",
+                "edition": edition,
+                "s3_prefix": f"%stage%/green/boligpriser/version=1/edition={edition}/",
+            },
+            "step_data": {
+                "s3_input_prefixes": {"boligpriser": input_prefix},
+                "status": "OK",
+                "errors": [],
+            },
+        },
+    }
+
+
+def _export(s3_client, edition, csv):
+    input_prefix = f"raw/green/boligpriser/version=1/edition={edition}/"
+    s3_client.put_object(Bucket=BUCKET, Key=f"{input_prefix}bydeler.csv", Body=csv)
+    return DeltaExporter(_event(edition, input_prefix)).export()
+
+
+def _rows(edition):
+    table = DeltaTable(
+        f"s3://{BUCKET}/intermediate/green/boligpriser/version=1/edition={edition}/"
+    )
+    return sorted(table.to_pyarrow_table().to_pylist(), key=lambda row: row["id"])
+
+
+def test_DeltaExporter_merges_editions(s3_server):
+    _export(s3_server, "20200120T133701", "id;navn\n1;Alna\n2;Bjerke\n")
+    response = _export(s3_server, "20200121T133701", "id;navn\n2;Bjerkee\n3;Frogner\n")
+
+    assert response["status"] == "CONVERSION_SUCCESS"
+    assert _rows("20200121T133701") == [
+        {"id": 1, "navn": "Alna"},
+        {"id": 2, "navn": "Bjerkee"},
+        {"id": 3, "navn": "Frogner"},
+    ]
+    # The previous edition is left as it was.
+    assert _rows("20200120T133701") == [
+        {"id": 1, "navn": "Alna"},
+        {"id": 2, "navn": "Bjerke"},
+    ]
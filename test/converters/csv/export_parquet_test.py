@@ -1,13 +1,24 @@
+import copy
+import datetime
+import io
+import json
 from unittest.mock import ANY, patch
 
 import awswrangler as wr
 import pandas as pd
+import pyarrow.parquet as pq
 import pytest
 import pytz
 
+from okdata.pipeline import intermediate
 from okdata.pipeline.converters.base import BUCKET
 from okdata.pipeline.converters.exceptions import ConversionError
-from okdata.pipeline.converters.csv.parquet import ParquetExporter
+from okdata.pipeline.converters.csv.parquet import (
+    ParquetExporter,
+    _read_spilled,
+    _spill,
+)
+from okdata.pipeline.models import OutputDataset
 
 
 def test_ParquetExporter_chunked(event, husholdninger_single):
@@ -39,7 +50,7 @@ def test_ParquetExporter_no_chunks(event, husholdninger_single):
         "%stage%", "intermediate"
     )
 
-    s3_prefix = output_prefix + event_data["task"] + "/husholdninger.parquet.gz"
+    s3_prefix = output_prefix + event_data["task"] + "/husholdninger.parquet"
     result = wr.s3.read_parquet(f"s3://{BUCKET}/{s3_prefix}")
 
     # result is a subset of expected
@@ -72,7 +83,7 @@ def test_ParquetExporter_with_schema(event, schema):
     )
 
     result = wr.s3.read_parquet(
-        f"s3://{BUCKET}/" + output_prefix + event_data["task"] + "/schema.parquet.gz",
+        f"s3://{BUCKET}/" + output_prefix + event_data["task"] + "/schema.parquet",
         dtype_backend="pyarrow",
     )
 
@@ -80,10 +91,10 @@ def test_ParquetExporter_with_schema(event, schema):
     assert list(result.dtypes)[1].name == "bool[pyarrow]"  # col: check
     assert list(result.dtypes)[2].name == "bool[pyarrow]"  # col: check2
     assert list(result.dtypes)[3].name == "double[pyarrow]"  # col: count
-    assert list(result.dtypes)[4].name == "timestamp[ns][pyarrow]"  # col: date
+    assert list(result.dtypes)[4].name == "date32[day][pyarrow]"  # col: date
 
-    assert list(result["date"])[0] == pd.Timestamp("2020-03-14")
-    assert list(result["date"])[1] == pd.Timestamp("2024-03-12")
+    assert list(result["date"])[0] == datetime.date(2020, 3, 14)
+    assert list(result["date"])[1] == datetime.date(2024, 3, 12)
     assert pd.isnull(list(result["date"])[2])
 
 
@@ -154,22 +165,18 @@ def test_ParquetExporter_valid_dates_no_schema(event, dates_file):
     assert result["date_column"][2].month == 12
 
 
-def test_ParquetExporter_invalid_year_too_early(event, dates_file_year_too_early):
+def test_ParquetExporter_year_before_pandas_range(event, dates_file_year_too_early):
     prefix, file = dates_file_year_too_early()
     event_data = event(prefix, chunksize=None, schema=schema_dates)
-    exporter = ParquetExporter(event_data)
-    result = exporter.export()
-    assert result["status"] == "CONVERSION_FAILED"
-    assert len(result["errors"]) == 1
+    result = export_and_read_result(event_data, "schema_dates_year_too_early")
+    assert result["year_column"][0] == datetime.date(1670, 1, 1)
 
 
-def test_ParquetExporter_invalid_year_too_late(event, dates_file_year_too_late):
+def test_ParquetExporter_year_after_pandas_range(event, dates_file_year_too_late):
     prefix, file = dates_file_year_too_late()
     event_data = event(prefix, chunksize=None, schema=schema_dates)
-    exporter = ParquetExporter(event_data)
-    result = exporter.export()
-    assert result["status"] == "CONVERSION_FAILED"
-    assert len(result["errors"]) == 1
+    result = export_and_read_result(event_data, "schema_dates_year_too_late")
+    assert result["year_column"][0] == datetime.date(2263, 1, 1)
 
 
 def test_ParquetExporter_date_with_string(event, dates_file_date_string_value):
@@ -303,3 +310,347 @@ def test_ParquetExporter_valid_datetimes_mixed_formats(
     assert result["datetime_column"][1].hour == 20
     assert result["datetime_column"][1].minute == 0
     assert result["datetime_column"][1].second == 0
+
+
+def _schema_cache(event_data):
+    s3_prefix = event_data["payload"]["output_dataset"]["s3_prefix"]
+    key = s3_prefix.replace("%stage%", "intermediate").replace(
+        "edition=20200120T133701/", "schema_cache.json"
+    )
+    return key
+
+
+def test_ParquetExporter_saves_schema_cache(event, datetimes_file, s3_client):
+    prefix, file = datetimes_file()
+    event_data = event(prefix, chunksize=None, schema=None)
+    ParquetExporter(event_data).export()
+
+    body = s3_client.get_object(Bucket=BUCKET, Key=_schema_cache(event_data))["Body"]
+    assert json.loads(body.read()) == {
+        "date_formats": {"datetime_column": "ISO8601"},
+        "delimiter": ",",
+        "dtypes": {"datetime_column": "string[pyarrow]", "id": "int64[pyarrow]"},
+    }
+
+
+def test_ParquetExporter_uses_schema_cache(event, husholdninger_single, s3_client):
+    prefix, file = husholdninger_single()
+    event_data = event(prefix, chunksize=None, schema=None)
+    s3_client.put_object(
+        Bucket=BUCKET,
+        Key=_schema_cache(event_data),
+        Body=json.dumps({"delimiter": ";", "dtypes": {"aar": "string[pyarrow]"}}),
+    )
+
+    result = export_and_read_result(event_data, "husholdninger")
+    assert result["aar"].dtype == "string"
+    assert result["aar"][0] == "2008"
+
+
+def test_ParquetExporter_replaces_cached_delimiter(
+    event, husholdninger_single, s3_client
+):
+    prefix, file = husholdninger_single()
+    event_data = event(prefix, chunksize=None, schema=None)
+    s3_client.put_object(
+        Bucket=BUCKET,
+        Key=_schema_cache(event_data),
+        Body=json.dumps({"delimiter": ","}),
+    )
+
+    result = export_and_read_result(event_data, "husholdninger")
+    assert "aar" in result.columns
+
+    body = s3_client.get_object(Bucket=BUCKET, Key=_schema_cache(event_data))["Body"]
+    assert json.loads(body.read())["delimiter"] == ";"
+
+
+def _write_intermediate(s3_client, event_data, key, etag, fmt="arrow"):
+    return intermediate.write(
+        s3_client,
+        OutputDataset(**event_data["payload"]["output_dataset"]),
+        key,
+        etag,
+        [{"id": 1, "date": "2020-01-01"}, {"id": 2}],
+        [("id", "integer"), ("date", "string")],
+        fmt,
+    )
+
+
+def test_ParquetExporter_reads_intermediate(event, datetimes_file, s3_client):
+    prefix, file = datetimes_file()
+    key = f"{prefix}schema_datetimes.csv"
+    etag = s3_client.head_object(Bucket=BUCKET, Key=key)["ETag"]
+    event_data = event(prefix, chunksize=None)
+    _write_intermediate(s3_client, event_data, key, etag)
+    exporter = ParquetExporter(event_data)
+
+    with patch.object(exporter, "_read_csv_data") as read_csv_data:
+        exporter.export()
+
+    read_csv_data.assert_not_called()
+    output_prefix = event_data["payload"]["output_dataset"]["s3_prefix"].replace(
+        "%stage%", "intermediate"
+    )
+    result = wr.s3.read_parquet(
+        f"s3://{BUCKET}/{output_prefix}{event_data['task']}/", dtype_backend="pyarrow"
+    ).sort_values("id", ignore_index=True)
+    assert result["id"].tolist() == [1, 2]
+    assert result["date"][0] == datetime.datetime(2020, 1, 1)
+    assert pd.isna(result["date"][1])
+
+
+def test_ParquetExporter_ignores_stale_intermediate(event, datetimes_file, s3_client):
+    prefix, file = datetimes_file()
+    event_data = event(prefix, chunksize=None)
+    _write_intermediate(
+        s3_client, event_data, f"{prefix}schema_datetimes.csv", '"outdated"'
+    )
+    exporter = ParquetExporter(event_data)
+
+    with patch.object(
+        exporter, "_read_csv_data", wraps=exporter._read_csv_data
+    ) as read_csv_data:
+        exporter.export()
+
+    read_csv_data.assert_called_once()
+
+
+def test_ParquetExporter_reads_intermediate_chunked(event, datetimes_file, s3_client):
+    prefix, file = datetimes_file()
+    key = f"{prefix}schema_datetimes.csv"
+    etag = s3_client.head_object(Bucket=BUCKET, Key=key)["ETag"]
+    event_data = event(prefix, chunksize=1)
+    _write_intermediate(s3_client, event_data, key, etag, fmt="parquet")
+
+    [(filename, chunks)] = ParquetExporter(event_data).read_csv()
+
+    assert filename == "schema_datetimes"
+    assert [chunk["id"].tolist() for chunk in chunks] == [[1], [2]]
+
+
+def _parquet_metadata(s3_client, key):
+    body = s3_client.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+    return pq.ParquetFile(io.BytesIO(body)).metadata
+
+
+def test_ParquetExporter_parquet_options(event, husholdninger_single, s3_client):
+    prefix, file = husholdninger_single()
+    event_data = event(prefix, chunksize=None)
+    key = (
+        event_data["payload"]["output_dataset"]["s3_prefix"].replace(
+            "%stage%", "intermediate"
+        )
+        + event_data["task"]
+        + "/husholdninger"
+    )
+
+    ParquetExporter(event_data).export()
+    column = _parquet_metadata(s3_client, key + ".parquet").row_group(0).column(0)
+    assert column.compression == "ZSTD"
+
+    event_data["payload"]["pipeline"]["task_config"]["csv_exporter"]["parquet"] = {
+        "compression": "gzip",
+        "row_group_size": 3,
+    }
+    ParquetExporter(event_data).export()
+    # Only gzip compressed files are named as such.
+    metadata = _parquet_metadata(s3_client, key + ".parquet.gz")
+    assert metadata.row_group(0).column(0).compression == "GZIP"
+    assert metadata.num_row_groups == 3
+
+
+def _next_edition(event_data, edition="20200121T133701"):
+    event_data = copy.deepcopy(event_data)
+    output_dataset = event_data["payload"]["output_dataset"]
+    output_dataset["s3_prefix"] = output_dataset["s3_prefix"].replace(
+        output_dataset["edition"], edition
+    )
+    output_dataset["edition"] = edition
+    return event_data
+
+
+def _output_keys(s3_client, event_data):
+    prefix = event_data["payload"]["output_dataset"]["s3_prefix"].replace(
+        "%stage%", "intermediate"
+    )
+    response = s3_client.list_objects_v2(Bucket=BUCKET, Prefix=prefix)
+    return [obj["Key"].removeprefix(prefix) for obj in response.get("Contents", [])]
+
+
+def test_ParquetExporter_reuses_unchanged(event, husholdninger_multiple, s3_client):
+    prefix, folder = husholdninger_multiple()
+    event_data = event(prefix, chunksize=None)
+    ParquetExporter(event_data).export()
+    expected = export_and_read_result(event_data, "husholdninger")
+
+    next_edition = _next_edition(event_data)
+    with patch.object(ParquetExporter, "_write_parquet") as write_parquet:
+        response = ParquetExporter(next_edition).export()
+
+    write_parquet.assert_not_called()
+    assert response["status"] == "CONVERSION_SUCCESS"
+    assert _output_keys(s3_client, next_edition) == _output_keys(s3_client, event_data)
+    pd.testing.assert_frame_equal(
+        export_and_read_result(next_edition, "husholdninger"), expected
+    )
+
+
+def test_ParquetExporter_converts_changed(event, husholdninger_multiple, s3_client):
+    prefix, folder = husholdninger_multiple()
+    event_data = event(prefix, chunksize=None)
+    ParquetExporter(event_data).export()
+
+    [changed, *_] = s3_client.list_objects_v2(Bucket=BUCKET, Prefix=prefix)["Contents"]
+    body = s3_client.get_object(Bucket=BUCKET, Key=changed["Key"])["Body"].read()
+    s3_client.put_object(Bucket=BUCKET, Key=changed["Key"], Body=body + body[-20:])
+
+    next_edition = _next_edition(event_data)
+    with patch.object(
+        ParquetExporter, "_write_parquet", wraps=ParquetExporter._write_parquet
+    ) as write_parquet:
+        ParquetExporter(next_edition).export()
+
+    assert write_parquet.call_count == 1
+    assert _output_keys(s3_client, next_edition) == _output_keys(s3_client, event_data)
+
+
+def test_ParquetExporter_reuses_unchanged_chunks(
+    event, husholdninger_single, s3_client, tmp_path
+):
+    prefix, file = husholdninger_single()
+    event_data = event(prefix, chunksize=2)
+
+    # Chunks are converted in child processes, which can't write to the
+    # mocked S3; record the first edition by hand instead.
+    exporter = ParquetExporter(event_data)
+    exporter.fingerprints = exporter._fingerprints(exporter.s3_prefix())
+    [s3_object] = exporter._list_s3_objects()
+    exporter.fingerprints.unchanged("husholdninger", s3_object)
+    [(filename, chunks)] = exporter.read_csv()
+    for i, chunk in enumerate(chunks):
+        exporter.fingerprints.unchanged_chunk(filename, i, chunk)
+        output = f"husholdninger.part.{i + 1}.parquet"
+        s3_client.put_object(
+            Bucket=BUCKET, Key=exporter.fingerprints.prefix + output, Body=b"..."
+        )
+        exporter.fingerprints.add_outputs(filename, [output], chunk=i)
+    exporter.fingerprints.save()
+
+    # Change the file, keeping all but its last chunk.
+    body = s3_client.get_object(Bucket=BUCKET, Key=s3_object["Key"])["Body"].read()
+    s3_client.put_object(
+        Bucket=BUCKET, Key=s3_object["Key"], Body=body.rsplit(b"\n", 2)[0] + b"\n"
+    )
+
+    next_edition = _next_edition(event_data)
+    parts = []
+
+    class Process:
+        """Run the conversion of a chunk in this process."""
+
+        def __init__(self, target, args, kwargs):
+            self.run = lambda: target(*args, **kwargs)
+            parts.append(args[3])
+
+        def start(self):
+            self.run()
+
+    with (
+        patch("okdata.pipeline.converters.csv.parquet.Process", Process),
+        patch("tempfile.tempdir", str(tmp_path)),
+    ):
+        ParquetExporter(next_edition).export()
+
+    # Only the last chunk changed (it's now shorter).
+    assert parts == [i + 1]
+    assert _output_keys(s3_client, next_edition) == [
+        f"csv_exporter/husholdninger.part.{n}.parquet" for n in range(1, i + 2)
+    ]
+
+    # The spilled chunks are cleaned up.
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spill(tmp_path):
+    df = pd.read_csv(
+        io.StringIO("a,b,c,d\n1,x,2.5,true\n2,,3.5,false\n"),
+        dtype={"b": "string[pyarrow]"},
+        dtype_backend="pyarrow",
+    )
+    path = str(tmp_path / "0.arrow")
+
+    assert _spill(df, path) > 0
+
+    result = _read_spilled(path, df.dtypes.to_dict())
+    pd.testing.assert_frame_equal(result, df)
+    assert result["b"].dtype == "string[pyarrow]"
+
+
+# With a single process, the chunks read while it's busy are spilled, at most
+# `max_spilled_bytes` of them at a time.
+@pytest.mark.parametrize(
+    "max_processes,max_spilled_bytes", [(6, 2**28), (1, 2**28), (1, 1)]
+)
+def test_ParquetExporter_chunked_child_processes(
+    event, husholdninger_single, monkeypatch, max_processes, max_spilled_bytes
+):
+    monkeypatch.setattr(
+        "okdata.pipeline.converters.csv.parquet.MAX_PROCESSES", max_processes
+    )
+    monkeypatch.setattr(
+        "okdata.pipeline.converters.csv.parquet.MAX_SPILLED_BYTES", max_spilled_bytes
+    )
+    prefix, file = husholdninger_single()
+    event_data = event(prefix, chunksize=3)
+    exporter = ParquetExporter(event_data)
+    exporter.fingerprints = exporter._fingerprints(exporter.s3_prefix())
+    [(filename, chunks)] = exporter.read_csv()
+    expected = pd.read_csv(file, sep=";")
+
+    def export(source, schema, out_prefix, part, connection, **kwargs):
+        # Report the rows of the chunk instead of writing them
+        # to the mocked S3, which the child processes can't reach.
+        connection.send((source.to_json(orient="records"), {}))
+
+    with patch.object(ParquetExporter, "_export", staticmethod(export)):
+        outputs = exporter._parallel_export(filename, chunks, None, "out")
+        result = pd.concat(
+            pd.read_json(io.StringIO(rows), orient="records") for rows in outputs
+        )
+
+    assert len(result) == len(expected)
+    assert sorted(result["aar"]) == sorted(expected["aar"])
+
+
+def test_ParquetExporter_pipeline(event, husholdninger_multiple, s3_client):
+    prefix, folder = husholdninger_multiple()
+    event_data = event(prefix, chunksize=None)
+    expected = export_and_read_result(event_data, "husholdninger")
+
+    event_data = _next_edition(event_data)
+    event_data["payload"]["pipeline"]["task_config"]["csv_exporter"]["pipeline"] = {
+        "prefetch": 2,
+        "upload": 2,
+    }
+    exporter = ParquetExporter(event_data)
+    exporter.fingerprints = exporter._fingerprints(exporter.s3_prefix())
+    s3_objects = exporter._list_s3_objects()
+
+    outputs = list(
+        exporter.convert_csv_pipelined(
+            s3_objects,
+            lambda source: exporter._convert(source, None, exporter.datetime_columns),
+            lambda filename, source: exporter._write_parquet(
+                source, f"s3://{BUCKET}/{exporter.s3_prefix()}{filename}"
+            ),
+        )
+    )
+
+    assert [output.split("/")[-1] for output in outputs] == [
+        ParquetExporter.filename(obj["Key"]) + ".parquet" for obj in s3_objects
+    ]
+    result = pd.concat(wr.s3.read_parquet(output) for output in outputs)
+    pd.testing.assert_frame_equal(
+        result.reset_index(drop=True), expected.reset_index(drop=True)
+    )
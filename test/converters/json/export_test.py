@@ -0,0 +1,111 @@
+import json
+
+import pytest
+from deltalake import DeltaTable
+
+from okdata.pipeline.converters import delta
+from okdata.pipeline.converters.base import BUCKET
+from okdata.pipeline.converters.json import delta as json_delta
+from okdata.pipeline.converters.json.delta import DeltaExporter
+
+RECORDS = [
+    {"id": 1, "bydel": {"id": 1, "navn": "Alna"}},
+    {"id": 2, "bydel": {"id": 2, "navn": "Bjerke"}},
+]
+
+
+def _event(task_config):
+    return {
+        "execution_name": "boligpriser-UUID",
+        "task": "json_to_delta",
+        "payload": {
+            "pipeline": {
+                "id": "husholdninger-med-barn",
+                "task_config": {"json_to_delta": task_config},
+            },
+            "output_dataset": {
+                "id": "boligpriser",
+                "version": "1",
+                "edition": "20200120T133701",
+                "s3_prefix": "%stage%/green/boligpriser/version=1/edition=20200120T133701/",
+            },
+            "step_data": {
+                "s3_input_prefixes": {"boligpriser": "input/"},
+                "status": "OK",
+                "errors": [],
+            },
+        },
+    }
+
+
+@pytest.fixture
+def table_path(tmp_path, mocker):
+    # `deltalake` writes to S3 by itself, out of reach of moto, so write the
+    # table locally instead.
+    mocker.patch.object(delta, "_storage_options", return_value={})
+    write_delta_arrow = json_delta.write_delta_arrow
+    mocker.patch.object(
+        json_delta,
+        "write_delta_arrow",
+        side_effect=lambda data, path, merge_keys=None: write_delta_arrow(
+            data, str(tmp_path), merge_keys
+        ),
+    )
+    return tmp_path
+
+
+@pytest.fixture
+def json_input(s3_client, s3_bucket):
+    def put(*files):
+        for i, records in enumerate(files):
+            body = "".join(json.dumps(record) + "\n" for record in records)
+            s3_client.put_object(Bucket=BUCKET, Key=f"input/{i}.json", Body=body)
+
+    return put
+
+
+@pytest.mark.parametrize("chunksize", [None, 1])
+def test_DeltaExporter(json_input, table_path, chunksize):
+    json_input(RECORDS[:1], RECORDS[1:])
+
+    response = DeltaExporter(_event({"chunksize": chunksize})).export()
+
+    assert response["status"] == "CONVERSION_SUCCESS"
+    assert (
+        sorted(
+            DeltaTable(str(table_path)).to_pyarrow_table().to_pylist(),
+            key=lambda row: row["id"],
+        )
+        == RECORDS
+    )
+
+
+def test_DeltaExporter_flatten(json_input, table_path):
+    json_input(RECORDS)
+
+    DeltaExporter(_event({"nested": "flatten"})).export()
+
+    assert DeltaTable(str(table_path)).to_pyarrow_table().to_pylist() == [
+        {"id": 1, "bydel_id": 1, "bydel_navn": "Alna"},
+        {"id": 2, "bydel_id": 2, "bydel_navn": "Bjerke"},
+    ]
+
+
+def test_DeltaExporter_merge(json_input, table_path):
+    json_input(RECORDS, [{"id": 2, "bydel": {"id": 2, "navn": "Bjerkee"}}])
+
+    DeltaExporter(_event({"merge_keys": ["id"]})).export()
+
+    assert sorted(
+        DeltaTable(str(table_path)).to_pyarrow_table().to_pylist(),
+        key=lambda row: row["id"],
+    ) == [RECORDS[0], {"id": 2, "bydel": {"id": 2, "navn": "Bjerkee"}}]
+
+
+def test_DeltaExporter_invalid_input(s3_client, s3_bucket, table_path):
+    s3_client.put_object(Bucket=BUCKET, Key="input/0.json", Body=b'{"id": 1,\n')
+
+    response = DeltaExporter(_event({})).export()
+
+    assert response["status"] == "CONVERSION_FAILED"
+    assert response["errors"][0]["error"] == "ValueError"
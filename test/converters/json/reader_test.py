@@ -0,0 +1,170 @@
+import datetime
+import gzip
+import json
+
+import pyarrow as pa
+import pytest
+
+from okdata.pipeline.converters.base import BUCKET
+from okdata.pipeline.converters.json import reader
+
+RECORDS = [
+    {"id": 1, "dato": "2020-01-20", "bydel": {"id": 1, "navn": "Alna"}},
+    {"id": 2, "dato": "2020-01-21", "bydel": None},
+]
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "integer"},
+        "dato": {"type": "string", "format": "date"},
+        "bydel": {
+            "type": ["object", "null"],
+            "properties": {"id": {"type": "number"}, "navn": {"type": "string"}},
+        },
+    },
+}
+
+
+def _ndjson(records):
+    return "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+
+
+@pytest.fixture
+def put(s3_client, s3_bucket):
+    def put(key, body):
+        s3_client.put_object(Bucket=BUCKET, Key=key, Body=body)
+        return key
+
+    return put
+
+
+def test_arrow_schema():
+    assert reader.arrow_schema(SCHEMA) == pa.schema(
+        [
+            ("id", pa.int64()),
+            ("dato", pa.date32()),
+            ("bydel", pa.struct([("id", pa.float64()), ("navn", pa.string())])),
+        ]
+    )
+    assert reader.arrow_schema(SCHEMA, for_reading=True).field(
+        "dato"
+    ).type == pa.timestamp("s")
+
+
+def test_arrow_schema_leaves_unknown_types_to_inference():
+    schema = {"properties": {"a": {"type": ["string", "integer"]}, "b": {}}}
+
+    assert reader.arrow_schema(schema) == pa.schema([])
+
+
+def test_delta_type():
+    assert reader.delta_type(
+        pa.struct([("a", pa.null()), ("b", pa.list_(pa.timestamp("s")))])
+    ) == pa.struct([("a", pa.string()), ("b", pa.list_(pa.timestamp("us")))])
+
+
+def test_flatten():
+    batch = pa.RecordBatch.from_pylist(
+        [{"a": 1, "b": {"c": {"d": "x"}, "e": 2}}, {"a": 2, "b": None}]
+    )
+
+    assert reader.flatten(batch).to_pylist() == [
+        {"a": 1, "b_c_d": "x", "b_e": 2},
+        {"a": 2, "b_c_d": None, "b_e": None},
+    ]
+
+
+def test_read_with_schema(s3_client, put):
+    key = put("input/data.json", _ndjson(RECORDS))
+
+    table = reader.read(s3_client, key, schema=SCHEMA).read_all()
+
+    assert table.schema == reader.arrow_schema(SCHEMA)
+    assert table.to_pylist() == [
+        {
+            "id": 1,
+            "dato": datetime.date(2020, 1, 20),
+            "bydel": {"id": 1.0, "navn": "Alna"},
+        },
+        {"id": 2, "dato": datetime.date(2020, 1, 21), "bydel": None},
+    ]
+
+
+def test_read_infers_types(s3_client, put):
+    key = put("input/data.json", _ndjson([{"a": None, "b": "2020-01-20T13:37:01"}]))
+
+    table = reader.read(s3_client, key).read_all()
+
+    assert table.schema == pa.schema([("a", pa.string()), ("b", pa.timestamp("us"))])
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_read_flatten(s3_client, put, stream):
+    key = put("input/data.json", _ndjson(RECORDS))
+
+    batches = reader.read(s3_client, key, nested="flatten", stream=stream)
+
+    assert batches.schema.names == ["id", "dato", "bydel_id", "bydel_navn"]
+    assert batches.read_all().column("bydel_navn").to_pylist() == ["Alna", None]
+
+
+def test_read_array(s3_client, put):
+    key = put("input/data.json", json.dumps(RECORDS, indent=2).encode("utf-8"))
+
+    table = reader.read(s3_client, key, schema=SCHEMA).read_all()
+
+    assert table.column("id").to_pylist() == [1, 2]
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_read_array_in_blocks(s3_client, put, mocker, stream):
+    mocker.patch.object(reader, "ARRAY_BLOCK_SIZE", 1)
+    records = [{"id": i, "navn": None if i == 0 else "Alna"} for i in range(3)]
+    key = put("input/data.json", json.dumps(records).encode("utf-8"))
+
+    batches = reader.read(
+        s3_client,
+        key,
+        schema={"properties": {"navn": {"type": "string"}}},
+        stream=stream,
+    )
+
+    assert [batch.num_rows for batch in batches] == [1, 1, 1]
+
+
+def test_read_array_types_unified(s3_client, put, mocker):
+    mocker.patch.object(reader, "ARRAY_BLOCK_SIZE", 1)
+    key = put(
+        "input/data.json",
+        json.dumps([{"a": None, "b": 1}, {"a": "x", "b": 1.5}]).encode("utf-8"),
+    )
+
+    table = reader.read(s3_client, key).read_all()
+
+    assert table.schema == pa.schema([("a", pa.string()), ("b", pa.float64())])
+    assert table.to_pylist() == [{"a": None, "b": 1.0}, {"a": "x", "b": 1.5}]
+
+
+@pytest.mark.parametrize("body", [b"[1, 2]", b'[{"a": 1}] {"a": 2}'])
+def test_read_array_of_non_objects(s3_client, put, body):
+    key = put("input/data.json", body)
+
+    with pytest.raises(ValueError):
+        reader.read(s3_client, key).read_all()
+
+
+@pytest.mark.parametrize("body", [_ndjson(RECORDS), json.dumps(RECORDS).encode()])
+def test_read_gzip(s3_client, put, body):
+    key = put("input/data.json.gz", gzip.compress(body))
+
+    table = reader.read(s3_client, key, stream=True).read_all()
+
+    assert table.column("id").to_pylist() == [1, 2]
+
+
+def test_read_invalid_nested(s3_client, put):
+    key = put("input/data.json", _ndjson(RECORDS))
+
+    with pytest.raises(ValueError):
+        reader.read(s3_client, key, nested="unnest")
@@ -1,4 +1,6 @@
-from okdata.pipeline.converters.base import Exporter
+import pytest
+
+from okdata.pipeline.converters.base import Exporter, TaskConfig
 
 
 def test_export_response_success(test_event):
@@ -15,3 +17,21 @@ def test_export_response_failed(test_event):
     assert response["status"] == "CONVERSION_FAILED"
     assert response["errors"] == ["err"]
     assert response["s3_input_prefixes"] == {"boligpriser": "prefix"}
+
+
+@pytest.mark.parametrize("merge_keys", ["id", [], [1]])
+def test_task_config_invalid_merge_keys(merge_keys):
+    with pytest.raises(ValueError):
+        TaskConfig(merge_keys=merge_keys)
+
+
+def test_task_config_invalid_pipeline():
+    with pytest.raises(ValueError):
+        TaskConfig(pipeline={"prefetch": 0})
+
+
+def test_task_config_nested():
+    assert TaskConfig().nested == "struct"
+
+    with pytest.raises(ValueError):
+        TaskConfig(nested="unnest")
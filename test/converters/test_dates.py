@@ -0,0 +1,55 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from okdata.pipeline.converters.dates import format_pattern, parse_dates
+
+
+def test_format_pattern():
+    assert format_pattern("%Y-%m-%dT%H:%M:%S") == (
+        r"\d{4}\-\d{1,2}\-\d{1,2}T\d{1,2}:\d{1,2}:\d{1,2}"
+    )
+
+
+def test_parse_dates():
+    values = pd.Series(["1500-01-31", None, "9999-12-31"], name="d")
+
+    result = parse_dates(values, "%Y-%m-%d", date_only=True)
+
+    assert result.dtype.name == "date32[day][pyarrow]"
+    assert result[0] == datetime.date(1500, 1, 31)
+    assert pd.isnull(result[1])
+    assert result[2] == datetime.date(9999, 12, 31)
+
+
+def test_parse_dates_timestamps():
+    values = pd.Series(["1066-10-14T09:00:00"], dtype="string[pyarrow]")
+
+    result = parse_dates(values, "%Y-%m-%dT%H:%M:%S")
+
+    assert result.dtype.name == "timestamp[us][pyarrow]"
+    assert result[0] == datetime.datetime(1066, 10, 14, 9)
+
+
+def test_parse_dates_match_anywhere():
+    values = pd.Series(["2020-01-01T12:12:01", "Dato: 1814-05-17"])
+
+    result = parse_dates(values, "%Y-%m-%d", date_only=True)
+
+    assert list(result) == [datetime.date(2020, 1, 1), datetime.date(1814, 5, 17)]
+
+
+def test_parse_dates_keeps_index():
+    values = pd.Series(["2020", "2021"], index=[10, 20], name="year")
+
+    result = parse_dates(values, "%Y", date_only=True)
+
+    assert list(result.index) == [10, 20]
+    assert result.name == "year"
+
+
+@pytest.mark.parametrize("value", ["hello world", "2020-30-10T12:00:01"])
+def test_parse_dates_invalid(value):
+    with pytest.raises(ValueError):
+        parse_dates(pd.Series([value], name="d"), "%Y-%m-%d", date_only=True)
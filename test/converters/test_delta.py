@@ -0,0 +1,173 @@
+from unittest.mock import patch
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+from deltalake import DeltaTable
+
+from okdata.pipeline.converters import delta
+from okdata.pipeline.converters.base import BUCKET
+from okdata.pipeline.converters.delta import (
+    copy_previous_table,
+    write_delta,
+    write_delta_arrow,
+    write_delta_streaming,
+)
+
+
+@pytest.fixture(autouse=True)
+def local_storage(mocker):
+    mocker.patch.object(delta, "_storage_options", return_value={})
+
+
+@pytest.fixture
+def log_add(mocker):
+    return mocker.patch.object(delta, "log_add")
+
+
+def _rows(path):
+    return sorted(
+        DeltaTable(str(path)).to_pyarrow_table().to_pylist(),
+        key=lambda row: row["Bydel id"],
+    )
+
+
+def _edition(ids, names):
+    return pd.DataFrame({"Bydel id": ids, "navn": names})
+
+
+def test_write_delta_appends_without_merge_keys():
+    df = _edition([1], ["Alna"])
+
+    with patch("awswrangler.s3.to_deltalake") as to_deltalake:
+        write_delta(df, "s3://bucket/table/")
+
+    to_deltalake.assert_called_once_with(
+        df=df, path="s3://bucket/table/", s3_allow_unsafe_rename=True
+    )
+
+
+def test_write_delta_merge(tmp_path, log_add):
+    write_delta(_edition([1, 2], ["Alna", "Bjerke"]), str(tmp_path), ["Bydel id"])
+    write_delta(_edition([3], ["Frogner"]), str(tmp_path), ["Bydel id"])
+
+    # A full snapshot with one changed row and one new.
+    write_delta(
+        _edition([1, 2, 3, 4], ["Alna", "Bjerkee", "Frogner", "Grorud"]),
+        str(tmp_path),
+        ["Bydel id"],
+    )
+
+    assert _rows(tmp_path) == [
+        {"Bydel id": 1, "navn": "Alna"},
+        {"Bydel id": 2, "navn": "Bjerkee"},
+        {"Bydel id": 3, "navn": "Frogner"},
+        {"Bydel id": 4, "navn": "Grorud"},
+    ]
+    metrics = log_add.call_args.kwargs["delta_merge"]
+    assert metrics["num_target_rows_updated"] == 1
+    assert metrics["num_target_rows_inserted"] == 1
+    # The file with the unchanged row of the second edition is left alone.
+    assert metrics["num_target_files_removed"] == 1
+
+
+def test_write_delta_merge_keeps_last_duplicate(tmp_path, log_add):
+    write_delta(_edition([1, 1], ["Alna", "Bjerke"]), str(tmp_path), ["Bydel id"])
+    write_delta(_edition([1, 1], ["Grorud", "Frogner"]), str(tmp_path), ["Bydel id"])
+
+    assert _rows(tmp_path) == [{"Bydel id": 1, "navn": "Frogner"}]
+
+
+def test_write_delta_merge_missing_key(tmp_path):
+    with pytest.raises(ValueError):
+        write_delta(_edition([1], ["Alna"]), str(tmp_path), ["id"])
+
+
+def test_write_delta_streaming_merge(tmp_path, log_add):
+    editions = [_edition([1, 2], ["Alna", "Bjerke"]), _edition([2], ["Bjerkee"])]
+
+    write_delta_streaming(iter(editions), str(tmp_path), ["Bydel id"])
+
+    assert _rows(tmp_path) == [
+        {"Bydel id": 1, "navn": "Alna"},
+        {"Bydel id": 2, "navn": "Bjerkee"},
+    ]
+
+
+def test_write_delta_arrow_merge(tmp_path, log_add):
+    write_delta_arrow(
+        pa.RecordBatchReader.from_batches(
+            pa.schema([("Bydel id", pa.int64()), ("navn", pa.string())]),
+            [
+                pa.RecordBatch.from_pydict({"Bydel id": [1, 2], "navn": ["A", "B"]}),
+                pa.RecordBatch.from_pydict({"Bydel id": [2], "navn": ["Bjerke"]}),
+            ],
+        ),
+        str(tmp_path),
+        ["Bydel id"],
+    )
+
+    assert _rows(tmp_path) == [
+        {"Bydel id": 1, "navn": "A"},
+        {"Bydel id": 2, "navn": "Bjerke"},
+    ]
+
+
+def test_write_delta_merge_several_columns(tmp_path, log_add):
+    edition = _edition([1, 2, 3], ["Alna", "Bjerke", "Frogner"]).assign(
+        nummer=[12, 9, 5]
+    )
+    write_delta(edition, str(tmp_path), ["Bydel id"])
+    # A change in the first non-key column, one in the last, and one
+    # unchanged row.
+    write_delta(
+        edition.assign(navn=["Alnaa", "Bjerke", "Frogner"], nummer=[12, 8, 5]),
+        str(tmp_path),
+        ["Bydel id"],
+    )
+
+    assert log_add.call_args.kwargs["delta_merge"]["num_target_rows_updated"] == 2
+    assert _rows(tmp_path) == [
+        {"Bydel id": 1, "navn": "Alnaa", "nummer": 12},
+        {"Bydel id": 2, "navn": "Bjerke", "nummer": 8},
+        {"Bydel id": 3, "navn": "Frogner", "nummer": 5},
+    ]
+
+
+def _prefix(edition):
+    return f"intermediate/green/boligpriser/version=1/edition={edition}/"
+
+
+def _put(s3_client, key):
+    s3_client.put_object(Bucket=BUCKET, Key=key, Body=b"")
+
+
+def _keys(s3_client, prefix):
+    response = s3_client.list_objects_v2(Bucket=BUCKET, Prefix=prefix)
+    return sorted(obj["Key"][len(prefix) :] for obj in response.get("Contents", []))
+
+
+def test_copy_previous_table(s3_client, s3_bucket, log_add):
+    # Only editions with a table count, and later editions are left out.
+    _put(s3_client, _prefix("1") + "_delta_log/00000000000000000000.json")
+    _put(s3_client, _prefix("1") + "part-0.parquet")
+    _put(s3_client, _prefix("2") + "husholdninger.csv")
+    _put(s3_client, _prefix("4") + "_delta_log/00000000000000000000.json")
+
+    assert copy_previous_table(s3_client, _prefix("3")) == "1"
+    assert _keys(s3_client, _prefix("3")) == [
+        "_delta_log/00000000000000000000.json",
+        "part-0.parquet",
+    ]
+
+
+def test_copy_previous_table_none(s3_client, s3_bucket):
+    assert copy_previous_table(s3_client, _prefix("1")) is None
+    assert _keys(s3_client, _prefix("1")) == []
+
+
+def test_copy_previous_table_existing_table(s3_client, s3_bucket):
+    _put(s3_client, _prefix("1") + "_delta_log/00000000000000000000.json")
+    _put(s3_client, _prefix("2") + "_delta_log/00000000000000000000.json")
+
+    assert copy_previous_table(s3_client, _prefix("2")) is None
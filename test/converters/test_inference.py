@@ -0,0 +1,98 @@
+import pandas as pd
+import pytest
+
+from okdata.pipeline.converters.inference import (
+    infer_dtypes,
+    looks_like_iso8601,
+    sample,
+)
+
+
+def _frame(**columns):
+    return pd.DataFrame(columns).convert_dtypes(dtype_backend="pyarrow")
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "2020",
+        "2020-05",
+        "2020-05-13",
+        "2024/03/13 20:00:00",
+        "1978-12-31T20:23:14",
+        "1989-04-21T11:58:51.144Z",
+        "2021-10-20T12:00:01+00:00",
+        "20200101",
+    ],
+)
+def test_looks_like_iso8601(value):
+    assert looks_like_iso8601([value])
+
+
+@pytest.mark.parametrize("value", ["hello", "13.05.2020", "2020-05-13 kl. 12", 2020])
+def test_looks_like_iso8601_not(value):
+    assert not looks_like_iso8601(["2020-05-13", value])
+
+
+def test_sample():
+    col = pd.Series(range(1000))
+
+    values = sample(col, size=10)
+
+    assert len(values) == 20
+    assert values[:10] == list(range(10))
+    assert all(value >= 10 for value in values[10:])
+    assert sample(col, size=10) == values
+
+
+def test_sample_short_column():
+    assert sample(pd.Series([1, None, 3]), size=10) == [1, 3]
+
+
+def test_infer_dtypes():
+    df = _frame(
+        date=["2020-01-01", "2021-02-03", None],
+        text=["a", "b", "2020-01-01"],
+        number=[1, 2, 3],
+        empty=[None, None, None],
+    )
+
+    result = infer_dtypes(df)
+
+    assert result["date"].dtype == "datetime64[ns]"
+    assert result["text"].dtype == "string[pyarrow]"
+    assert result["number"].dtype == "int64[pyarrow]"
+    assert result["empty"].dtype == "string[pyarrow]"
+
+
+def test_infer_dtypes_only_parses_candidates(mocker):
+    to_datetime = mocker.spy(pd, "to_datetime")
+    df = _frame(
+        date=["2020-01-01"] * 300, **{f"text_{i}": ["x"] * 300 for i in range(5)}
+    )
+
+    infer_dtypes(df)
+
+    assert to_datetime.call_count == 1
+
+
+def test_infer_dtypes_invalid_date_kept_as_string():
+    result = infer_dtypes(_frame(date=["2020-01-01", "2020-13-01"]))
+
+    assert result["date"].dtype == "string[pyarrow]"
+
+
+def test_infer_dtypes_datetime_columns():
+    datetime_columns = {}
+    infer_dtypes(_frame(a=["2020-01-01"], b=["x"]), datetime_columns)
+    assert datetime_columns == {"a": True, "b": False}
+
+    # Later editions get the same types.
+    result = infer_dtypes(
+        _frame(a=["2020-02-02"], b=["2020-01-01"], c=["2020-01-01"]),
+        datetime_columns,
+    )
+    assert result["a"].dtype == "datetime64[ns]"
+    assert result["b"].dtype == "string[pyarrow]"
+    assert result["c"].dtype == "datetime64[ns]"
+    assert datetime_columns == {"a": True, "b": False, "c": True}
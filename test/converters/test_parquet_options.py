@@ -0,0 +1,73 @@
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from okdata.pipeline.converters.parquet_options import ParquetOptions
+
+
+def test_defaults():
+    options = ParquetOptions.from_task_config(None)
+
+    assert options == ParquetOptions()
+    assert options.compression == "zstd"
+    assert options.dictionary == "auto"
+
+
+def test_from_task_config():
+    options = ParquetOptions.from_task_config(
+        {"compression": "gzip", "compression_level": 6, "row_group_size": 1000}
+    )
+
+    assert options.compression == "gzip"
+    assert options.compression_level == 6
+    assert options.row_group_size == 1000
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        {"compression": "brotli"},
+        {"compression": "snappy", "compression_level": 3},
+        {"dictionary": "sometimes"},
+        {"row_group_size": 0},
+        {"codec": "zstd"},
+    ],
+)
+def test_from_task_config_invalid(config):
+    with pytest.raises(ValueError):
+        ParquetOptions.from_task_config(config)
+
+
+def test_use_dictionary_auto():
+    df = pd.DataFrame(
+        {
+            "district": ["Alna", "Bjerke", "Alna", "Alna"],
+            "reference": ["a", "b", "c", "d"],
+            "count": [1, 1, 1, 2],
+        }
+    )
+    options = ParquetOptions()
+
+    assert options.use_dictionary(df) == ["district", "count"]
+    assert options.use_dictionary(pa.Table.from_pandas(df)) == ["district", "count"]
+
+
+def test_use_dictionary_configured():
+    df = pd.DataFrame({"a": [1, 2]})
+
+    assert ParquetOptions(dictionary=False).use_dictionary(df) is False
+    assert ParquetOptions(dictionary=["a"]).use_dictionary(df) == ["a"]
+
+
+def test_wrangler_kwargs():
+    df = pd.DataFrame({"bydel navn": ["Alna", "Alna"], "id": [1, 2]})
+    options = ParquetOptions(compression="none", row_group_size=10)
+
+    assert options.codec() is None
+    assert options.wrangler_kwargs(df) == {
+        "compression_level": None,
+        "use_dictionary": ["bydel_navn"],
+        "write_statistics": True,
+        "write_page_index": False,
+        "write_table_args": {"row_group_size": 10},
+    }
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+from okdata.pipeline.converters import pipeline as pipeline_module
+from okdata.pipeline.converters.pipeline import Pipeline, PipelineOptions
+from okdata.pipeline.instrumentation import log_add
+
+
+def test_options_defaults():
+    assert PipelineOptions.from_task_config(None) is None
+    assert PipelineOptions.from_task_config({}) == PipelineOptions(1, 1)
+
+
+@pytest.mark.parametrize(
+    "config", [{"prefetch": 0}, {"prefetch": "2"}, {"upload": -1}, {"workers": 2}]
+)
+def test_options_invalid(config):
+    with pytest.raises(ValueError):
+        PipelineOptions.from_task_config(config)
+
+
+def test_run():
+    pipeline = Pipeline(
+        fetch=lambda item: item * 10,
+        process=lambda item, fetched: (item, fetched + 1),
+        upload=lambda processed: processed,
+    )
+
+    assert list(pipeline.run(range(5))) == [(i, i * 10 + 1) for i in range(5)]
+    assert list(pipeline.run([])) == []
+
+
+def test_run_logs_from_caller(mocker):
+    logged = mocker.patch.object(pipeline_module, "log_add")
+    threads = []
+
+    def stage(name):
+        def run(item, *args):
+            threads.append(threading.current_thread())
+            log_add(**{f"{name}_{item}": item})
+            return item
+
+        return run
+
+    pipeline = Pipeline(
+        fetch=stage("fetch"), process=stage("process"), upload=stage("upload")
+    )
+
+    assert list(pipeline.run(range(2))) == [0, 1]
+    assert threading.current_thread() not in threads
+    assert logged.call_args_list == [
+        mocker.call(fetch_0=0, process_0=0, upload_0=0),
+        mocker.call(fetch_1=1, process_1=1, upload_1=1),
+    ]
+
+
+def test_run_overlaps_stages():
+    def stage(*args):
+        time.sleep(0.05)
+
+    pipeline = Pipeline(fetch=stage, process=stage, upload=stage)
+    start = time.perf_counter()
+    list(pipeline.run(range(8)))
+
+    # 8 items through 3 stages of 50 ms take 1.2 s one after another, and
+    # (8 + 2) * 50 ms when overlapped.
+    assert time.perf_counter() - start < 0.8
+
+
+def test_run_bounded():
+    fetched = []
+    uploaded = []
+    ahead = []
+    lock = threading.Lock()
+
+    def fetch(item):
+        with lock:
+            fetched.append(item)
+            ahead.append(len(fetched) - len(uploaded))
+
+    def upload(item):
+        time.sleep(0.01)
+        with lock:
+            uploaded.append(item)
+
+    pipeline = Pipeline(
+        fetch=fetch,
+        process=lambda item, fetched: item,
+        upload=upload,
+        options=PipelineOptions(prefetch=2, upload=1),
+    )
+    list(pipeline.run(range(20)))
+
+    # The queued items, plus the ones being fetched, processed and uploaded.
+    assert max(ahead) <= 2 + 1 + 3
+
+
+@pytest.mark.parametrize("failing", ["fetch", "process", "upload"])
+def test_run_error(failing):
+    def stage(name):
+        def run(item, *args):
+            if name == failing and item == 3:
+                raise ValueError(name)
+            return item
+
+        return run
+
+    pipeline = Pipeline(
+        fetch=stage("fetch"),
+        process=stage("process"),
+        upload=stage("upload"),
+    )
+
+    threads = threading.active_count()
+
+    with pytest.raises(ValueError, match=failing):
+        list(pipeline.run(range(100)))
+
+    assert threading.active_count() == threads
+
+
+def test_run_stopped_by_caller():
+    pipeline = Pipeline(
+        fetch=lambda item: item,
+        process=lambda item, fetched: item,
+        upload=lambda processed: processed,
+    )
+    threads = threading.active_count()
+    results = pipeline.run(range(100))
+
+    assert next(results) == 0
+    results.close()
+    assert threading.active_count() == threads
@@ -74,6 +74,21 @@ class Tester(unittest.TestCase):
         self.assertEqual(config.table_sources[1].start_row, 3)
         self.assertEqual(config.table_sources[1].start_col, 14)
 
+    def test_table_source_end_row(self):
+        config = TableConfig(
+            {"table_sources": [{"start_row": 2, "start_col": 1, "end_row": 5}]}
+        )
+        self.assertEqual(config.table_sources[0].end_row, 5)
+
+        with self.assertRaises(TypeError):
+            TableConfig(
+                {"table_sources": [{"start_row": 2, "start_col": 1, "end_row": "5"}]}
+            )
+        with self.assertRaises(ValueError):
+            TableConfig(
+                {"table_sources": [{"start_row": 2, "start_col": 1, "end_row": 1}]}
+            )
+
     def test_extra_col(self):
         config = TableConfig(
             {
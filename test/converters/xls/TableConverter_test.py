@@ -88,6 +88,25 @@ class Tester(unittest.TestCase):
         wb = conv.read_excel_table(os.path.join(CWD, "data", "simple.xlsx"))
 
         assert isinstance(wb, openpyxl.Workbook)
+        assert wb.read_only
+
+    def test_convert_cell(self):
+        self.assertEqual(TableConverter._convert_cell(None), "")
+        self.assertEqual(TableConverter._convert_cell(2.0), 2)
+        self.assertIsInstance(TableConverter._convert_cell(2.0), int)
+        self.assertEqual(TableConverter._convert_cell(2.5), 2.5)
+        self.assertEqual(TableConverter._convert_cell("foo"), "foo")
+        self.assertTrue(pd.isna(TableConverter._convert_cell("#DIV/0!")))
+
+    def test_read_rows_drops_trailing_empty_rows_and_columns(self):
+        wb = openpyxl.Workbook()
+        sheet = wb.active
+        sheet.append(["A", "B", None])
+        sheet.append([1, None, None])
+        sheet.append([None, None, None])
+
+        self.assertEqual(TableConverter._read_rows(sheet, 1, 1), [["A", "B"], [1, ""]])
+        self.assertEqual(TableConverter._read_rows(sheet, 2, 1, 3), [[1, "", ""]])
 
     def test_read_wrong_sheet_name(self):
         conv = TableConverter(wrong_sheet_name_config)
@@ -151,6 +170,125 @@ class Tester(unittest.TestCase):
         self.assertEqual(list(df.values[6]), [7, "ciao"])
         self.assertEqual(df.size, 14)
 
+    def test_multiple_subtables_read_sheet_once(self):
+        conv = TableConverter(extra_col_config)
+        wb = conv.read_excel_table(os.path.join(CWD, "data", "subtables.xlsx"))
+        sheet = wb["Sheet1"]
+        iter_rows = sheet.iter_rows
+        calls = []
+
+        def counting_iter_rows(*args, **kwargs):
+            calls.append(kwargs)
+            return iter_rows(*args, **kwargs)
+
+        sheet.iter_rows = counting_iter_rows
+        df = conv.convert_table(wb)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0]["min_row"], 1)
+        self.assertEqual(calls[0]["min_col"], 1)
+        self.assertEqual(calls[0]["max_col"], 5)
+        self.assertEqual(df.size, 21)
+
+    def _stacked_subtables(self):
+        wb = openpyxl.Workbook()
+        sheet = wb.active
+        for row in [
+            ["A", "B"],
+            [1, "foo"],
+            [2, "bar"],
+            [None, None],
+            ["A", "B"],
+            [3, "baz"],
+        ]:
+            sheet.append(row)
+
+        config = TableConfig(
+            {
+                "sheet_name": sheet.title,
+                "table_has_header": True,
+                "column_names": ["A", "B"],
+                "table_sources": [
+                    {"start_row": 1, "start_col": 1},
+                    {"start_row": 5, "start_col": 1},
+                ],
+            }
+        )
+        return TableConverter(config), wb
+
+    def test_stacked_subtables(self):
+        conv, wb = self._stacked_subtables()
+        tables = list(conv.iter_tables(wb))
+
+        # The first sub-table ends where the next one starts.
+        self.assertEqual(tables[0].values.tolist(), [[1, "foo"], [2, "bar"]])
+        self.assertEqual(tables[1].values.tolist(), [[3, "baz"]])
+
+    def test_subtables_yielded_when_complete(self):
+        conv, wb = self._stacked_subtables()
+        sheet = wb.active
+        iter_rows = sheet.iter_rows
+        rows_read = []
+
+        def counting_iter_rows(*args, **kwargs):
+            for row in iter_rows(*args, **kwargs):
+                rows_read.append(row)
+                yield row
+
+        sheet.iter_rows = counting_iter_rows
+        tables = conv.iter_tables(wb)
+
+        self.assertEqual(len(next(tables)), 2)
+        self.assertEqual(len(rows_read), 4)
+        self.assertEqual(len(next(tables)), 1)
+        self.assertEqual(len(rows_read), 6)
+
+    def test_subtable_end_row(self):
+        wb = openpyxl.Workbook()
+        sheet = wb.active
+        for row in [["A", "B"], [1, "foo"], [2, "bar"], ["total", 3]]:
+            sheet.append(row)
+
+        config = TableConfig(
+            {
+                "sheet_name": sheet.title,
+                "table_sources": [{"start_row": 1, "start_col": 1, "end_row": 3}],
+            }
+        )
+        df = TableConverter(config).convert_table(wb)
+
+        self.assertEqual(df.values.tolist(), [[1, "foo"], [2, "bar"]])
+
+    def test_extra_cell_within_table(self):
+        wb = openpyxl.Workbook()
+        sheet = wb.active
+        for row in [
+            [],
+            [],
+            ["A", "B"],
+            [1, "foo"],
+            [2, "bar", None, None, 2024],
+            [3, "baz"],
+            [4, "qux"],
+            [5, "quux"],
+        ]:
+            sheet.append(row)
+
+        config = TableConfig(
+            {
+                "sheet_name": sheet.title,
+                "extra_col": {"name": "year", "dtype": "int"},
+                "table_sources": [
+                    {"start_row": 3, "start_col": 1, "extra_row": 5, "extra_col": 5}
+                ],
+            }
+        )
+        df = TableConverter(config).convert_table(wb)
+
+        # The extra cell below the header doesn't cut the table short.
+        self.assertEqual(df["A"].tolist(), [1, 2, 3, 4, 5])
+        self.assertEqual(set(df["year"]), {2024})
+
     def test_invalid_subtable_config(self):
         conv = TableConverter(invalid_subtables_config)
         wb = conv.read_excel_table(os.path.join(CWD, "data", "subtables.xlsx"))
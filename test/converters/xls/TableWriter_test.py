@@ -1,3 +1,5 @@
+import gzip
+import io
 import os
 import sys
 import tempfile
@@ -41,6 +43,39 @@ class Tester(unittest.TestCase):
 
         self.assertEqual(csv_content, expected_content)
 
+    def test_write_csv_gzip(self):
+        writer = TableWriter()
+        df = pd.DataFrame({"A": [1, 2, 3], "B": ["foo", "bar", "baz"]})
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            filepath = os.path.join(tempdir, "output.csv.gz")
+            writer.write_csv(df, filepath, gzip=True)
+
+            with gzip.open(filepath, "rt") as f:
+                csv_content = f.read()
+
+        expected_content = '"A";"B"\n' + '1;"foo"\n' + '2;"bar"\n' + '3;"baz"\n'
+
+        self.assertEqual(csv_content, expected_content)
+
+    def test_write_csv_stream_in_batches(self):
+        df = pd.DataFrame({"A": range(5), "B": ["a", "b", "c", "d", "e"]})
+        out = io.BytesIO()
+
+        TableWriter.write_csv_stream(df, out, batch_size=2)
+
+        self.assertEqual(
+            out.getvalue().decode("utf-8"), df.to_csv(index=False, sep=";")
+        )
+
+    def test_write_csv_stream_empty_table(self):
+        df = pd.DataFrame({"A": [], "B": []})
+        out = io.BytesIO()
+
+        TableWriter.write_csv_stream(df, out)
+
+        self.assertEqual(out.getvalue(), b"A;B\n")
+
 
 if __name__ == "__main__":
     unittest.main()
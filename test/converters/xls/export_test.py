@@ -0,0 +1,181 @@
+import os
+from unittest.mock import patch
+
+import awswrangler as wr
+import pytest
+
+from okdata.pipeline.converters.base import BUCKET
+from okdata.pipeline.converters.xls.export import DeltaExporter, ParquetExporter
+
+CWD = os.path.dirname(os.path.realpath(__file__))
+INPUT_PREFIX = "raw/green/dataset-in/1/20181115/"
+OUTPUT_PREFIX = "intermediate/yellow/dataset-out/1/20200123/"
+
+SUBTABLES_CONFIG = {
+    "sheet_name": "Sheet1",
+    "table_has_header": True,
+    "column_names": ["A", "B"],
+    "extra_col": {"name": "year", "dtype": "int"},
+    "table_sources": [
+        {"start_row": 2, "start_col": 1, "extra_row": 1, "extra_col": 1},
+        {"start_row": 2, "start_col": 4, "extra_row": 1, "extra_col": 4},
+    ],
+}
+
+
+def _event(task_config):
+    return {
+        "execution_name": "dataset-uuid",
+        "task": "xlsx_exporter",
+        "payload": {
+            "pipeline": {
+                "id": "instance-id",
+                "task_config": {"xlsx_exporter": task_config},
+            },
+            "output_dataset": {
+                "id": "dataset-out",
+                "version": "1",
+                "edition": "20200123",
+                "s3_prefix": "%stage%/yellow/dataset-out/1/20200123/",
+            },
+            "step_data": {
+                "s3_input_prefixes": {"dataset-in": INPUT_PREFIX},
+                "status": "OK",
+                "errors": [],
+            },
+        },
+    }
+
+
+@pytest.fixture
+def upload_workbook(s3_client, s3_bucket):
+    def upload(filename):
+        with open(os.path.join(CWD, "data", filename), "rb") as f:
+            s3_client.put_object(Bucket=s3_bucket, Key=INPUT_PREFIX + filename, Body=f)
+
+    return upload
+
+
+def test_parquet_exporter_honours_table_config(upload_workbook):
+    upload_workbook("subtables.xlsx")
+
+    response = ParquetExporter(_event(SUBTABLES_CONFIG)).export()
+
+    assert response["status"] == "CONVERSION_SUCCESS"
+    assert response["s3_input_prefixes"] == {
+        "dataset-out": OUTPUT_PREFIX + "xlsx_exporter/"
+    }
+
+    df = wr.s3.read_parquet(
+        f"s3://{BUCKET}/{OUTPUT_PREFIX}xlsx_exporter/subtables.parquet",
+        dtype_backend="pyarrow",
+    )
+
+    assert list(df.columns) == ["A", "B", "year"]
+    assert [dtype.name for dtype in df.dtypes] == [
+        "int64[pyarrow]",
+        "string[pyarrow]",
+        "int64[pyarrow]",
+    ]
+    assert df.values.tolist()[0] == [1, "foo", 2016]
+    assert df.values.tolist()[3] == [4, "hei", 2017]
+    assert len(df) == 7
+
+
+def test_parquet_exporter_unifies_sub_table_types(s3_client, s3_bucket):
+    import io
+
+    import openpyxl
+
+    wb = openpyxl.Workbook()
+    sheet = wb.active
+    for row in [
+        ["A", "B", None, "A", "B"],
+        [1, None, None, "x", 2.5],
+        [2, None, None, "y", 3.5],
+    ]:
+        sheet.append(row)
+    body = io.BytesIO()
+    wb.save(body)
+    s3_client.put_object(
+        Bucket=s3_bucket, Key=INPUT_PREFIX + "types.xlsx", Body=body.getvalue()
+    )
+    config = {
+        "sheet_name": sheet.title,
+        "table_has_header": True,
+        "column_names": ["A", "B"],
+        "table_sources": [
+            {"start_row": 1, "start_col": 1},
+            {"start_row": 1, "start_col": 4},
+        ],
+    }
+
+    response = ParquetExporter(_event(config)).export()
+
+    assert response["status"] == "CONVERSION_SUCCESS"
+    df = wr.s3.read_parquet(
+        f"s3://{BUCKET}/{OUTPUT_PREFIX}xlsx_exporter/types.parquet",
+        dtype_backend="pyarrow",
+    )
+    # "A" is an integer in the first sub-table and a string in the second,
+    # and "B" is empty in the first.
+    assert df["A"].tolist() == ["1", "2", "x", "y"]
+    assert df["B"].tolist()[2:] == [2.5, 3.5]
+    assert df["B"].isna().tolist()[:2] == [True, True]
+
+
+def test_parquet_exporter_with_schema(upload_workbook):
+    upload_workbook("simple.xlsx")
+    schema = {
+        "properties": {"A": {"type": "number"}, "B": {"type": "string"}},
+    }
+
+    response = ParquetExporter(_event({"schema": schema})).export()
+
+    assert response["status"] == "CONVERSION_SUCCESS"
+
+    df = wr.s3.read_parquet(
+        f"s3://{BUCKET}/{OUTPUT_PREFIX}xlsx_exporter/simple.parquet",
+        dtype_backend="pyarrow",
+    )
+
+    assert [dtype.name for dtype in df.dtypes] == [
+        "double[pyarrow]",
+        "string[pyarrow]",
+    ]
+    assert df.values.tolist() == [[1.0, "foo"], [2.0, "bar"], [3.0, "baz"]]
+
+
+def test_parquet_exporter_invalid_table_config(upload_workbook):
+    upload_workbook("simple.xlsx")
+
+    response = ParquetExporter(_event({"sheet_name": "Nope"})).export()
+
+    assert response["status"] == "CONVERSION_FAILED"
+    assert response["errors"] == [
+        {"error": "ValueError", "message": "Worksheet named 'Nope' not found"}
+    ]
+
+
+def test_delta_exporter_streams_sub_tables(upload_workbook):
+    upload_workbook("subtables.xlsx")
+    batches = []
+
+    def to_deltalake_streaming(dfs, path, **kwargs):
+        batches.extend(dfs)
+
+    with patch.object(
+        wr.s3, "to_deltalake_streaming", side_effect=to_deltalake_streaming
+    ) as to_deltalake_streaming_mock:
+        response = DeltaExporter(_event(SUBTABLES_CONFIG)).export()
+
+    assert response["status"] == "CONVERSION_SUCCESS"
+    assert to_deltalake_streaming_mock.call_args.kwargs["path"] == (
+        f"s3://{BUCKET}/{OUTPUT_PREFIX}"
+    )
+    assert len(batches) == 2
+    assert [df.values.tolist()[0] for df in batches] == [
+        [1, "foo", 2016],
+        [4, "hei", 2017],
+    ]
+    assert all(df["B"].dtype.name == "string[pyarrow]" for df in batches)
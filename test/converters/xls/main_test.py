@@ -1,6 +1,11 @@
+import copy
+import gzip
+import json
+import multiprocessing
 import os
 import sys
 
+from okdata.pipeline.converters.xls import handlers
 from okdata.pipeline.converters.xls.handlers import xlsx_to_csv
 
 CWD = os.path.dirname(os.path.realpath(__file__))
@@ -81,8 +86,40 @@ def test_xlsx_to_csv(s3_client, s3_bucket):
 
     assert content == expected_content
 
+    # The delimiter of the output is cached for the later steps.
+    schema_cache = s3_client.get_object(
+        Bucket=s3_bucket,
+        Key="intermediate/yellow/dataset-out/1/20200123/schema_cache.json",
+    )
+    assert json.load(schema_cache["Body"]) == {"delimiter": ";"}
+
+
+def test_xlsx_to_csv_gzip(s3_client, s3_bucket):
+    excel_path = os.path.join(CWD, "data", "simple.xlsx")
+    upload_key = "raw/green/dataset-in/1/20181115/simple.xlsx"
+    output_prefix = "intermediate/yellow/dataset-out/1/20200123/xls2csv/"
+    download_key = output_prefix + "simple.csv.gz"
+
+    with open(excel_path, "rb") as f:
+        s3_client.put_object(Bucket=s3_bucket, Key=upload_key, Body=f)
+
+    gzip_event = copy.deepcopy(event)
+    gzip_event["payload"]["pipeline"]["task_config"]["xls2csv"]["gzip"] = True
+
+    response = xlsx_to_csv(gzip_event, 0)
+    assert response["status"] == "OK"
+
+    content = gzip.decompress(
+        s3_client.get_object(Bucket=s3_bucket, Key=download_key)["Body"].read()
+    ).decode("utf-8")
+
+    assert content.replace("\r", "") == expected_content
+
+
+def test_xlsx_to_csv_multiple_files(s3_client, s3_bucket, monkeypatch):
+    # Convert in-process; moto's S3 state isn't shared with child processes.
+    monkeypatch.setattr(handlers, "MAX_PROCESSES", 1)
 
-def test_xlsx_to_csv_multiple_files(s3_client, s3_bucket):
     excel_path = os.path.join(CWD, "data", "simple.xlsx")
     upload_prefix = "raw/green/dataset-in/1/20181115/"
     output_prefix = "intermediate/yellow/dataset-out/1/20200123/xls2csv/"
@@ -109,6 +146,59 @@ def test_xlsx_to_csv_multiple_files(s3_client, s3_bucket):
         assert content == expected_content
 
 
+def test_xlsx_to_csv_parallel(s3_client, s3_bucket, mocker):
+    upload_prefix = "raw/green/dataset-in/1/20181115/"
+    output_prefix = "intermediate/yellow/dataset-out/1/20200123/xls2csv/"
+    filenames = [f"{month:02}.xlsx" for month in range(1, 13)]
+
+    for filename in filenames:
+        s3_client.put_object(Bucket=s3_bucket, Key=upload_prefix + filename, Body=b"")
+
+    def convert_to_csv(xlsx_input, output, config, gzip=False):
+        if xlsx_input.endswith("07.xlsx"):
+            raise ValueError("Worksheet named 'Sheet1' not found")
+        if xlsx_input.endswith("11.xlsx"):
+            os._exit(1)
+
+    # Patched before the child processes are forked, so they inherit it.
+    convert_to_csv_mock = mocker.patch.object(
+        handlers, "convert_to_csv", side_effect=convert_to_csv
+    )
+
+    response = xlsx_to_csv(event, 0)
+
+    assert convert_to_csv_mock.call_count == 0
+    assert response["status"] == "CONVERSION_FAILED"
+    assert response["s3_input_prefixes"]["dataset-out"] == output_prefix
+    assert sorted(response["errors"], key=lambda e: e["file"]) == [
+        {
+            "error": "ValueError",
+            "message": "Worksheet named 'Sheet1' not found",
+            "file": upload_prefix + "07.xlsx",
+        },
+        {
+            "error": "ProcessError",
+            "message": "Conversion process exited with code 1",
+            "file": upload_prefix + "11.xlsx",
+        },
+    ]
+
+
+def test_xlsx_to_csv_failure_report(s3_client, s3_bucket):
+    upload_key = "raw/green/dataset-in/1/20181115/broken.xlsx"
+    s3_client.put_object(Bucket=s3_bucket, Key=upload_key, Body=b"not a workbook")
+
+    response = xlsx_to_csv(event, 0)
+
+    assert response["status"] == "CONVERSION_FAILED"
+    assert len(response["errors"]) == 1
+    assert response["errors"][0]["file"] == upload_key
+    assert response["errors"][0]["error"] == "ValueError"
+    assert "Contents" not in s3_client.list_objects_v2(
+        Bucket=s3_bucket, Prefix="intermediate/"
+    )
+
+
 def test_xlsx_to_csv_default_config(s3_client, s3_bucket):
     excel_path = os.path.join(CWD, "data", "simple.xlsx")
     upload_key = "raw/green/dataset-in/1/20181115/simple.xlsx"
@@ -164,3 +254,28 @@ def test_xlsx_to_csv_dirty_spreadsheet(s3_client, s3_bucket):
         "Høyeste fullførte utdanning",
         "Antall personer",
     ]
+
+
+def test_convert_all_joins_processes(monkeypatch):
+    joined = []
+
+    class Process(multiprocessing.Process):
+        def join(self, timeout=None):
+            super().join(timeout)
+            joined.append(self.exitcode)
+
+    def convert_to_csv(xlsx_input, output, table_config, gzip=False):
+        if xlsx_input == "bad.xlsx":
+            raise ValueError("Not a workbook")
+
+    monkeypatch.setattr(handlers, "Process", Process)
+    monkeypatch.setattr(handlers, "convert_to_csv", convert_to_csv)
+
+    errors = handlers.convert_all(
+        [("a.xlsx", "a.csv"), ("bad.xlsx", "bad.csv"), ("c.xlsx", "c.csv")], None
+    )
+
+    assert errors == [
+        {"error": "ValueError", "message": "Not a workbook", "file": "bad.xlsx"}
+    ]
+    assert joined == [0, 0, 0]
@@ -0,0 +1,122 @@
+import datetime
+import io
+import os
+from unittest.mock import Mock
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from okdata.pipeline.converters.xls import readers
+from okdata.pipeline.converters.xls.TableConfig import TableConfig
+from okdata.pipeline.converters.xls.TableConverter import TableConverter
+from okdata.pipeline.converters.xls.readers import OdsWorkbook, open_workbook
+
+CWD = os.path.dirname(os.path.realpath(__file__))
+SIMPLE_ODS = os.path.join(CWD, "data", "simple.ods")
+SIMPLE_XLSX = os.path.join(CWD, "data", "simple.xlsx")
+
+
+def test_open_workbook_by_signature():
+    # The file extension doesn't matter.
+    with open(SIMPLE_ODS, "rb") as f:
+        wb = open_workbook(io.BytesIO(f.read()))
+    assert isinstance(wb, OdsWorkbook)
+    wb.close()
+
+    wb = open_workbook(SIMPLE_XLSX)
+    assert isinstance(wb, openpyxl.Workbook)
+    wb.close()
+
+
+def test_open_workbook_xls(monkeypatch):
+    load_xls = Mock()
+    monkeypatch.setattr(
+        readers,
+        "_READERS",
+        [
+            (offset, signature, load_xls if load is readers.load_xls else load)
+            for offset, signature, load in readers._READERS
+        ],
+    )
+    source_file = io.BytesIO(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + b"\x00" * 504)
+
+    assert open_workbook(source_file) is load_xls.return_value
+    load_xls.assert_called_once_with(source_file)
+    assert source_file.tell() == 0
+
+
+def test_open_workbook_unsupported_format():
+    with pytest.raises(ValueError):
+        open_workbook(io.BytesIO(b"A;B\n1;foo\n"))
+
+
+def test_ods_workbook():
+    wb = open_workbook(SIMPLE_ODS)
+
+    assert wb.sheetnames == ["Sheet1", "Types"]
+    assert wb["Types"] is wb.worksheets[1]
+    assert list(wb["Types"].iter_rows(values_only=True)) == [
+        (datetime.datetime(2020, 1, 23), None, None, True),
+        (0.5, "#DIV/0!", "two\nlines"),
+        (0.5, "#DIV/0!", "two\nlines"),
+    ]
+    assert list(wb["Types"].iter_rows(min_row=2, min_col=2, max_col=4)) == [
+        ("#DIV/0!", "two\nlines", None),
+        ("#DIV/0!", "two\nlines", None),
+    ]
+
+    with pytest.raises(KeyError):
+        wb["Nope"]
+
+    wb.close()
+
+
+def test_ods_skips_padding_rows_and_columns():
+    wb = open_workbook(SIMPLE_ODS)
+    rows = list(wb["Sheet1"].iter_rows(values_only=True))
+    wb.close()
+
+    assert rows == [("A", "B"), (1.0, "foo"), (2.0, "bar"), (3.0, "baz")]
+
+
+def test_convert_ods_like_xlsx():
+    config = TableConfig(
+        {
+            "sheet_name": "Sheet1",
+            "table_has_header": True,
+            "column_names": ["A", "B"],
+            "table_sources": [{"start_row": 1, "start_col": 1}],
+        }
+    )
+    conv = TableConverter(config)
+    dfs = []
+
+    for path in (SIMPLE_ODS, SIMPLE_XLSX):
+        wb = conv.read_excel_table(path)
+        dfs.append(conv.convert_table(wb))
+        wb.close()
+
+    pd.testing.assert_frame_equal(*dfs)
+
+
+def test_xls_workbook():
+    xlrd = pytest.importorskip("xlrd")
+
+    sheet = Mock(nrows=2)
+    sheet.row_types.side_effect = [
+        [xlrd.XL_CELL_TEXT, xlrd.XL_CELL_NUMBER, xlrd.XL_CELL_EMPTY],
+        [xlrd.XL_CELL_DATE, xlrd.XL_CELL_BOOLEAN, xlrd.XL_CELL_ERROR],
+    ]
+    sheet.row_values.side_effect = [["foo", 1.0, ""], [43853.0, 1, 0x07]]
+    book = Mock(datemode=0)
+    book.sheet_names.return_value = ["Sheet1"]
+    book.sheet_by_index.return_value = sheet
+
+    wb = readers.XlsWorkbook(book)
+
+    assert wb.sheetnames == ["Sheet1"]
+    assert list(wb["Sheet1"].iter_rows(values_only=True)) == [
+        ("foo", 1.0, None),
+        (datetime.datetime(2020, 1, 23), True, "#DIV/0!"),
+    ]
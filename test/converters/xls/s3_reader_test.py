@@ -0,0 +1,93 @@
+import io
+import os
+
+import openpyxl
+import pytest
+
+from okdata.pipeline.converters.xls.TableConverter import TableConverter
+from okdata.pipeline.converters.xls.s3_reader import S3File
+
+CWD = os.path.dirname(os.path.realpath(__file__))
+KEY = "raw/green/dataset-in/1/20181115/data.bin"
+DATA = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def s3_object(s3_client, s3_bucket):
+    s3_client.put_object(Bucket=s3_bucket, Key=KEY, Body=DATA)
+    return s3_bucket, KEY
+
+
+def test_read_whole_object(s3_client, s3_object):
+    with S3File(s3_client, *s3_object, block_size=1000) as f:
+        assert f.size == len(DATA)
+        assert f.read() == DATA
+        assert f.read() == b""
+
+
+def test_seek_and_read(s3_client, s3_object):
+    with S3File(s3_client, *s3_object, block_size=1000) as f:
+        assert f.seek(-10, io.SEEK_END) == len(DATA) - 10
+        assert f.read() == DATA[-10:]
+
+        f.seek(995)
+        assert f.read(10) == DATA[995:1005]
+        assert f.tell() == 1005
+
+        f.seek(-5, io.SEEK_CUR)
+        assert f.read(5) == DATA[1000:1005]
+
+        with pytest.raises(OSError):
+            f.seek(-1)
+
+
+def test_random_access_does_not_read_ahead(s3_client, s3_object):
+    with S3File(s3_client, *s3_object, block_size=1000, read_ahead=4) as f:
+        f.seek(-10, io.SEEK_END)
+        f.read()
+        f.seek(5000)
+        f.read(10)
+
+        assert f.requests == 2
+        assert sorted(f._cache) == [5, 10]
+
+
+def test_sequential_reads_read_ahead(s3_client, s3_object):
+    with S3File(s3_client, *s3_object, block_size=1000, read_ahead=4) as f:
+        while f.read(100):
+            pass
+
+        # Blocks 0-4, 5-9 and 10.
+        assert f.requests == 3
+
+
+def test_cache_is_bounded(s3_client, s3_object):
+    with S3File(
+        s3_client, *s3_object, block_size=1000, read_ahead=1, cache_blocks=2
+    ) as f:
+        assert f.read() == DATA
+        assert len(f._cache) == 2
+
+
+def test_invalid_cache_size(s3_client, s3_object):
+    with pytest.raises(ValueError):
+        S3File(s3_client, *s3_object, read_ahead=4, cache_blocks=4)
+
+
+def test_open_workbook(s3_client, s3_bucket):
+    key = "raw/green/dataset-in/1/20181115/simple.xlsx"
+    with open(os.path.join(CWD, "data", "simple.xlsx"), "rb") as f:
+        s3_client.put_object(Bucket=s3_bucket, Key=key, Body=f)
+
+    with S3File(s3_client, s3_bucket, key, block_size=1024) as f:
+        wb = TableConverter.read_excel_table(f)
+        try:
+            assert isinstance(wb, openpyxl.Workbook)
+            assert [row for row in wb["Sheet1"].iter_rows(values_only=True)] == [
+                ("A", "B"),
+                (1, "foo"),
+                (2, "bar"),
+                (3, "baz"),
+            ]
+        finally:
+            wb.close()
@@ -0,0 +1,57 @@
+import boto3
+import pytest
+from botocore.config import Config
+
+from okdata.pipeline.converters.xls.s3_writer import MIN_PART_SIZE, S3MultipartWriter
+
+KEY = "intermediate/yellow/dataset-out/1/20200123/xls2csv/data.csv"
+
+
+@pytest.fixture
+def parts_client(s3_client):
+    # The pinned moto version doesn't decode the aws-chunked bodies botocore
+    # sends parts as when checksums are calculated by default.
+    return boto3.client(
+        "s3", config=Config(request_checksum_calculation="when_required")
+    )
+
+
+def _read(s3_client, bucket):
+    return s3_client.get_object(Bucket=bucket, Key=KEY)["Body"].read()
+
+
+def test_small_object(s3_client, s3_bucket):
+    with S3MultipartWriter(s3_client, s3_bucket, KEY, ContentType="text/csv") as f:
+        f.write(b"A;B\n")
+        f.write(b"1;foo\n")
+
+    assert f.parts == 0
+    assert _read(s3_client, s3_bucket) == b"A;B\n1;foo\n"
+    assert s3_client.head_object(Bucket=s3_bucket, Key=KEY)["ContentType"] == "text/csv"
+
+
+def test_multipart_upload(s3_client, s3_bucket, parts_client):
+    data = bytes(range(256)) * (MIN_PART_SIZE // 256) + b"tail"
+
+    with S3MultipartWriter(parts_client, s3_bucket, KEY, part_size=MIN_PART_SIZE) as f:
+        for i in range(0, len(data), 1024 * 1024):
+            f.write(data[i : i + 1024 * 1024])
+
+    assert f.parts == 2
+    assert _read(s3_client, s3_bucket) == data
+
+
+def test_abort_on_error(s3_client, s3_bucket):
+    with pytest.raises(RuntimeError):
+        with S3MultipartWriter(s3_client, s3_bucket, KEY, part_size=MIN_PART_SIZE) as f:
+            f.write(b"x" * (MIN_PART_SIZE + 1))
+            raise RuntimeError("boom")
+
+    assert f.parts == 1
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=s3_bucket)
+    assert "Uploads" not in s3_client.list_multipart_uploads(Bucket=s3_bucket)
+
+
+def test_part_size_too_small(s3_client, s3_bucket):
+    with pytest.raises(ValueError):
+        S3MultipartWriter(s3_client, s3_bucket, KEY, part_size=1024)
@@ -0,0 +1,45 @@
+import pytest
+
+from benchmarks.cold_start import (
+    BUDGETS,
+    budget_violations,
+    handler_entry_points,
+    heavy_module_violations,
+    limit_violations,
+    measure,
+)
+
+
+def test_handler_entry_points():
+    entry_points = handler_entry_points()
+
+    assert "okdata.pipeline.lambda_invoker.invoke_lambda" in entry_points
+    assert "okdata.pipeline.writers.s3.handlers.write_s3" in entry_points
+    assert set(BUDGETS) <= set(entry_points)
+
+
+def test_budget_violations():
+    measurements = {
+        "import_seconds": 60.0,
+        "max_rss_mb": 1.0,
+        "heavy_modules": ["pandas"],
+    }
+    violations = budget_violations(
+        "okdata.pipeline.lambda_invoker.invoke_lambda", measurements
+    )
+
+    assert len(violations) == 2
+    assert "import_seconds" in violations[0]
+    assert "imports pandas" in violations[1]
+
+
+@pytest.mark.parametrize("entry_point", handler_entry_points())
+def test_cold_start_heavy_modules(entry_point):
+    assert heavy_module_violations(entry_point, measure(entry_point)) == []
+
+
+# The import time and memory use depend on the machine.
+@pytest.mark.benchmark
+@pytest.mark.parametrize("entry_point", handler_entry_points())
+def test_cold_start_within_limits(entry_point):
+    assert limit_violations(entry_point, measure(entry_point)) == []
@@ -0,0 +1,206 @@
+import json
+
+import pandas as pd
+import pytest
+from botocore.exceptions import ClientError
+
+from okdata.pipeline.fingerprints import (
+    BUCKET,
+    Fingerprints,
+    chunk_hash,
+    config_hash,
+    record_key,
+)
+from okdata.pipeline.models import OutputDataset
+
+KEY = "intermediate/green/boligpriser/version=1/fingerprints/csv_exporter.json"
+INPUT_KEY = "raw/green/boligpriser/husholdninger.csv"
+
+
+def _dataset(edition):
+    return OutputDataset(
+        id="boligpriser",
+        version="1",
+        edition=edition,
+        s3_prefix=f"%stage%/green/boligpriser/version=1/edition={edition}/",
+    )
+
+
+def _prefix(edition):
+    return f"intermediate/green/boligpriser/version=1/edition={edition}/csv_exporter/"
+
+
+def _fingerprints(s3_client, edition, task_config=None):
+    return Fingerprints(
+        _dataset(edition),
+        "csv_exporter",
+        task_config or {"chunksize": None},
+        _prefix(edition),
+        s3_client,
+    )
+
+
+def _list(s3_client, prefix):
+    response = s3_client.list_objects_v2(Bucket=BUCKET, Prefix=prefix)
+    return [obj["Key"] for obj in response.get("Contents", [])]
+
+
+def _put_input(s3_client, body):
+    s3_client.put_object(Bucket=BUCKET, Key=INPUT_KEY, Body=body)
+    return s3_client.list_objects_v2(Bucket=BUCKET, Prefix=INPUT_KEY)["Contents"][0]
+
+
+@pytest.fixture
+def first_edition(s3_client, s3_bucket):
+    """Record the fingerprints of a first edition with one input file."""
+    s3_object = _put_input(s3_client, "a;b\n1;2\n")
+    fingerprints = _fingerprints(s3_client, "1")
+
+    assert fingerprints.unchanged("husholdninger", s3_object) is None
+
+    s3_client.put_object(
+        Bucket=BUCKET, Key=_prefix("1") + "husholdninger.parquet.gz", Body=b"..."
+    )
+    fingerprints.add_outputs("husholdninger", ["husholdninger.parquet.gz"])
+    fingerprints.save()
+
+    return s3_object
+
+
+def test_record_key():
+    assert record_key(_dataset("1"), "csv_exporter") == KEY
+
+
+def test_record_key_no_prefix():
+    dataset = OutputDataset(id="boligpriser", version="1", s3_prefix=None)
+
+    assert record_key(dataset, "csv_exporter") is None
+
+
+def test_config_hash():
+    assert config_hash({"a": 1, "b": 2}) == config_hash({"b": 2, "a": 1})
+    assert config_hash({"a": 1}) != config_hash({"a": 2})
+
+
+def test_chunk_hash():
+    df = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]})
+
+    assert chunk_hash(df) == chunk_hash(df.copy())
+    assert chunk_hash(df) != chunk_hash(df.iloc[::-1])
+    assert chunk_hash(df) != chunk_hash(df.rename(columns={"b": "c"}))
+
+
+def test_save(s3_client, first_edition):
+    record = json.loads(s3_client.get_object(Bucket=BUCKET, Key=KEY)["Body"].read())
+
+    assert record == {
+        "config": config_hash({"chunksize": None}),
+        "edition": "1",
+        "prefix": _prefix("1"),
+        "files": {
+            "husholdninger": {
+                "etag": first_edition["ETag"],
+                "size": first_edition["Size"],
+                "outputs": ["husholdninger.parquet.gz"],
+            }
+        },
+    }
+
+
+def test_unchanged(s3_client, first_edition):
+    fingerprints = _fingerprints(s3_client, "2")
+    previous = fingerprints.unchanged("husholdninger", first_edition)
+
+    assert previous["outputs"] == ["husholdninger.parquet.gz"]
+    assert fingerprints.reuse("husholdninger", previous) == [
+        _prefix("2") + "husholdninger.parquet.gz"
+    ]
+    assert _list(s3_client, _prefix("2")) == [_prefix("2") + "husholdninger.parquet.gz"]
+    assert fingerprints.files["husholdninger"]["outputs"] == [
+        "husholdninger.parquet.gz"
+    ]
+
+
+def test_unchanged_content_new_etag(s3_client, first_edition):
+    # Same content, but (as with multipart uploads) another ETag.
+    s3_object = dict(first_edition, ETag='"other"')
+    fingerprints = _fingerprints(s3_client, "2")
+
+    # The previous edition didn't need the content hashed.
+    assert fingerprints.unchanged("husholdninger", s3_object) is None
+    sha256 = fingerprints.files["husholdninger"]["sha256"]
+    fingerprints.save()
+
+    fingerprints = _fingerprints(s3_client, "3")
+    assert fingerprints.unchanged("husholdninger", first_edition) is not None
+    assert fingerprints.files["husholdninger"]["sha256"] == sha256
+
+
+def test_changed(s3_client, first_edition):
+    s3_object = _put_input(s3_client, "a;b\n1;3\n")
+
+    assert _fingerprints(s3_client, "2").unchanged("husholdninger", s3_object) is None
+
+
+def test_changed_size_not_hashed(s3_client, first_edition, mocker):
+    s3_object = _put_input(s3_client, "a;b\n1;2\n3;4\n")
+    get_object = mocker.spy(s3_client, "get_object")
+    fingerprints = _fingerprints(s3_client, "2")
+
+    assert fingerprints.unchanged("husholdninger", s3_object) is None
+    assert "sha256" not in fingerprints.files["husholdninger"]
+    # Only the previous fingerprints were read, not the input.
+    assert [call.kwargs["Key"] for call in get_object.call_args_list] == [KEY]
+
+
+def test_changed_config(s3_client, first_edition):
+    fingerprints = _fingerprints(s3_client, "2", {"chunksize": 100})
+
+    assert fingerprints.unchanged("husholdninger", first_edition) is None
+
+
+def test_same_edition(s3_client, first_edition):
+    # Converting an edition again shouldn't copy its output onto itself.
+    assert (
+        _fingerprints(s3_client, "1").unchanged("husholdninger", first_edition) is None
+    )
+
+
+def test_reuse_previous_deleted(s3_client, first_edition):
+    s3_client.delete_object(
+        Bucket=BUCKET, Key=_prefix("1") + "husholdninger.parquet.gz"
+    )
+    fingerprints = _fingerprints(s3_client, "2")
+    previous = fingerprints.unchanged("husholdninger", first_edition)
+
+    with pytest.raises(ClientError):
+        fingerprints.reuse("husholdninger", previous)
+
+
+def test_unchanged_chunk(s3_client, s3_bucket):
+    chunks = [pd.DataFrame({"a": [1, 2]}), pd.DataFrame({"a": [3, 4]})]
+    fingerprints = _fingerprints(s3_client, "1")
+
+    for i, df in enumerate(chunks):
+        assert fingerprints.unchanged_chunk("husholdninger", i, df) is None
+        output = f"husholdninger.part.{i + 1}.parquet.gz"
+        s3_client.put_object(Bucket=BUCKET, Key=_prefix("1") + output, Body=b"...")
+        fingerprints.add_outputs("husholdninger", [output], chunk=i)
+    fingerprints.save()
+
+    fingerprints = _fingerprints(s3_client, "2")
+    previous = fingerprints.unchanged_chunk("husholdninger", 0, chunks[0])
+    assert previous["outputs"] == ["husholdninger.part.1.parquet.gz"]
+    assert fingerprints.reuse_chunk("husholdninger", 0, previous) == [
+        _prefix("2") + "husholdninger.part.1.parquet.gz"
+    ]
+    assert (
+        fingerprints.unchanged_chunk("husholdninger", 1, pd.DataFrame({"a": [3, 5]}))
+        is None
+    )
+
+
+def test_read_error(s3_client, s3_bucket):
+    s3_client.put_object(Bucket=BUCKET, Key=KEY, Body=b"not json")
+
+    assert _fingerprints(s3_client, "2").previous() == {}
@@ -0,0 +1,125 @@
+import pytest
+
+from okdata.pipeline import instrumentation
+from okdata.pipeline.instrumentation import (
+    log_stages,
+    merge_stages,
+    recorded_stages,
+    reset_stages,
+    stage,
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_stages():
+    reset_stages()
+    yield
+    reset_stages()
+
+
+def test_stage_records_metrics():
+    with stage("read") as s:
+        s.add(rows=10, bytes_in=100)
+        sum(range(10000))
+
+    metrics = recorded_stages()["read"]
+
+    assert metrics["calls"] == 1
+    assert metrics["rows"] == 10
+    assert metrics["bytes_in"] == 100
+    assert "bytes_out" not in metrics
+    assert metrics["wall_ms"] >= 0
+    assert metrics["cpu_ms"] >= 0
+    assert metrics["process_peak_rss_mb"] > 0
+
+
+def test_stage_sums_repeated_stages():
+    for _ in range(3):
+        with stage("write") as s:
+            s.add(rows=5)
+
+    metrics = recorded_stages()["write"]
+
+    assert metrics["calls"] == 3
+    assert metrics["rows"] == 15
+
+
+def test_stage_recorded_on_exception():
+    with pytest.raises(ValueError):
+        with stage("parse"):
+            raise ValueError
+
+    assert recorded_stages()["parse"]["calls"] == 1
+
+
+def test_log_stages(mocker):
+    log_add = mocker.patch("okdata.pipeline.instrumentation.log_add")
+
+    @log_stages
+    def handler(event, context):
+        for name in event:
+            with stage(name):
+                pass
+        return "done"
+
+    with stage("previous_invocation"):
+        pass
+
+    assert handler(["list", "read", "read"], None) == "done"
+
+    log_add.assert_called_once_with(stages=recorded_stages())
+    assert set(recorded_stages()) == {"list", "read"}
+    assert recorded_stages()["read"]["calls"] == 2
+
+
+def test_log_stages_on_exception(mocker):
+    log_add = mocker.patch("okdata.pipeline.instrumentation.log_add")
+
+    @log_stages
+    def handler(event, context):
+        with stage("parse"):
+            raise ValueError
+
+    with pytest.raises(ValueError):
+        handler({}, None)
+
+    log_add.assert_called_once_with(stages=recorded_stages())
+
+
+def test_merge_stages():
+    with stage("write") as s:
+        s.add(rows=5)
+
+    merge_stages(
+        {
+            "write": {"calls": 2, "rows": 10, "process_peak_rss_mb": 1e6},
+            "infer_types": {"calls": 1, "rows": 10},
+        }
+    )
+
+    stages = recorded_stages()
+
+    assert stages["write"]["calls"] == 3
+    assert stages["write"]["rows"] == 15
+    assert stages["write"]["process_peak_rss_mb"] == 1e6
+    assert stages["infer_types"] == {"calls": 1, "rows": 10}
+
+
+def test_reset_stages():
+    with stage("list"):
+        pass
+
+    reset_stages()
+
+    assert recorded_stages() == {}
+
+
+def test_stage_disabled(monkeypatch, mocker):
+    monkeypatch.setattr(instrumentation, "ENABLED", False)
+    log_add = mocker.patch("okdata.pipeline.instrumentation.log_add")
+
+    with stage("read") as s:
+        s.add(rows=10)
+
+    assert recorded_stages() == {}
+    log_add.assert_not_called()
@@ -0,0 +1,90 @@
+import csv
+import io
+from types import SimpleNamespace
+
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+
+from okdata.pipeline import intermediate
+from okdata.pipeline.converters.base import Exporter
+from okdata.pipeline.models import OutputDataset
+from okdata.pipeline.validators.csv.parser import parse_csv
+
+DATASET = OutputDataset(
+    id="boligpriser",
+    version="1",
+    edition="20200120T133701",
+    s3_prefix="%stage%/green/boligpriser/version=1/edition=20200120T133701/",
+)
+
+
+def test_prefix():
+    assert (
+        intermediate.prefix(DATASET)
+        == "intermediate/green/boligpriser/version=1/validated/edition=20200120T133701/"
+    )
+
+
+def test_prefix_without_edition():
+    dataset = OutputDataset(id="boligpriser", version="1", s3_prefix="%stage%/foo/")
+
+    assert intermediate.prefix(dataset) == "intermediate/foo/validated/"
+
+
+def test_write_find_read(s3_client, s3_bucket):
+    input_objects = [
+        {"Key": "raw/a.csv", "ETag": '"a"'},
+        {"Key": "raw/b.csv.gz", "ETag": '"b"'},
+        {"Key": "raw/c.csv", "ETag": '"c"'},
+    ]
+    columns = [("id", "integer"), ("name", ["string", "null"])]
+    rows = [{"id": 1, "name": "foo"}, {"id": 2}]
+
+    intermediate.write(s3_client, DATASET, "raw/a.csv", '"a"', rows, columns, "arrow")
+    key = intermediate.write(
+        s3_client, DATASET, "raw/b.csv.gz", '"b"', rows, columns, "parquet"
+    )
+    # Made from an earlier version of the file.
+    intermediate.write(s3_client, DATASET, "raw/c.csv", '"x"', rows, columns, "arrow")
+
+    found = intermediate.find(s3_client, DATASET, input_objects)
+
+    assert found == {
+        "raw/a.csv": intermediate.prefix(DATASET) + "a.arrow",
+        "raw/b.csv.gz": key,
+    }
+    for key in found.values():
+        assert intermediate.read(s3_client, key).to_pylist() == [
+            {"id": 1, "name": "foo"},
+            {"id": 2, "name": None},
+        ]
+
+
+def test_na_values():
+    assert set(intermediate.NA_VALUES) == STR_NA_VALUES
+
+
+def test_same_as_csv(s3_client, s3_bucket):
+    data = b"id,name,note\n1,foo,NA\n2,N/A,null\n3,,bar\n4,baz,None\n"
+    properties = {
+        "id": {"type": "integer"},
+        "name": {"type": "string"},
+        "note": {"type": "string"},
+    }
+    reader = csv.reader(io.StringIO(data.decode()))
+    header = next(reader)
+    rows = parse_csv(
+        reader, {"items": {"properties": properties}}, header, lenient_columns=set()
+    )
+    columns = [(name, properties[name]["type"]) for name in header]
+    key = intermediate.write(
+        s3_client, DATASET, "raw/t.csv", '"t"', rows, columns, "arrow"
+    )
+    schema = {"properties": properties}
+
+    from_intermediate = Exporter._read_intermediate(
+        SimpleNamespace(s3=s3_client), key, schema, None
+    )
+    from_csv = Exporter._read_csv_data("raw/t.csv", schema, ",", None, data=data)
+
+    pd.testing.assert_frame_equal(from_intermediate, from_csv)
@@ -1,4 +1,8 @@
+import io
 import json
+from copy import deepcopy
+
+import pytest
 
 import okdata.pipeline.lambda_invoker as handler
 
@@ -51,6 +55,57 @@ def test_invoke_lambda(mocker):
     handler.invoke_lambda(test_event, {})
     client.invoke.assert_called_with(
         FunctionName="bydelsfakta-data-processing-innvandrer-befolkning",
-        Payload=json.dumps(test_event),
+        Payload=json.dumps(test_event).encode("utf-8"),
         InvocationType="RequestResponse",
     )
+
+
+def test_read_result():
+    response = {"Payload": io.BytesIO(b'{"status": "OK", "errors": []}')}
+
+    assert handler.read_result(response) == {"status": "OK", "errors": []}
+
+
+def test_read_result_error():
+    response = {"Payload": io.BytesIO(b'{"errorMessage": "boom"}')}
+
+    with pytest.raises(handler.InvokedLambdaError):
+        handler.read_result(response)
+
+
+RESULT_KEY = (
+    "intermediate/yellow/bydelsfakta-grafdata/innvandring-befolkning-lang-status/"
+    "version=1/edition=20200303T115117/lambda_invoker/uuid-test.json"
+)
+
+
+def test_invoke_lambda_async(mocker):
+    event = deepcopy(test_event)
+    task_config = event["payload"]["pipeline"]["task_config"]["lambda_invoker"]
+    task_config["invocation_type"] = "Event"
+    client = mocker.patch.object(handler, "lambda_client")
+
+    assert handler.invoke_lambda(event, {}) == {"result_s3_key": RESULT_KEY}
+    assert client.invoke.call_args.kwargs["InvocationType"] == "Event"
+    assert json.loads(client.invoke.call_args.kwargs["Payload"]) == {
+        **event,
+        "result_s3_key": RESULT_KEY,
+    }
+
+
+def test_collect_result(mocker, s3_client, s3_bucket):
+    mocker.patch.object(handler, "s3_client", s3_client)
+    result = {"status": "OK", "errors": []}
+    s3_client.put_object(
+        Bucket=s3_bucket, Key=RESULT_KEY, Body=json.dumps(result).encode()
+    )
+
+    assert handler.collect_result({"result_s3_key": RESULT_KEY}, {}) == result
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=s3_bucket)
+
+
+def test_collect_result_not_ready(mocker, s3_client, s3_bucket):
+    mocker.patch.object(handler, "s3_client", s3_client)
+
+    with pytest.raises(handler.ResultNotReady):
+        handler.collect_result({"result_s3_key": RESULT_KEY}, {})
@@ -1,5 +1,5 @@
 from copy import deepcopy
-from dataclasses import FrozenInstanceError
+from dataclasses import FrozenInstanceError, asdict
 
 import pytest
 
@@ -192,3 +192,52 @@ def test_merging_task_config(event_merge_task_config):
     assert config.task_config["some_config"] == "overridden value"
     assert config.task_config["some_new_config"] == "some other value"
     assert config.task_config["some_unchanged_config"] == "unchanged value"
+
+
+def test_step_data_input_events_and_ref_value_error():
+    with pytest.raises(ValueError):
+        StepData(
+            status="PENDING",
+            errors=[],
+            input_events=[{"foo": "bar"}],
+            input_events_ref={"bucket": "b", "key": "k", "count": 1},
+        )
+
+
+def test_spill_input_events_below_threshold(s3_client, s3_bucket):
+    step_data = StepData(status="PENDING", errors=[], input_events=[{"foo": "bar"}])
+    step_data.spill_input_events("some/key.ndjson", s3_client=s3_client)
+
+    assert step_data.input_events == [{"foo": "bar"}]
+    assert step_data.input_events_ref is None
+
+
+def test_spill_input_events(s3_client, s3_bucket):
+    input_events = [{"id": i, "value": "x" * 100} for i in range(100)]
+    step_data = StepData(status="PENDING", errors=[], input_events=input_events)
+    step_data.spill_input_events("some/key.ndjson", threshold=1024, s3_client=s3_client)
+
+    assert step_data.input_events is None
+    assert step_data.input_events_ref == {
+        "bucket": s3_bucket,
+        "key": "some/key.ndjson",
+        "count": 100,
+    }
+    assert step_data.input_count == 100
+
+    # The reference survives a round trip through a Lambda event.
+    config = Config.from_lambda_event(
+        {
+            "execution_name": "test_execution",
+            "task": "some_task",
+            "payload": {
+                "pipeline": {"id": "some-id"},
+                "output_dataset": {"id": "some-id", "version": "1"},
+                "step_data": asdict(step_data),
+            },
+        }
+    )
+    assert (
+        list(config.payload.step_data.iter_input_events(s3_client=s3_client))
+        == input_events
+    )
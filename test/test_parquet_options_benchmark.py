@@ -0,0 +1,10 @@
+from benchmarks.parquet_options import run
+
+
+def test_run():
+    variants = {"zstd": {"compression": "zstd", "dictionary": "auto"}}
+
+    result = run(rows=1000, repeat=1, variants=variants)
+
+    assert set(result) == {"tall", "wide"}
+    assert set(result["tall"]["zstd"]) == {"size_mb", "write_seconds", "read_seconds"}
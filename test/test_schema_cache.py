@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from okdata.pipeline.models import OutputDataset
+from okdata.pipeline.schema_cache import (
+    BUCKET,
+    SchemaCache,
+    cache_key,
+    sniff_delimiter,
+)
+
+DATASET = OutputDataset(
+    id="boligpriser",
+    version="1",
+    edition="20200120T133701",
+    s3_prefix="%stage%/green/boligpriser/version=1/edition=20200120T133701/",
+)
+KEY = "intermediate/green/boligpriser/version=1/schema_cache.json"
+
+
+def test_cache_key():
+    assert cache_key(DATASET) == KEY
+
+
+def test_cache_key_no_prefix():
+    dataset = OutputDataset(id="boligpriser", version="1", s3_prefix=None)
+
+    assert cache_key(dataset) is None
+    assert SchemaCache(dataset).get("delimiter", ",") == ","
+
+
+def test_schema_cache_missing(s3_client, s3_bucket):
+    cache = SchemaCache(DATASET, s3_client)
+
+    assert cache.load() == {}
+    assert cache.get("delimiter") is None
+
+
+def test_schema_cache_update(s3_client, s3_bucket):
+    SchemaCache(DATASET, s3_client).update(
+        delimiter=";", dtypes={"a": "int64[pyarrow]"}, date_formats=None
+    )
+
+    body = s3_client.get_object(Bucket=BUCKET, Key=KEY)["Body"].read()
+    assert json.loads(body) == {"delimiter": ";", "dtypes": {"a": "int64[pyarrow]"}}
+
+    # Later editions of the same version share the cache.
+    dataset = OutputDataset(
+        id="boligpriser",
+        version="1",
+        edition="20200121T133701",
+        s3_prefix="%stage%/green/boligpriser/version=1/edition=20200121T133701/",
+    )
+    cache = SchemaCache(dataset, s3_client)
+    assert cache.get("delimiter") == ";"
+
+    cache.update(date_formats={"b": "ISO8601"})
+    assert json.loads(s3_client.get_object(Bucket=BUCKET, Key=KEY)["Body"].read()) == {
+        "date_formats": {"b": "ISO8601"},
+        "delimiter": ";",
+        "dtypes": {"a": "int64[pyarrow]"},
+    }
+
+
+def test_schema_cache_update_unchanged(s3_client, s3_bucket, mocker):
+    s3_client.put_object(Bucket=BUCKET, Key=KEY, Body=json.dumps({"delimiter": ";"}))
+    put_object = mocker.spy(s3_client, "put_object")
+
+    SchemaCache(DATASET, s3_client).update(delimiter=";")
+
+    put_object.assert_not_called()
+
+
+def test_schema_cache_invalid(s3_client, s3_bucket):
+    s3_client.put_object(Bucket=BUCKET, Key=KEY, Body="not json")
+
+    assert SchemaCache(DATASET, s3_client).load() == {}
+
+
+def test_schema_cache_no_bucket(s3_client):
+    cache = SchemaCache(DATASET, s3_client)
+
+    # Errors are ignored, the cache is only an optimization.
+    assert cache.load() == {}
+    cache.update(delimiter=";")
+
+
+@pytest.mark.parametrize(
+    "filename,delimiter",
+    [
+        ("husholdninger.csv", ";"),
+        ("husholdninger.tsv.gz", "\t"),
+        ("schema_dates.csv", ","),
+    ],
+)
+def test_sniff_delimiter(s3_client, s3_bucket, filename, delimiter):
+    key = f"s3/prefix/{filename}"
+    with open(f"test/converters/csv/data/{filename}", "rb") as f:
+        s3_client.put_object(Bucket=BUCKET, Key=key, Body=f.read())
+
+    assert sniff_delimiter(s3_client, key) == delimiter
+
+
+def test_schema_cache_delimiter(s3_client, s3_bucket):
+    s3_client.put_object(Bucket=BUCKET, Key=KEY, Body=json.dumps({"delimiter": ";"}))
+    s3_client.put_object(Bucket=BUCKET, Key="input/a.csv", Body="a,b\n1,2\n")
+    s3_client.put_object(Bucket=BUCKET, Key="input/b.csv", Body="a\n1\n")
+    cache = SchemaCache(DATASET, s3_client)
+
+    # The sniffed delimiter wins over the cached one.
+    assert cache.delimiter("input/a.csv") == ","
+    assert cache.delimiter("input/b.csv") == ";"
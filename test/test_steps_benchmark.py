@@ -0,0 +1,86 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from benchmarks.steps import (
+    encode,
+    json_schema,
+    SCENARIOS,
+    SUCCESS_STATUSES,
+    regressions,
+    run_step,
+    synthetic_table,
+    upload,
+)
+
+
+@pytest.mark.parametrize("shape", ["tall", "wide", "dates"])
+def test_synthetic_table(shape):
+    df = synthetic_table(shape, 100)
+
+    assert len(df) > 0
+    assert set(json_schema(df)["properties"]) == set(df.columns)
+
+
+def test_json_schema():
+    properties = json_schema(synthetic_table("tall", 10))["properties"]
+
+    assert properties["id"] == {"type": "integer"}
+    assert properties["active"] == {"type": "boolean"}
+    assert properties["date_created"] == {"type": "string", "format": "date"}
+    assert properties["time_updated"] == {"type": "string", "format": "date-time"}
+
+
+def test_encode():
+    df = synthetic_table("tall", 10)
+
+    csv = gzip.decompress(encode(df, "csv", compress=True)).decode()
+    assert csv.splitlines()[0] == ",".join(df.columns)
+    assert "True" not in csv
+
+    assert len(json.loads(encode(df, "json"))) == 10
+    assert encode(df, "xlsx").startswith(b"PK\x03\x04")
+
+
+# The Delta Lake scenarios need a real S3 endpoint, and are left out here.
+@pytest.mark.parametrize(
+    "name",
+    [
+        "csv_to_parquet/dates",
+        "xlsx_to_csv/tall",
+        "validate_csv/tall",
+        "validate_json/tall",
+        "write_s3/many-files",
+    ],
+)
+@pytest.mark.benchmark
+def test_run_step(s3_bucket, s3_client, name):
+    event, input_rows, input_bytes = upload(
+        s3_client, os.environ["BUCKET_NAME"], name, rows=100
+    )
+    result = run_step(SCENARIOS[name].handler, event)
+
+    assert input_rows == 100
+    assert input_bytes > 0
+    assert result["status"] in SUCCESS_STATUSES
+    assert result["latency_seconds"] > 0
+
+
+def test_regressions():
+    baseline = {
+        "a": {"status": "OK", "latency_seconds": 1.0, "peak_rss_mb": 100},
+        "b": {"status": "OK", "latency_seconds": 1.0, "peak_rss_mb": 100},
+    }
+    results = {
+        "a": {"status": "OK", "latency_seconds": 1.1, "peak_rss_mb": 200},
+        "b": {"status": "CONVERSION_FAILED", "latency_seconds": 0.5},
+        "c": {"status": "OK", "latency_seconds": 10.0, "peak_rss_mb": 1000},
+    }
+
+    found = regressions(results, baseline, tolerance=0.25)
+
+    assert len(found) == 2
+    assert found[0].startswith("a: peak_rss_mb is 200")
+    assert found[1] == "b: finished with status CONVERSION_FAILED"
@@ -0,0 +1,81 @@
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from okdata.pipeline import util
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(mocker):
+    return mocker.patch("okdata.pipeline.util.time.sleep")
+
+
+def test_retry_with_backoff_returns_first_success():
+    f = Mock(side_effect=[ValueError, ValueError, "ok"])
+
+    assert util.retry_with_backoff(f, retries=3) == "ok"
+    assert f.call_count == 3
+
+
+def test_retry_with_backoff_reraises_when_exhausted(no_sleep):
+    f = Mock(side_effect=ValueError("nope"))
+
+    with pytest.raises(ValueError, match="nope"):
+        util.retry_with_backoff(f, retries=2)
+
+    assert f.call_count == 3
+    assert no_sleep.call_count == 2
+
+
+def test_retry_with_backoff_delay_is_capped(no_sleep):
+    f = Mock(side_effect=ValueError)
+
+    with pytest.raises(ValueError):
+        util.retry_with_backoff(f, retries=6, base_delay=1, max_delay=3)
+
+    for (delay,), _ in no_sleep.call_args_list:
+        assert 0 <= delay <= 3
+
+
+def test_dataset_client_is_reused_within_ttl(mocker):
+    mocker.patch.object(util, "_dataset_client", None)
+    mocker.patch.object(util, "sdk_config")
+    dataset = mocker.patch.object(util, "Dataset")
+    monotonic = mocker.patch("okdata.pipeline.util.time.monotonic")
+
+    monotonic.return_value = 1000
+    first = util.dataset_client()
+    monotonic.return_value = 1000 + util.SDK_CLIENT_TTL
+    assert util.dataset_client() is first
+    assert dataset.call_count == 1
+
+    dataset.return_value = Mock()
+    monotonic.return_value = 1001 + util.SDK_CLIENT_TTL
+    assert util.dataset_client() is not first
+    assert dataset.call_count == 2
+
+
+def test_dataset_client_created_once_across_threads(mocker):
+    mocker.patch.object(util, "_dataset_client", None)
+    mocker.patch.object(util, "sdk_config")
+
+    def slow_dataset(config):
+        # Give the other threads time to get past the check (`time.sleep` is
+        # patched out).
+        threading.Event().wait(0.05)
+        return Mock()
+
+    dataset = mocker.patch.object(util, "Dataset", side_effect=slow_dataset)
+    clients = []
+    threads = [
+        threading.Thread(target=lambda: clients.append(util.dataset_client()))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert dataset.call_count == 1
+    assert all(client is clients[0] for client in clients)
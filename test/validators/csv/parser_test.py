@@ -56,6 +56,19 @@ class TestValid:
         data = parse_csv([["55", "", "true"]], json.loads(no_header_schema))
         assert data == [{"0": 55, "2": True}]
 
+    def test_parse_lenient_columns(self, boligpriser_schema, boligpriser_header):
+        lenient_columns = set()
+        parse_csv(
+            [
+                ["001", "Østre byflak", "1010.01", "true"],
+                ["002", "Hønse-Lovisaløkka", "5001,10", "false"],
+            ],
+            json.loads(boligpriser_schema),
+            header=boligpriser_header,
+            lenient_columns=lenient_columns,
+        )
+        assert lenient_columns == {"pris"}
+
 
 class TestInvalid:
     @pytest.mark.parametrize("test_input", ["nope", "true"])
@@ -4,6 +4,8 @@ from unittest.mock import patch
 import pytest
 from okdata.aws.status.sdk import Status
 
+from okdata.pipeline import intermediate
+
 with patch("okdata.pipeline.util.get_secret") as get_secret:
     get_secret.return_value = "abc123"
     from okdata.pipeline.validators.csv.validator import (
@@ -96,3 +98,68 @@ def mock_status(monkeypatch):
         return
 
     monkeypatch.setattr(Status, "_process_payload", _process_payload)
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_csv_validator_intermediate(s3_client, s3_bucket, event, mock_status, fmt):
+    event["payload"]["pipeline"]["task_config"]["validate_input"]["intermediate"] = fmt
+    _put_s3(s3_client, s3_bucket, event, "valid.csv")
+
+    result = validate_csv(event, {})
+
+    assert len(result["errors"]) == 0
+    key = (
+        "intermediate/green/boligpriser/version=1/validated/"
+        f"edition=20200120T133701/t.{fmt}"
+    )
+    table = intermediate.read(s3_client, key)
+    assert table.column_names == ["int", "bool", "str", "nil"]
+    assert table.slice(0, 1).to_pylist() == [
+        {"int": 1, "bool": False, "str": "string", "nil": None}
+    ]
+
+
+def test_csv_validator_intermediate_unknown_column(
+    s3_client, s3_bucket, event, mock_status
+):
+    event["payload"]["pipeline"]["task_config"]["validate_input"][
+        "intermediate"
+    ] = "arrow"
+    _put_s3(s3_client, s3_bucket, event, "unknown_empty_column.csv")
+
+    result = validate_csv(event, {})
+
+    assert len(result["errors"]) == 0
+    key = (
+        "intermediate/green/boligpriser/version=1/validated/"
+        "edition=20200120T133701/t.arrow"
+    )
+    table = intermediate.read(s3_client, key)
+    assert table.column_names == ["int", "bool", "str", "nil", "extra"]
+    assert str(table.schema.field("extra").type) == "string"
+
+
+def test_csv_validator_intermediate_decimal_comma(
+    s3_client, s3_bucket, event, mock_status
+):
+    task_config = event["payload"]["pipeline"]["task_config"]["validate_input"]
+    schema = json.loads(task_config["schema"])
+    schema["items"]["properties"]["num"] = {"type": "number"}
+    task_config["schema"] = json.dumps(schema)
+    task_config["intermediate"] = "arrow"
+    _put_s3(s3_client, s3_bucket, event, "decimal_comma.csv")
+
+    result = validate_csv(event, {})
+
+    assert len(result["errors"]) == 0
+    key = (
+        "intermediate/green/boligpriser/version=1/validated/"
+        "edition=20200120T133701/t.arrow"
+    )
+    with pytest.raises(s3_client.exceptions.NoSuchKey):
+        s3_client.get_object(Bucket=s3_bucket, Key=key)
+
+
+def test_config_invalid_intermediate():
+    with pytest.raises(ValueError):
+        StepConfig(intermediate="csv")
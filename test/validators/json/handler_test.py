@@ -211,6 +211,133 @@ def test_no_task_config_succeeds(lambda_event, mock_status_requests):
     )
 
 
+def test_validation_input_events_ref(
+    s3_client, s3_bucket, mock_status_requests, lambda_event
+):
+    s3_client.put_object(
+        Bucket=s3_bucket,
+        Key="some/input_events.ndjson",
+        Body="\n".join(json.dumps(e) for e in input_events).encode("utf-8"),
+    )
+    input_events_ref = {
+        "bucket": s3_bucket,
+        "key": "some/input_events.ndjson",
+        "count": len(input_events),
+    }
+    step_data = lambda_event["payload"]["step_data"]
+    del step_data["input_events"]
+    step_data["input_events_ref"] = input_events_ref
+
+    result = validate_json(lambda_event, {})
+
+    assert result["status"] == "VALIDATION_FAILED"
+    assert result["input_events_ref"] == input_events_ref
+    assert result["errors"] == [
+        {"message": "'date' is a required property", "row": "root"},
+        {"message": "'bar' is not a 'date-time'", "row": "datetime"},
+    ]
+
+
+def test_large_input_events_are_spilled(
+    s3_client, s3_bucket, mock_status_requests, lambda_event, mocker
+):
+    mocker.patch("okdata.pipeline.models.INPUT_EVENTS_SPILL_THRESHOLD", 10)
+    lambda_event["payload"]["output_dataset"]["s3_prefix"] = "%stage%/green/foo/"
+    lambda_event["payload"]["pipeline"]["task_config"][task_name] = {
+        "spill_input_events": True
+    }
+
+    result = validate_json(lambda_event, {})
+
+    assert result["input_events"] is None
+    assert result["input_events_ref"] == {
+        "bucket": s3_bucket,
+        "key": f"intermediate/green/foo/{task_name}/input_events.ndjson",
+        "count": 1,
+    }
+
+
+def test_large_input_events_are_kept_inline_by_default(
+    s3_client, s3_bucket, mock_status_requests, lambda_event, mocker
+):
+    mocker.patch("okdata.pipeline.models.INPUT_EVENTS_SPILL_THRESHOLD", 10)
+    lambda_event["payload"]["output_dataset"]["s3_prefix"] = "%stage%/green/foo/"
+    lambda_event["payload"]["pipeline"]["task_config"][task_name] = None
+
+    result = validate_json(lambda_event, {})
+
+    assert (
+        result["input_events"] == lambda_event["payload"]["step_data"]["input_events"]
+    )
+    assert result["input_events_ref"] is None
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=s3_bucket)
+
+
+@pytest.mark.parametrize(
+    "body,errors",
+    [
+        (
+            [{"id": "1", "name": "a", "created": "2020-01-01T00:00:00"}, {"id": "2"}],
+            [
+                {"message": "'name' is a required property", "row": 1},
+                {"message": "'created' is a required property", "row": 1},
+            ],
+        ),
+        (
+            [{"id": "1", "name": "a", "created": "2020-01-01T00:00:00"}],
+            [],
+        ),
+    ],
+)
+def test_s3_input_streamed_array(
+    s3_client, s3_bucket, mock_status_requests, lambda_event, mocker, body, errors
+):
+    import okdata.pipeline.validators.json.s3_reader as s3_reader
+
+    mocker.patch.object(s3_reader, "s3", s3_client)
+    s3_client.put_object(
+        Bucket=s3_bucket, Key="raw/foo/data.json", Body=json.dumps(body).encode()
+    )
+    step_data = lambda_event["payload"]["step_data"]
+    step_data["input_events"] = None
+    step_data["s3_input_prefixes"] = {"foo": "raw/foo/"}
+    lambda_event["payload"]["pipeline"]["task_config"][task_name][
+        "schema"
+    ] = schema_for_array
+
+    result = validate_json(lambda_event, {})
+
+    assert result["status"] == ("VALIDATION_FAILED" if errors else "VALIDATION_SUCCESS")
+    assert result["errors"] == errors
+
+
+def test_s3_input_streamed_ndjson(
+    s3_client, s3_bucket, mock_status_requests, lambda_event, mocker
+):
+    import okdata.pipeline.validators.json.s3_reader as s3_reader
+
+    mocker.patch.object(s3_reader, "s3", s3_client)
+    valid = {
+        "id": "1",
+        "year": "2020",
+        "date": "2020-01-01",
+        "datetime": "2020-01-01T12:01:01",
+    }
+    body = "\n".join(json.dumps(r) for r in [valid, valid, {**valid, "id": 3}])
+    s3_client.put_object(
+        Bucket=s3_bucket, Key="raw/foo/data.ndjson", Body=body.encode()
+    )
+    step_data = lambda_event["payload"]["step_data"]
+    step_data["input_events"] = None
+    step_data["s3_input_prefixes"] = {"foo": "raw/foo/"}
+
+    result = validate_json(lambda_event, {})
+
+    assert result["errors"] == [
+        {"message": "3 is not of type 'string'", "row": 2, "col": "id"}
+    ]
+
+
 @pytest.fixture
 def validation_success(monkeypatch, mocker):
     def validate_list(self, data):
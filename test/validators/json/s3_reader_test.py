@@ -16,4 +16,4 @@ def test_s3_reader_read_s3_data(mocker, s3_client, s3_bucket):
     mocker.patch("okdata.pipeline.validators.json.s3_reader.BUCKET", s3_bucket)
     mocker.patch("okdata.pipeline.validators.json.s3_reader.s3", s3_client)
     output = s3_reader.read_s3_data({"the-dataset-id": test_prefix})
-    assert output == [test_data]
+    assert [item.value for item in output] == [test_data]
@@ -0,0 +1,79 @@
+import json
+from json import JSONDecodeError
+
+import pytest
+
+from okdata.pipeline.validators.json.stream import JsonItem, JsonStream
+
+
+def _chunks(text, size):
+    data = text.encode("utf-8")
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_single_document(chunk_size):
+    stream = JsonStream(_chunks('{"a": [1, 2], "b": "æøå"}', chunk_size))
+
+    assert list(stream) == [JsonItem(0, {"a": [1, 2], "b": "æøå"}, False)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_ndjson(chunk_size):
+    stream = JsonStream(_chunks('{"a": 1}\n{"a": 22}\n\n{"a": 333}\n', chunk_size))
+
+    assert [item.value for item in stream] == [{"a": 1}, {"a": 22}, {"a": 333}]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_unwrap_array(chunk_size):
+    stream = JsonStream(_chunks(' [1, 22 , {"a": [3]}, "x"] ', chunk_size))
+
+    assert list(stream.items(unwrap_array=True)) == [
+        JsonItem(0, 1, True),
+        JsonItem(1, 22, True),
+        JsonItem(2, {"a": [3]}, True),
+        JsonItem(3, "x", True),
+    ]
+
+
+def test_unwrap_array_empty():
+    assert list(JsonStream([b"[ ]"]).items(unwrap_array=True)) == []
+
+
+def test_unwrap_array_not_array():
+    stream = JsonStream([b'{"a": 1}'])
+
+    assert list(stream.items(unwrap_array=True)) == [JsonItem(0, {"a": 1}, False)]
+
+
+def test_array_without_unwrap():
+    assert list(JsonStream([b"[1, 2]"])) == [JsonItem(0, [1, 2], False)]
+
+
+@pytest.mark.parametrize("text", ["{,}", "[1 2]", '{"a": 1', "[1, 2"])
+def test_invalid_json(text):
+    with pytest.raises(JSONDecodeError):
+        list(JsonStream(_chunks(text, 2)).items(unwrap_array=True))
+
+
+def test_invalid_json_fails_early():
+    read = []
+
+    def chunks():
+        yield b'[{"a": 1 x}'
+        for i in range(1000):
+            read.append(i)
+            yield b" " * 1024
+
+    with pytest.raises(JSONDecodeError):
+        list(JsonStream(chunks()).items(unwrap_array=True))
+
+    assert len(read) < 5
+
+
+@pytest.mark.parametrize("text", ['["abcdefghijklmnopqrstuvwxyz"]', "[true, false]"])
+def test_values_across_chunks(text):
+    stream = JsonStream(_chunks(text, 1))
+
+    assert [item.value for item in stream.items(unwrap_array=True)] == json.loads(text)
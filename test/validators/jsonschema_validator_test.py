@@ -1,6 +1,7 @@
 import pytest
 
 from okdata.pipeline.validators.csv.parser import parse_csv
+from okdata.pipeline.validators.json.stream import JsonItem
 from okdata.pipeline.validators.jsonschema_validator import JsonSchemaValidator
 
 
@@ -149,3 +150,116 @@ class TestValidJsonSchema:
         ]
         validation_errors = JsonSchemaValidator(json_schema).validate_list(json_data)
         assert len(validation_errors) == 1
+
+    def test_iter_stream_errors_single_document(self, json_schema):
+        items = [JsonItem(0, {"id": "1", "year": "2020", "date": "2020-01-01"}, False)]
+        errors = list(JsonSchemaValidator(json_schema).iter_stream_errors(items))
+        assert errors == [
+            {"message": "'datetime' is a required property", "row": "root"}
+        ]
+
+    def test_iter_stream_errors_documents(self, json_schema):
+        valid = {
+            "id": "1",
+            "year": "2020",
+            "date": "2020-01-01",
+            "datetime": "2020-01-01T12:01:01",
+        }
+        items = [
+            JsonItem(0, valid, False),
+            JsonItem(1, {**valid, "year": "garbish data"}, False),
+        ]
+        errors = list(JsonSchemaValidator(json_schema).iter_stream_errors(items))
+        assert errors == [
+            {"message": "'garbish data' is not a 'year'", "row": 1, "col": "year"}
+        ]
+
+    def test_iter_stream_errors_array_items(self):
+        schema = {
+            "$schema": "http://json-schema.org/draft-07/schema#",
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string"},
+                    "tags": {"type": "array", "items": {"type": "string"}},
+                },
+            },
+        }
+        items = [
+            JsonItem(0, {"id": "1", "tags": ["a"]}, True),
+            JsonItem(1, {"id": 2}, True),
+            JsonItem(2, {"id": "3", "tags": ["a", 4]}, True),
+        ]
+        errors = list(JsonSchemaValidator(schema).iter_stream_errors(items))
+        assert errors == [
+            {"message": "2 is not of type 'string'", "row": 1, "col": "id"},
+            {"message": "4 is not of type 'string'", "row": 2, "col": "tags/1"},
+        ]
+
+    @pytest.mark.parametrize(
+        "keywords,values,expected",
+        [
+            (
+                {"minItems": 3},
+                [1, 2],
+                [{"message": "Expected at least 3 items, found 2", "row": "root"}],
+            ),
+            (
+                {"minItems": 1},
+                [],
+                [{"message": "Expected at least 1 items, found 0", "row": "root"}],
+            ),
+            (
+                {"maxItems": 1},
+                [1, 2],
+                [{"message": "Expected at most 1 items, found 2", "row": "root"}],
+            ),
+            (
+                {"uniqueItems": True},
+                [1, 2, 1],
+                [{"message": "Item is not unique", "row": 2}],
+            ),
+            (
+                {"contains": {"const": 3}},
+                [1, 2],
+                [
+                    {
+                        "message": "No item is valid under the `contains` schema",
+                        "row": "root",
+                    }
+                ],
+            ),
+            (
+                {"minItems": 1, "uniqueItems": True, "contains": {"const": 2}},
+                [1, 2],
+                [],
+            ),
+        ],
+    )
+    def test_iter_stream_errors_array_keywords(self, keywords, values, expected):
+        schema = {
+            "$schema": "http://json-schema.org/draft-07/schema#",
+            "type": "array",
+            "items": {"type": "integer"},
+            **keywords,
+        }
+        items = [JsonItem(i, value, True) for i, value in enumerate(values)]
+        errors = list(JsonSchemaValidator(schema).iter_stream_errors(items))
+        assert errors == expected
+
+    def test_iter_stream_errors_array_collected(self):
+        schema = {
+            "$schema": "http://json-schema.org/draft-07/schema#",
+            "type": "array",
+            "items": {"type": "integer"},
+            "not": {"items": {"const": 1}},
+        }
+        items = [JsonItem(0, 1, True), JsonItem(1, "a", True)]
+        errors = list(JsonSchemaValidator(schema).iter_stream_errors(items))
+        assert errors == [{"message": "'a' is not of type 'integer'", "row": 1}]
+
+        items = [JsonItem(0, 1, True), JsonItem(1, 1, True)]
+        errors = list(JsonSchemaValidator(schema).iter_stream_errors(items))
+        assert len(errors) == 1
+        assert errors[0]["row"] == "root"
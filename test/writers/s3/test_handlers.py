@@ -1,5 +1,8 @@
+import json
 import re
+import threading
 from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import ANY, call, patch
 
 import pytest
@@ -7,12 +10,13 @@ from okdata.aws.status.sdk import Status
 
 import test.writers.s3.test_data as test_data
 from okdata.pipeline.exceptions import IllegalWrite
-from okdata.pipeline.models import StepData
+from okdata.pipeline.models import OutputDataset, StepData
 from okdata.pipeline.writers.s3.exceptions import (
     DistributionNotCreated,
     IncompleteTransaction,
 )
 from okdata.pipeline.writers.s3.services import S3Service
+from okdata.sdk.config import Config
 from okdata.sdk.data.dataset import Dataset
 
 with patch("okdata.pipeline.util.get_secret") as get_secret:
@@ -149,6 +153,29 @@ def test_copy_to_processed_latest_ok(
     )
 
 
+def test_copy_to_processed_latest_unchanged(
+    mock_s3_service_ok,
+    mock_dataset_create_distribution_ok,
+    mock_status,
+    mock_get_latest_edition,
+    mocker,
+):
+    mocker.patch.object(S3Service, "has_copies", return_value=True)
+    mocker.spy(S3Service, "copy")
+    mocker.spy(S3Service, "delete_from_prefix")
+
+    lambda_event = test_data.copy_event("processed", write_to_latest=True)
+    handlers.write_s3(lambda_event, {})
+
+    S3Service.has_copies.assert_called_once_with(
+        test_data.s3_sources, test_data.s3_output_prefix_processed_latest
+    )
+    assert S3Service.delete_from_prefix.call_count == 0
+    S3Service.copy.assert_called_once_with(
+        ANY, test_data.s3_sources, test_data.s3_output_prefix_processed
+    )
+
+
 def test_copy_to_processed_latest_edition_not_latest(
     mock_s3_service_ok,
     mock_dataset_create_distribution_ok,
@@ -216,6 +243,7 @@ def test_copy_to_processed_distribution_not_created(
     mock_s3_service_ok, mock_dataset_create_distribution_fails, mock_status, mocker
 ):
     mocker.spy(S3Service, "delete_from_prefix")
+    mocker.patch("okdata.pipeline.util.time.sleep")
 
     lambda_event = test_data.copy_event("processed")
 
@@ -239,10 +267,69 @@ def test_copy_illegal_input_count(mock_status):
 
     assert (
         str(e)
-        == "<ExceptionInfo IllegalWrite('illegal write operation: ', 'cannot combine multiple datasets: ', 2) tblen=8>"
+        == "<ExceptionInfo IllegalWrite('illegal write operation: ', 'cannot combine multiple datasets: ', 2) tblen=9>"
+    )
+
+
+def test_create_distribution_with_retries_recovers(fake_metadata_api):
+    fake_metadata_api.responses = [
+        (500, {}),
+        (503, {}),
+        (201, {"Id": f"{test_data.dataset_id}/1/{test_data.edition}/dist"}),
+    ]
+    output_dataset = OutputDataset(
+        id=test_data.dataset_id, version="1", edition=test_data.edition
+    )
+
+    handlers.create_distribution_with_retries(
+        output_dataset, test_data.filenames, "application/json"
+    )
+
+    assert (
+        fake_metadata_api.requests
+        == [
+            (
+                "POST",
+                f"/datasets/{test_data.dataset_id}/versions/1/editions/{test_data.edition}/distributions",
+            )
+        ]
+        * 3
     )
 
 
+def test_create_distribution_with_retries_gives_up(fake_metadata_api):
+    fake_metadata_api.responses = [(500, {})] * 3
+    output_dataset = OutputDataset(
+        id=test_data.dataset_id, version="1", edition=test_data.edition
+    )
+
+    with pytest.raises(Exception):
+        handlers.create_distribution_with_retries(
+            output_dataset, test_data.filenames, "application/json", retries=2
+        )
+
+    assert len(fake_metadata_api.requests) == 3
+
+
+def test_copy_to_latest_with_fake_metadata_api(
+    mock_s3_service_ok, mock_status, fake_metadata_api, mocker
+):
+    mocker.spy(S3Service, "copy")
+    fake_metadata_api.responses = [
+        (200, {"Id": f"{test_data.dataset_id}/{test_data.version}/{test_data.edition}"})
+    ]
+
+    handlers.write_s3(test_data.copy_event("cleaned", write_to_latest=True), {})
+
+    assert fake_metadata_api.requests == [
+        (
+            "GET",
+            f"/datasets/{test_data.dataset_id}/versions/{test_data.version}/editions/latest",
+        )
+    ]
+    assert S3Service.copy.call_count == 2
+
+
 @pytest.fixture
 def mock_s3_service_ok(monkeypatch):
     def copy(self, s3_sources, output_prefix):
@@ -254,9 +341,13 @@ def mock_s3_service_ok(monkeypatch):
     def delete_from_prefix(self, s3_prefix):
         return
 
+    def has_copies(self, s3_sources, s3_prefix):
+        return False
+
     monkeypatch.setattr(S3Service, "copy", copy)
     monkeypatch.setattr(S3Service, "resolve_s3_sources", resolve_s3_sources)
     monkeypatch.setattr(S3Service, "delete_from_prefix", delete_from_prefix)
+    monkeypatch.setattr(S3Service, "has_copies", has_copies)
 
 
 @pytest.fixture
@@ -305,3 +396,45 @@ def mock_status(monkeypatch):
         return
 
     monkeypatch.setattr(Status, "_process_payload", _process_payload)
+
+
+@pytest.fixture
+def fake_metadata_api(mocker):
+    """Serve scripted responses to the `Dataset` SDK client from a local server.
+
+    Set `responses` to a list of `(status, body)` tuples; recorded requests are
+    available as `(method, path)` tuples in `requests`.
+    """
+
+    class FakeMetadataApi(BaseHTTPRequestHandler):
+        responses = []
+        requests = []
+
+        def _respond(self):
+            content_length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(content_length)
+            FakeMetadataApi.requests.append((self.command, self.path))
+            status, body = FakeMetadataApi.responses.pop(0)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps(body).encode("utf-8"))
+
+        do_GET = do_POST = _respond
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMetadataApi)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    config = Config(env="dev")
+    config.config["datasetUrl"] = f"http://127.0.0.1:{server.server_port}/datasets"
+    mocker.patch.object(handlers, "dataset_client", return_value=Dataset(config))
+    mocker.patch("okdata.pipeline.util.time.sleep")
+
+    yield FakeMetadataApi
+
+    server.shutdown()
+    server.server_close()
@@ -56,6 +56,37 @@ def test_resolve_s3_sources(mock_aws):
     assert s3_sources == test_data.s3_sources
 
 
+def test_has_copies(mock_aws):
+    s3_service = S3Service()
+    s3_sources = s3_service.resolve_s3_sources(test_data.s3_input_prefix)
+    assert not s3_service.has_copies(
+        s3_sources, test_data.s3_output_prefix_processed_latest
+    )
+
+    s3_service.copy(s3_sources, test_data.s3_output_prefix_processed_latest)
+    assert s3_service.has_copies(
+        s3_sources, test_data.s3_output_prefix_processed_latest
+    )
+    assert not s3_service.has_copies(
+        s3_sources[:2], test_data.s3_output_prefix_processed_latest
+    )
+
+
+def test_has_copies_changed_content(mock_aws, s3_client, s3_bucket):
+    s3_service = S3Service()
+    s3_sources = s3_service.resolve_s3_sources(test_data.s3_input_prefix)
+    s3_service.copy(s3_sources, test_data.s3_output_prefix_processed_latest)
+
+    s3_client.put_object(
+        Bucket=s3_bucket, Key=s3_sources[0].key, Body="changed".encode("utf-8")
+    )
+    s3_sources = s3_service.resolve_s3_sources(test_data.s3_input_prefix)
+
+    assert not s3_service.has_copies(
+        s3_sources, test_data.s3_output_prefix_processed_latest
+    )
+
+
 def test_list_objects(mock_aws):
     s3_objects = S3Service().list_objects_contents(test_data.s3_input_prefix)
     assert len(s3_objects) == len(test_files)